@@ -1,5 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from app.services.llm import llm_service
+from app.services.llm_cache import response_cache
+from app.services.clients import provider_clients
 from app.schemas.llm import (
     StoryGenerationRequest,
     StoryGenerationResponse,
@@ -35,7 +37,7 @@ async def generate_story(request: StoryGenerationRequest) -> StoryGenerationResp
 async def generate_image(request: ImageGenerationRequest) -> ImageGenerationResponse:
     """生成图片"""
     try:
-        image_url = llm_service.generate_image(prompt=request.prompt, image_llm_provider=request.image_llm_provider, image_llm_model=request.image_llm_model, resolution=request.resolution)
+        image_url = await llm_service.generate_image(prompt=request.prompt, image_llm_provider=request.image_llm_provider, image_llm_model=request.image_llm_model, resolution=request.resolution)
         return ImageGenerationResponse(image_url=image_url)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -45,11 +47,7 @@ async def generate_image(request: ImageGenerationRequest) -> ImageGenerationResp
 async def generate_story_with_images(request: StoryGenerationRequest) -> StoryGenerationResponse:
     """生成故事和配图"""
     try:
-        segments = llm_service.generate_story_with_images(
-            segments=request.segments,
-            story_prompt=request.story_prompt,
-            language=request.language
-        )
+        segments = await llm_service.generate_story_with_images(request)
         return StoryGenerationResponse(segments=segments)
     except Exception as e:
         logger.error(f"Failed to generate story with images: {e}")
@@ -62,3 +60,29 @@ async def get_llm_providers():
     """
     # 这里将实现获取 LLM Provider 的逻辑
     return llm_service.get_llm_providers()
+
+
+@router.get("/cache/stats")
+async def get_llm_cache_stats():
+    """
+    获取 LLM 响应缓存的命中统计
+    """
+    if response_cache is None:
+        return {"backend": None}
+    return response_cache.stats()
+
+
+@router.get("/singleflight/stats")
+async def get_llm_singleflight_stats():
+    """
+    获取合并并发 LLM 请求的统计：calls 为调用数，executed 为实际请求数，coalesced 为合并的调用数
+    """
+    return llm_service.singleflight_stats()
+
+
+@router.get("/clients/stats")
+async def get_llm_client_stats():
+    """
+    获取 provider 客户端连接池的统计
+    """
+    return provider_clients.stats()
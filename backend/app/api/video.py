@@ -1,33 +1,147 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import StreamingResponse
 from loguru import logger
-from app.services.video import generate_video, create_video_with_scenes, generate_voice
-from app.schemas.video import VideoGenerateRequest, VideoGenerateResponse, StoryScene
-import os
+from app.services.video import load_story
+from app.services.task import FINAL_STATES, task_manager
+from app.services.storage_gc import storage_gc
+from app.schemas.video import VideoGenerateRequest, VideoGenerateResponse, SceneEditRequest, RenderQuality
 import json
-from app.utils.utils import extract_id
-from app.config import settings
+from typing import Optional
+from app.exceptions import IdempotencyKeyConflict, TaskConflict
 
 router = APIRouter()
 
 @router.post("/generate")
 async def generate_video_endpoint(
-    request: VideoGenerateRequest
+    request: VideoGenerateRequest,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
 ):
-    """生成视频"""
+    """提交视频生成任务，立即返回任务ID，通过 /tasks/{task_id} 查询进度
+
+    生成参数相同的任务正在进行或已经完成时，直接返回该任务，不重新生成；
+    带 Idempotency-Key 时，相同的 key 总是返回同一个任务。
+    """
     try:
-        video_file = await generate_video(request)
-        task_id = extract_id(video_file)
-        # 转换为相对路径
-        video_url = f"http://{settings.video_url}:{settings.backend_port}/tasks/" + task_id + "/video.mp4"
+        task = task_manager.find_existing(request, idempotency_key)
+        if task is not None:
+            logger.info(f"Reusing task {task.task_id} for a duplicate request")
+            return VideoGenerateResponse(
+                success=True,
+                data=task.to_dict(),
+                message="Attached to an existing task"
+            )
+        task = task_manager.submit(request, idempotency_key)
         return VideoGenerateResponse(
             success=True,
-            data={"video_url": video_url}
+            data=task.to_dict()
         )
+    except IdempotencyKeyConflict as e:
+        raise HTTPException(status_code=422, detail=e.message)
+    except TaskConflict as e:
+        raise HTTPException(status_code=409, detail=e.message)
     except Exception as e:
-        logger.error(f"Failed to generate video: {str(e)}")
+        logger.error(f"Failed to submit video task: {str(e)}")
         return VideoGenerateResponse(
             success=False,
             message=str(e)
         )
 
 
+@router.get("/tasks/{task_id}")
+async def get_task_endpoint(task_id: str):
+    """查询视频生成任务的状态、各阶段进度和视频地址"""
+    task = task_manager.get(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail=f"Task not found: {task_id}")
+    return VideoGenerateResponse(
+        success=True,
+        data=task.to_dict()
+    )
+
+
+@router.patch("/tasks/{task_id}/scenes/{scene}")
+async def edit_scene_endpoint(task_id: str, scene: int, edit: SceneEditRequest):
+    """修改单个场景（序号从 1 开始），只重新生成受影响的图片、语音和片段，再重新拼接视频
+
+    修改在原任务上排队执行，通过 /tasks/{task_id} 或 /tasks/{task_id}/events 查看进度。
+    """
+    task = task_manager.get(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail=f"Task not found: {task_id}")
+    if task.state not in FINAL_STATES:
+        raise HTTPException(status_code=409, detail=f"Task is still running: {task_id}")
+    try:
+        _, scenes = load_story(task_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    if not 1 <= scene <= len(scenes):
+        raise HTTPException(status_code=404, detail=f"Scene {scene} not found, the story has {len(scenes)} scenes")
+    task = task_manager.submit_edit(task, scene, edit)
+    return VideoGenerateResponse(
+        success=True,
+        data=task.to_dict()
+    )
+
+
+@router.post("/tasks/{task_id}/render")
+async def render_task_endpoint(task_id: str, quality: RenderQuality = RenderQuality.full):
+    """在已有任务上按指定质量重新渲染，如看过预览后渲染完整质量的视频
+
+    复用任务目录中的图片、语音和字幕，不重新生成故事；渲染在原任务上排队执行，
+    通过 /tasks/{task_id} 或 /tasks/{task_id}/events 查看进度。
+    """
+    task = task_manager.get(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail=f"Task not found: {task_id}")
+    if task.state not in FINAL_STATES:
+        raise HTTPException(status_code=409, detail=f"Task is still running: {task_id}")
+    try:
+        load_story(task_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    task = task_manager.submit_render(task, quality)
+    return VideoGenerateResponse(
+        success=True,
+        data=task.to_dict()
+    )
+
+
+@router.get("/storage/stats")
+async def storage_stats_endpoint():
+    """磁盘清理的统计：按类别累计释放的字节数和删除的文件数、任务目录当前占用"""
+    return storage_gc.stats()
+
+
+@router.post("/storage/gc")
+async def storage_gc_endpoint():
+    """立即执行一次磁盘清理，返回本次释放的字节数"""
+    return await storage_gc.collect()
+
+
+def _format_sse(event: str, data) -> str:
+    """格式化为 SSE 消息，data 为 None 时发送注释作为心跳"""
+    if data is None:
+        return f": {event}\n\n"
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.get("/tasks/{task_id}/events")
+async def task_events_endpoint(task_id: str):
+    """以 Server-Sent Events 推送任务进度
+
+    先推送 snapshot（当前状态），之后依次推送 state、story（每个场景的文本）、images（图片地址）、
+    voice（语音和字幕地址）、render（渲染进度）事件，最后是 complete 或 failed，然后关闭连接。
+    """
+    task = task_manager.get(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail=f"Task not found: {task_id}")
+
+    async def stream():
+        async for event, data in task.events():
+            yield _format_sse(event, data)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,11 +1,15 @@
-from fastapi import APIRouter, HTTPException, Request, Query
+from fastapi import APIRouter, HTTPException, Request, Query, Response
 from fastapi.responses import JSONResponse
 from app.schemas.voice import VoiceGenerationRequest, VoiceGenerationResponse
 from app.schemas.video import VideoGenerateResponse, StoryScene
-from app.services.voice import generate_voice, get_all_azure_voices
+from app.services.voice import generate_voice, get_all_azure_voices, tts_flight
+from app.services.tts_cache import tts_cache
+from app.services.voice_catalog import voice_catalog
+from app.config import settings
 from app.services.video import create_video_with_scenes
 import os
 import json
+import hashlib
 from typing import List, Optional
 from pydantic import BaseModel
 
@@ -69,7 +73,7 @@ async def generate_voice_api(request: Request) -> VoiceGenerationResponse:
         body = await request.json()
         req = VoiceGenerationRequest(**body)
         
-        audio_file, subtitle_file = await generate_voice(
+        audio_file, subtitle_file, _ = await generate_voice(
             text=req.text,
             voice_name=req.voice_name,
             voice_rate=req.voice_rate
@@ -90,9 +94,43 @@ async def generate_voice_api(request: Request) -> VoiceGenerationResponse:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _voices_response(request: Request, area: Optional[List[str]]) -> Response:
+    """语音列表响应，带 ETag 和 Cache-Control，客户端的 If-None-Match 命中时返回 304"""
+    key = "\n".join(area) if area is not None else "default"
+    etag = '"' + voice_catalog.etag + "-" + hashlib.sha1(key.encode("utf-8")).hexdigest()[:8] + '"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={settings.voice_catalog_max_age}"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse({"voices": get_all_azure_voices(area)}, headers=headers)
+
+
+@router.get("/voices")
+async def get_voices(request: Request, area: Optional[List[str]] = Query(None, description="locale 或语言前缀，如 zh-CN、en")) -> Response:
+    """
+    获取支持的语音列表，响应可以被浏览器和代理缓存
+    """
+    return _voices_response(request, area)
+
+
 @router.post("/voices")
-async def list_voices(request: VoiceRequest) -> dict:
+async def list_voices(request: Request, body: VoiceRequest) -> Response:
     """
     获取所有支持的语音列表
     """
-    return {"voices": get_all_azure_voices(request.area)}
+    return _voices_response(request, body.area)
+
+
+@router.get("/cache/stats")
+def voice_cache_stats() -> dict:
+    """
+    获取语音缓存的命中统计和占用空间（需要扫描缓存目录，在线程池中执行）
+    """
+    return tts_cache.stats()
+
+
+@router.get("/singleflight/stats")
+async def voice_singleflight_stats() -> dict:
+    """
+    获取合并并发语音合成的统计：calls 为调用数，executed 为实际请求数，coalesced 为合并的调用数
+    """
+    return tts_flight.stats()
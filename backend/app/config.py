@@ -2,6 +2,7 @@ from pydantic import Field, BaseModel
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from functools import lru_cache
+from typing import Dict
 import os
 
 class Settings(BaseSettings):
@@ -31,9 +32,68 @@ class Settings(BaseSettings):
 
     text_llm_model: str = "glm-4-flash"
     image_llm_model: str = "cogview-3-flash"
+
+    # provider HTTP 连接池配置
+    http_max_connections: int = Field(100, description="连接池最大连接数")
+    http_max_keepalive_connections: int = Field(20, description="连接池保持的空闲连接数")
+    http_keepalive_expiry: float = Field(30, description="空闲连接保持时间（秒）")
+    http_timeout: float = Field(120, description="provider 请求超时时间（秒）")
+    http_connect_timeout: float = Field(10, description="建立连接的超时时间（秒）")
+    http2: bool = Field(False, description="是否启用 HTTP/2，需要安装 h2")
+
+    # 视频渲染配置
+    render_engine: str = Field("moviepy", description="渲染引擎: moviepy / ffmpeg")
+    subtitle_font_path: str = Field("", description="字幕字体文件路径，默认使用 resource/fonts/STHeitiLight.ttc")
+    ffmpeg_preset: str = Field("medium", description="ffmpeg 引擎使用的 x264 preset")
+    ffmpeg_crf: int = Field(23, description="ffmpeg 引擎使用的 x264 crf")
+    render_workers: int = Field(0, description="并行渲染的场景数（进程数），0 表示 CPU 核数")
+    preview_height: int = Field(360, description="预览视频的高度（像素）")
+    preview_fps: int = Field(12, description="预览视频的帧率")
+    preview_preset: str = Field("ultrafast", description="预览视频使用的 x264 preset")
+    preview_crf: int = Field(30, description="预览视频使用的 x264 crf")
+
+    # LLM 响应缓存配置
+    llm_stream: bool = Field(True, description="流式生成故事，每个场景生成完就开始准备图片和语音")
+    llm_cache_backend: str = Field("none", description="LLM 响应缓存后端: memory / sqlite / none，默认不缓存")
+    llm_cache_ttl: float = Field(3600, description="LLM 响应缓存有效期（秒）")
+    llm_cache_max_entries: int = Field(256, description="memory 后端最多缓存的响应数")
+
+    # 图片生成配置
+    image_concurrency: int = Field(4, description="每个图片 provider 默认的并发请求数")
+    image_provider_concurrency: Dict[str, int] = Field(default_factory=dict, description='按 provider 覆盖并发数，如 {"aliyun": 2}')
+    image_timeout: float = Field(120, description="单张图片生成的超时时间（秒）")
+    image_retries: int = Field(2, description="单张图片生成失败后的重试次数")
+
+    # 图片下载配置
+    download_concurrency: int = Field(4, description="同一任务中并发下载的图片数")
+    download_timeout: float = Field(60, description="单张图片下载超时时间（秒）")
+    download_retries: int = Field(3, description="图片下载失败后的重试次数")
+    download_backoff: float = Field(0.5, description="重试的初始等待时间（秒），每次翻倍")
+    download_max_bytes: int = Field(20 * 1024 * 1024, description="单张图片的最大字节数")
+
+    # 语音合成配置
+    tts_concurrency: int = Field(4, description="同一任务中并发合成语音的场景数")
+    tts_cache_enabled: bool = Field(True, description="是否缓存合成的语音")
+    voice_catalog_refresh: bool = Field(False, description="是否在后台定期从 edge-tts 刷新语音列表")
+    voice_catalog_refresh_interval: float = Field(24 * 3600, description="语音列表刷新间隔（秒）")
+    voice_catalog_max_age: int = Field(3600, description="语音列表接口的 Cache-Control max-age（秒）")
+    tts_chunk_chars: int = Field(500, description="超过该长度的文本按句子切片并发合成语音")
+    tts_batch: bool = Field(False, description="整篇故事一次 TTS 请求合成，再按词边界切分成各场景的语音和字幕")
+    tts_cache_max_bytes: int = Field(512 * 1024 * 1024, description="语音缓存占用的最大磁盘空间（字节）")
     
     video_url: str = "154.8.194.44"
     backend_port: str = Field("8000", description="后端端口")
+
+    # 视频任务配置
+    video_workers: int = Field(2, description="同时执行的视频生成任务数")
+
+    # 磁盘清理配置，时间单位为秒，为 0 时不按该条件清理
+    gc_enabled: bool = Field(True, description="是否在后台定期清理任务目录和临时文件")
+    gc_interval: float = Field(3600, description="清理间隔（秒）")
+    gc_task_max_age: float = Field(7 * 24 * 3600, description="已结束的任务最后一次访问超过该时间后整个删除")
+    gc_intermediate_max_age: float = Field(24 * 3600, description="已完成的任务最后一次访问超过该时间后删除语音、字幕和片段等中间产物，保留场景图片和视频")
+    gc_max_bytes: int = Field(10 * 1024 * 1024 * 1024, description="任务目录占用的最大磁盘空间（字节），超过时按最近访问时间删除已结束的任务")
+    gc_temp_max_age: float = Field(3600, description="临时文件和中断的渲染残留超过该时间未修改时删除")
     
     # 开始配置一些基础服务
     MYSQL_HOST: str = Field("", description="mysql的连接地址")
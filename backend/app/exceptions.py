@@ -6,6 +6,24 @@ class LLMResponseValidationError(Exception):
         self.message = message
         super().__init__(self.message)
 
+class DownloadError(Exception):
+    """文件下载错误"""
+    def __init__(self, message: str):
+        self.message = message
+        super().__init__(self.message)
+
+class IdempotencyKeyConflict(Exception):
+    """同一个 Idempotency-Key 用于了不同的请求"""
+    def __init__(self, message: str):
+        self.message = message
+        super().__init__(self.message)
+
+class TaskConflict(Exception):
+    """任务正在执行，不能再次提交"""
+    def __init__(self, message: str):
+        self.message = message
+        super().__init__(self.message)
+
 class CustomHTTPException(HTTPException):
     def __init__(self, msg: str, code: int):
         self.msg = msg
@@ -52,7 +52,11 @@ PUNCTUATIONS = [
     "...",
 ]
 
+# 句末标点，按句子切分时使用
+SENTENCE_PUNCTUATIONS = [".", "。", "!", "！", "?", "？", "...", "…"]
+
 TASK_STATE_FAILED = -1
+TASK_STATE_QUEUED = 0
 TASK_STATE_COMPLETE = 1
 TASK_STATE_PROCESSING = 4
 
@@ -12,6 +12,7 @@ class StoryGenerationRequest(BaseModel):
     segments: int = Field(..., ge=1, le=10, description="Number of story segments to generate")
     story_prompt: str = Field(..., min_length=1, max_length=4000, description="Theme or topic of the story")
     language: Language = Field(default=Language.CHINESE_CN, description="Story language")
+    no_cache: bool = Field(default=False, description="Skip the cached response and call the LLM again")
 
 
 class StorySegment(BaseModel):
@@ -19,6 +19,16 @@ class VideoConcatMode(str, Enum):
     sequential = "sequential"
 
 
+class RenderQuality(str, Enum):
+    preview = "preview"
+    full = "full"
+
+
+class RenderEngine(str, Enum):
+    moviepy = "moviepy"
+    ffmpeg = "ffmpeg"
+
+
 class VideoAspect(str, Enum):
     landscape = "16:9"
     portrait = "9:16"
@@ -309,6 +319,18 @@ class VideoGenerateRequest(BaseModel):
     voice_name: str = Field(default="zh-CN-XiaoxiaoNeural", description="语音名称")
     voice_rate: float = Field(default=1.0, description="语音速率")
     resolution: Optional[str] = Field(default="1024*1024", description="分辨率")
+    no_cache: bool = Field(default=False, description="是否跳过故事生成的缓存")
+    render_engine: Optional[RenderEngine] = Field(default=None, description="渲染引擎 moviepy / ffmpeg，不传时使用配置")
+    quality: RenderQuality = Field(default=RenderQuality.full, description="渲染质量，preview 为低分辨率、低帧率的快速预览")
+    full_after_preview: bool = Field(default=False, description="预览渲染完成后继续渲染完整质量的视频")
+
+
+class SceneEditRequest(BaseModel):
+    """单个场景的修改请求，不传的字段保持不变"""
+    text: Optional[str] = Field(default=None, min_length=1, description="新的场景文本，变化时重新合成该场景的语音和字幕")
+    image_prompt: Optional[str] = Field(default=None, min_length=1, description="新的图片提示词，变化时重新生成该场景的图片")
+    url: Optional[str] = Field(default=None, description="直接使用的图片 URL，传入时不再生成图片")
+    regenerate_image: bool = Field(default=False, description="提示词不变时也重新生成图片")
 
 
 class VideoGenerateResponse(BaseModel):
@@ -0,0 +1,82 @@
+import re
+from typing import Sequence, Tuple
+
+from app.services.subtitle import SubtitleCues
+
+# 对齐时只比较文字字符，标点、空白、下划线都去掉
+_NON_WORD = re.compile(r"[\W_]+")
+# TTS 的词与脚本对不上时，向后查找的最大字符数
+SEARCH_WINDOW = 32
+
+
+def normalize(text: str) -> str:
+    """对齐用的归一化：去掉标点和空白，转小写"""
+    return _NON_WORD.sub("", text).lower()
+
+
+def align_words(lines: Sequence[str], words: Sequence[Tuple[float, float, str]]) -> SubtitleCues:
+    """把 TTS 的词边界对齐到脚本的每一行，生成字幕
+
+    两边各归一化一次，按字符顺序单向推进匹配，总耗时与文本长度成线性关系。
+    TTS 对数字、标点的处理可能与脚本不同，词对不上时在 SEARCH_WINDOW 内向后查找，
+    仍找不到时不前进，该词归入当前位置所在的行，等后面的词匹配上再重新同步；
+    连续对不上的词越多，查找范围相应放宽。没有分到词的行并入相邻的字幕。
+
+    Args:
+        lines: 脚本按标点切分后的行
+        words: [(开始秒, 结束秒, 词)]，按时间顺序
+
+    Returns:
+        SubtitleCues: 每行一条字幕（没有词的行与相邻行合并），words 为空时返回空字幕
+    """
+    # 脚本的归一化字符逐个对应到行号
+    script = []
+    line_of_char = []
+    for index, line in enumerate(lines):
+        normalized = normalize(line)
+        script.append(normalized)
+        line_of_char.extend([index] * len(normalized))
+    script = "".join(script)
+
+    starts = [None] * len(lines)
+    ends = [None] * len(lines)
+    pos = 0
+    # 上次匹配之后对不上的词的总长度
+    missed = 0
+    for start, end, word in words:
+        token = normalize(word)
+        if not token:
+            continue
+        if script.startswith(token, pos):
+            found = pos
+        else:
+            found = script.find(token, pos, pos + len(token) + SEARCH_WINDOW + missed)
+        if found < 0:
+            # 对不上（例如数字被读成文字），留在原位置，不跳过脚本中后面的内容
+            found = pos
+            missed += len(token)
+        else:
+            pos = found + len(token)
+            missed = 0
+        if not line_of_char:
+            break
+        index = line_of_char[min(found, len(line_of_char) - 1)]
+        if starts[index] is None:
+            starts[index] = start
+        ends[index] = end
+
+    cues = SubtitleCues()
+    pending = []
+    for line, start, end in zip(lines, starts, ends):
+        text = line.strip()
+        if start is None:
+            # 没有分到词的行等到下一条有时间的字幕一起显示
+            pending.append(text)
+            continue
+        if pending:
+            text = " ".join(pending + [text])
+            pending = []
+        cues.append(start, end, text)
+    if pending and len(cues):
+        cues.texts[-1] = " ".join([cues.texts[-1]] + pending)
+    return cues
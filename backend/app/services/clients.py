@@ -0,0 +1,119 @@
+import importlib.util
+from typing import Any, Dict, Optional
+
+import httpx
+from loguru import logger
+from openai import AsyncOpenAI
+
+from app.config import settings
+
+# provider -> (base_url 配置项, api_key 配置项, 默认 base_url)
+PROVIDERS = {
+    "openai": ("openai_base_url", "openai_api_key", "https://api.openai.com/v1"),
+    "aliyun": ("aliyun_base_url", "aliyun_api_key", "https://dashscope.aliyuncs.com/compatible-mode/v1"),
+    "deepseek": ("deepseek_base_url", "deepseek_api_key", "https://api.deepseek.com/v1"),
+    "ollama": ("ollama_base_url", "ollama_api_key", "http://localhost:11434/v1"),
+    "siliconflow": ("siliconflow_base_url", "siliconflow_api_key", "https://api.siliconflow.cn/v1"),
+    "glm": ("glm_base_url", "glm_api_key", "https://open.bigmodel.cn/api/paas/v4"),
+}
+
+
+class _CountingTransport(httpx.AsyncHTTPTransport):
+    """统计请求数的 transport"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.requests_total = 0
+        self.requests_in_flight = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests_total += 1
+        self.requests_in_flight += 1
+        try:
+            return await super().handle_async_request(request)
+        finally:
+            self.requests_in_flight -= 1
+
+
+class ProviderClientRegistry:
+    """按 provider 懒加载的异步客户端
+
+    所有 provider 共用一个 httpx.AsyncClient，从而共享连接池和 keep-alive 连接。
+    """
+
+    def __init__(self):
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._transport: Optional[_CountingTransport] = None
+        self._clients: Dict[str, AsyncOpenAI] = {}
+
+    def http_client(self) -> httpx.AsyncClient:
+        if self._http_client is None or self._http_client.is_closed:
+            http2 = settings.http2
+            if http2 and importlib.util.find_spec("h2") is None:
+                logger.warning("http2 is enabled but the h2 package is not installed, falling back to HTTP/1.1")
+                http2 = False
+            self._transport = _CountingTransport(
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=settings.http_max_connections,
+                    max_keepalive_connections=settings.http_max_keepalive_connections,
+                    keepalive_expiry=settings.http_keepalive_expiry,
+                ),
+            )
+            self._http_client = httpx.AsyncClient(
+                transport=self._transport,
+                timeout=httpx.Timeout(settings.http_timeout, connect=settings.http_connect_timeout),
+            )
+        return self._http_client
+
+    def get(self, provider: str) -> AsyncOpenAI:
+        """获取 provider 对应的 OpenAI 兼容客户端"""
+        client = self._clients.get(provider)
+        if client is not None:
+            return client
+        if provider not in PROVIDERS:
+            raise ValueError(f"Unsupported provider: {provider}")
+        base_url_key, api_key_key, default_base_url = PROVIDERS[provider]
+        api_key = getattr(settings, api_key_key)
+        if not api_key:
+            raise ValueError(f"API key for provider {provider} is not configured")
+        client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=getattr(settings, base_url_key) or default_base_url,
+            http_client=self.http_client(),
+        )
+        self._clients[provider] = client
+        return client
+
+    async def aclose(self):
+        if self._http_client is not None:
+            await self._http_client.aclose()
+        self._http_client = None
+        self._transport = None
+        self._clients = {}
+
+    def stats(self) -> Dict[str, Any]:
+        """连接池统计"""
+        stats = {
+            "providers": sorted(self._clients),
+            "requests_total": 0,
+            "requests_in_flight": 0,
+            "max_connections": settings.http_max_connections,
+            "max_keepalive_connections": settings.http_max_keepalive_connections,
+            "connections": 0,
+            "idle_connections": 0,
+        }
+        if self._transport is None:
+            return stats
+        stats["requests_total"] = self._transport.requests_total
+        stats["requests_in_flight"] = self._transport.requests_in_flight
+        # httpx 没有公开连接池的状态，这里读取 httpcore 连接池的连接列表
+        pool = getattr(self._transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        stats["connections"] = len(connections)
+        stats["idle_connections"] = sum(1 for connection in connections if connection.is_idle())
+        return stats
+
+
+# 创建服务实例
+provider_clients = ProviderClientRegistry()
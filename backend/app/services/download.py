@@ -0,0 +1,113 @@
+import asyncio
+import contextlib
+import os
+import time
+from typing import List, Optional
+
+import httpx
+from loguru import logger
+from PIL import Image
+
+from app.config import settings
+from app.exceptions import DownloadError
+from app.schemas.video import StoryScene
+from app.services.clients import provider_clients
+from app.utils import utils
+
+CHUNK_SIZE = 64 * 1024
+ALLOWED_CONTENT_TYPES = ("image/", "application/octet-stream", "binary/octet-stream")
+
+
+def _verify_image(path: str):
+    with Image.open(path) as image:
+        image.verify()
+
+
+async def download_image(url: str, path: str) -> str:
+    """流式下载图片到 path
+
+    先写入临时文件，校验 Content-Type、大小和图片能否解码后再重命名到 path。
+    网络错误、超时和 5xx/429 会按指数退避重试，其它错误直接抛出 DownloadError。
+    """
+    tmp_path = f"{path}.{utils.get_uuid(True)}.part"
+    last_error: Optional[Exception] = None
+    for attempt in range(1 + settings.download_retries):
+        if attempt:
+            await asyncio.sleep(settings.download_backoff * 2 ** (attempt - 1))
+        try:
+            async with provider_clients.http_client().stream(
+                "GET", url, timeout=settings.download_timeout, follow_redirects=True
+            ) as response:
+                if response.status_code == 429 or response.status_code >= 500:
+                    raise httpx.HTTPStatusError(f"status {response.status_code}", request=response.request, response=response)
+                if response.status_code != 200:
+                    raise DownloadError(f"Unexpected status {response.status_code} for {url}")
+                content_type = response.headers.get("content-type", "")
+                if content_type and not content_type.startswith(ALLOWED_CONTENT_TYPES):
+                    raise DownloadError(f"Unexpected content type {content_type} for {url}")
+                content_length = int(response.headers.get("content-length") or 0)
+                if content_length > settings.download_max_bytes:
+                    raise DownloadError(f"Image too large: {content_length} bytes")
+
+                size = 0
+                with open(tmp_path, "wb") as f:
+                    async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                        size += len(chunk)
+                        if size > settings.download_max_bytes:
+                            raise DownloadError(f"Image too large: more than {settings.download_max_bytes} bytes")
+                        f.write(chunk)
+
+            try:
+                await asyncio.to_thread(_verify_image, tmp_path)
+            except Exception as e:
+                raise DownloadError(f"Downloaded file is not a valid image: {e}")
+            os.replace(tmp_path, path)
+            return path
+        except (httpx.TransportError, httpx.HTTPStatusError) as e:
+            last_error = e
+            logger.warning(f"Failed to download {url}, try: {attempt + 1}: {e}")
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    raise DownloadError(f"Failed to download {url}: {last_error}")
+
+
+async def download_scene_image(task_dir: str, i: int, url: str, semaphore: Optional[asyncio.Semaphore] = None) -> Optional[str]:
+    """下载单个场景图片到 <i>.png，已存在时跳过，失败只记录日志
+
+    Returns:
+        Optional[str]: 图片路径，没有图片时返回 None
+    """
+    image_path = os.path.join(task_dir, f"{i}.png")
+    if os.path.exists(image_path):
+        return image_path
+    if not url:
+        return None
+    async with semaphore or contextlib.nullcontext():
+        try:
+            await download_image(url, image_path)
+            logger.info(f"Downloaded image {i} to {image_path}")
+            return image_path
+        except Exception as e:
+            logger.error(f"Failed to download image {i}: {e}")
+            return None
+
+
+async def download_scene_images(task_dir: str, scenes: List[StoryScene], progress=None):
+    """并发下载场景图片到任务目录，已存在的图片会跳过"""
+    semaphore = asyncio.Semaphore(max(1, settings.download_concurrency))
+    finished = 0
+    start = time.perf_counter()
+
+    async def download(i: int, scene: StoryScene):
+        nonlocal finished
+        image_path = await download_scene_image(task_dir, i, scene.url, semaphore)
+        finished += 1
+        if progress:
+            progress("images", finished * 100 // len(scenes), scene=i, url=scene.url, image_file=image_path)
+
+    await asyncio.gather(*[download(i, scene) for i, scene in enumerate(scenes, 1)])
+    elapsed = time.perf_counter() - start
+    logger.info(f"Downloaded {len(scenes)} images in {elapsed:.2f}s")
+    if progress:
+        progress("images", 100, elapsed=elapsed)
@@ -1,14 +1,18 @@
-from openai import OpenAI
 from app.config import get_settings
+import asyncio
+import hashlib
 from loguru import logger
-from typing import List, Dict, Any
+from typing import AsyncIterator, List, Dict, Any
 import json
 from http import HTTPStatus
-import requests
 import random
 
 from app.models.const import LANGUAGE_NAMES, Language
 from app.exceptions import LLMResponseValidationError
+from app.services.clients import provider_clients
+from app.services.llm_cache import ResponseCache, response_cache
+from app.utils.json_stream import JSONArrayStreamParser
+from app.utils.singleflight import SingleFlight
 import dashscope
 
 from dashscope import ImageSynthesis
@@ -19,28 +23,22 @@ settings = get_settings()
 
 settings.to_dict()
 
-openai_client = None
-if settings.openai_api_key:
-   openai_client = OpenAI(api_key=settings.openai_api_key, base_url=settings.openai_base_url or "https://api.openai.com/v1")
-aliyun_text_client = None
 if settings.aliyun_api_key:
     dashscope.api_key = settings.aliyun_api_key
-    aliyun_text_client = OpenAI(base_url=settings.aliyun_base_url or "https://dashscope.aliyuncs.com/compatible-mode/v1", api_key=settings.aliyun_api_key) 
-if settings.deepseek_api_key:
-    deepseek_client = OpenAI(api_key=settings.deepseek_api_key, base_url=settings.deepseek_base_url or "https://api.deepseek.com/v1")
-if settings.ollama_api_key:
-    ollama_client = OpenAI(api_key=settings.ollama_api_key, base_url=settings.ollama_base_url or "http://localhost:11434/v1")
-if settings.siliconflow_api_key:
-    siliconflow_client = OpenAI(api_key=settings.siliconflow_api_key, base_url=settings.siliconflow_base_url or "https://api.siliconflow.cn/v1")
-if settings.glm_api_key:
-    glm_client = OpenAI(api_key=settings.glm_api_key, base_url=settings.glm_base_url or "https://open.bigmodel.cn/api/paas/v4")
+
+class _StreamAborted(Exception):
+    """流式生成的发起方中途退出，没有得到完整的响应"""
+
 
 class LLMService:
     def __init__(self):
-        self.openai_client = openai_client
-        self.aliyun_text_client = aliyun_text_client
         self.text_llm_model = settings.text_llm_model
         self.image_llm_model = settings.image_llm_model
+        # 每个图片 provider 一个信号量，限制所有请求共享的并发数
+        self._image_semaphores: Dict[str, asyncio.Semaphore] = {}
+        # 相同参数的并发请求合并为一次上游调用
+        self._response_flight = SingleFlight("llm_response")
+        self._image_flight = SingleFlight("llm_image")
     
     async def generate_story(self, request: StoryGenerationRequest) -> List[Dict[str, Any]]:
         """生成故事场景
@@ -51,13 +49,107 @@ class LLMService:
         Returns:
             List[Dict[str, Any]]: 故事场景列表
         """
+        messages = await self._get_story_messages(request)
+        response = await self._generate_response(text_llm_provider = request.text_llm_provider or None, text_llm_model = request.text_llm_model or None, messages=messages, response_format="json_object", use_cache=not request.no_cache)
+        return self._parse_story(response)
+
+    async def stream_story(self, request: StoryGenerationRequest) -> AsyncIterator[Dict[str, Any]]:
+        """流式生成故事场景，每个场景完整生成后立即返回
+
+        使用 provider 的流式接口，边接收边解析 {"list": [...]}，调用方可以在后面的场景还在生成时
+        开始处理前面的场景。缓存命中或关闭 llm_stream 时一次性拿到结果后逐个返回。
+
+        Yields:
+            Dict[str, Any]: 已校验的场景，包含 text 和 image_prompt
+        """
+        if not settings.llm_stream:
+            for scene in await self.generate_story(request):
+                yield scene
+            return
+
+        messages = await self._get_story_messages(request)
+        text_llm_provider = request.text_llm_provider or settings.text_provider
+        text_llm_model = request.text_llm_model or settings.text_llm_model
+        # 缓存和 single-flight 使用同一个 key，与 _generate_response 一致
+        key = ResponseCache.make_key(provider=text_llm_provider, model=text_llm_model, messages=messages, response_format="json_object")
+        if response_cache and not request.no_cache:
+            content = await asyncio.to_thread(response_cache.get, key)
+            if content is not None:
+                logger.info(f"llm cache hit, key: {key}")
+                for scene in self._parse_story(json.loads(content)):
+                    yield scene
+                return
+
+        # 相同的故事正在生成（流式或一次性）时等待它的完整文本，不重复请求
+        while True:
+            shared = self._response_flight.join(key)
+            if shared is None:
+                break
+            try:
+                content = await shared
+            except _StreamAborted:
+                # 发起请求的调用方中途退出，由自己重新发起
+                continue
+            logger.info(f"Joined in-flight story generation, key: {key}")
+            for scene in self._parse_story(json.loads(content)):
+                yield scene
+            return
+
+        flight = self._response_flight.begin(key)
+        try:
+            stream = await provider_clients.get(text_llm_provider).chat.completions.create(
+                model=text_llm_model,
+                response_format={"type": "json_object"},
+                messages=messages,
+                stream=True,
+            )
+            parser = JSONArrayStreamParser("list")
+            chunks = []
+            emitted = 0
+            async for chunk in stream:
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                delta = chunk.choices[0].delta.content
+                chunks.append(delta)
+                for scene in parser.feed(delta):
+                    scene = self.normalize_keys(scene)
+                    self._validate_scene(emitted, scene)
+                    emitted += 1
+                    logger.info(f"Streamed scene {emitted}: {json.dumps(scene, ensure_ascii=False)}")
+                    yield scene
+
+            # 以完整文本为准再校验一次，增量解析漏掉的场景在这里补上
+            content = "".join(chunks)
+            try:
+                scenes = self._parse_story(json.loads(content))
+            except Exception as e:
+                logger.error(f"Failed to parse response: {e}")
+                raise e
+            # 先把完整文本交给等待的调用者，之后写缓存时被取消也不影响它们
+            flight.set_result(content)
+            if response_cache:
+                await asyncio.to_thread(response_cache.set, key, content)
+        except Exception as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            if not flight.done():
+                # 调用方没有读完就关闭了生成器或被取消，等待的调用者改为自己发起请求
+                flight.set_exception(_StreamAborted())
+        for scene in scenes[emitted:]:
+            yield scene
+
+    async def _get_story_messages(self, request: StoryGenerationRequest) -> List[Dict[str, str]]:
         messages = [
             {"role": "system", "content": "你是一个专业的故事创作者，善于创作引人入胜的故事。请只返回JSON格式的内容。"},
             {"role": "user", "content": await self._get_story_prompt(request.story_prompt, request.language, request.segments)}
         ]
         # print(messages)
         logger.info(f"prompt messages: {json.dumps(messages, indent=4, ensure_ascii=False)}")
-        response = await self._generate_response(text_llm_provider = request.text_llm_provider or None, text_llm_model = request.text_llm_model or None, messages=messages, response_format="json_object")
+        return messages
+
+    def _parse_story(self, response: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """从 LLM 返回的 JSON 中取出场景列表并校验"""
         response = response["list"]
         response = self.normalize_keys(response)
 
@@ -66,6 +158,7 @@ class LLMService:
         self._validate_story_response(response)
         
         return response
+
     def normalize_keys(self, data):
         """
         阿里云和 openai 的模型返回结果不一致，处理一下
@@ -90,9 +183,11 @@ class LLMService:
         else:
             raise TypeError("Input must be a dict or list of dicts")
 
-    def generate_image(self, *, prompt: str, image_llm_provider: str = None, image_llm_model: str = None, resolution: str = "1024x1024") -> str:
-        # return "https://dashscope-result-bj.oss-cn-beijing.aliyuncs.com/1d/56/20250118/3c4cc727/4fc622b5-54a6-484c-bf1f-f1cfb66ace2d-1.png?Expires=1737290655&OSSAccessKeyId=LTAI5tQZd8AEcZX6KZV4G8qL&Signature=W8D4CN3uonQ2pL1e9xGMWufz33E%3D"
-        """生成图片
+    async def generate_image(self, *, prompt: str, image_llm_provider: str = None, image_llm_model: str = None, resolution: str = "1024x1024") -> str:
+        """生成图片，provider、模型、提示词和分辨率都相同的并发请求只调用一次上游
+
+        超时在共享的请求内部生效：上游超过 image_timeout 秒没有返回时取消该请求，所有等待者得到 asyncio.TimeoutError，
+        key 随即释放，重试会重新发起请求，不会再合并到卡住的请求上。
 
         Args:
             prompt (str): 图片描述
@@ -101,8 +196,25 @@ class LLMService:
         Returns:
             str: 图片URL
         """
+        image_llm_provider = image_llm_provider or settings.image_provider
+        image_llm_model = image_llm_model or settings.image_llm_model
+        payload = json.dumps(
+            {"provider": image_llm_provider, "model": image_llm_model, "prompt": prompt, "resolution": resolution},
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+        key = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        return await self._image_flight.do(
+            key,
+            lambda: asyncio.wait_for(
+                self._request_image(prompt=prompt, image_llm_provider=image_llm_provider, image_llm_model=image_llm_model, resolution=resolution),
+                timeout=settings.image_timeout,
+            ),
+        )
 
-        
+    async def _request_image(self, *, prompt: str, image_llm_provider: str = None, image_llm_model: str = None, resolution: str = "1024x1024") -> str:
+        """请求上游生成图片，失败时返回空字符串"""
+        # return "https://dashscope-result-bj.oss-cn-beijing.aliyuncs.com/1d/56/20250118/3c4cc727/4fc622b5-54a6-484c-bf1f-f1cfb66ace2d-1.png?Expires=1737290655&OSSAccessKeyId=LTAI5tQZd8AEcZX6KZV4G8qL&Signature=W8D4CN3uonQ2pL1e9xGMWufz33E%3D"
         image_llm_provider =  image_llm_provider or settings.image_provider
         image_llm_model = image_llm_model or settings.image_llm_model
 
@@ -111,7 +223,8 @@ class LLMService:
             safe_prompt = f"Create a safe, family-friendly illustration. {prompt} The image should be appropriate for all ages, non-violent, and non-controversial."
             
             if image_llm_provider == "aliyun":
-                rsp = ImageSynthesis.call(model=image_llm_model,
+                # dashscope SDK 只有同步接口，放到线程中执行
+                rsp = await asyncio.to_thread(ImageSynthesis.call, model=image_llm_model,
                               prompt=prompt,
                               size=resolution,)
                 if rsp.status_code == HTTPStatus.OK:
@@ -125,7 +238,7 @@ class LLMService:
             elif image_llm_provider == "openai":
                 if (resolution != None):
                     resolution = resolution.replace("*", "x")
-                response = self.openai_client.images.generate(
+                response = await provider_clients.get("openai").images.generate(
                     model=image_llm_model,
                     prompt=safe_prompt,
                     size=resolution,
@@ -137,7 +250,7 @@ class LLMService:
             elif image_llm_provider == "glm":
                 if (resolution != None):
                     resolution = resolution.replace("*", "x")
-                response = self.openai_client.images.generate(
+                response = await provider_clients.get("glm").images.generate(
                     model=image_llm_model,
                     prompt=safe_prompt,
                     size=resolution,
@@ -161,7 +274,8 @@ class LLMService:
                     "Authorization": "Bearer " + settings.siliconflow_api_key,
                     "Content-Type": "application/json"
                 }
-                response = requests.request("POST", "https://api.siliconflow.cn/v1/images/generations", json=payload, headers=headers)
+                base_url = settings.siliconflow_base_url or "https://api.siliconflow.cn/v1"
+                response = await provider_clients.http_client().post(f"{base_url}/images/generations", json=payload, headers=headers)
                 if response.text != None:
                     response = json.loads(response.text)
                     return response["images"][0]["url"]
@@ -181,22 +295,62 @@ class LLMService:
         Returns:
             List[Dict[str, Any]]: 故事场景列表，每个场景包含文本、图片提示词和图片URL
         """
-        # 先生成故事
-        story_segments = await self.generate_story(
-            request,
-        )
-
-        # 为每个场景生成图片
-        for segment in story_segments:
-            try:
-                image_url = self.generate_image(prompt=segment["image_prompt"], resolution=request.resolution, image_llm_provider=request.image_llm_provider, image_llm_model=request.image_llm_model)
-                segment["url"] = image_url
-            except Exception as e:
-                logger.error(f"Failed to generate image for segment: {e}")
-                segment["url"] = None
+        # 流式生成故事，每个场景到达后立即开始生成图片
+        story_segments = []
+        image_tasks = []
+        try:
+            async for segment in self.stream_story(request):
+                story_segments.append(segment)
+                image_tasks.append(asyncio.create_task(
+                    self.generate_segment_image(len(story_segments), segment, request)
+                ))
+            image_urls = await asyncio.gather(*image_tasks)
+        except BaseException:
+            for image_task in image_tasks:
+                image_task.cancel()
+            raise
+        # 结果按场景顺序写回
+        for segment, image_url in zip(story_segments, image_urls):
+            segment["url"] = image_url
 
         return story_segments
+
+    def _get_image_semaphore(self, image_llm_provider: str) -> asyncio.Semaphore:
+        semaphore = self._image_semaphores.get(image_llm_provider)
+        if semaphore is None:
+            limit = settings.image_provider_concurrency.get(image_llm_provider, settings.image_concurrency)
+            semaphore = asyncio.Semaphore(max(1, limit))
+            self._image_semaphores[image_llm_provider] = semaphore
+        return semaphore
+
+    async def generate_segment_image(self, index: int, segment: Dict[str, Any], request: StoryGenerationRequest) -> str:
+        """为单个场景生成图片，带超时和重试，失败时返回 None
+
+        超时由 generate_image 在上游请求内部处理，超时后请求已被取消，释放信号量时不会留下仍在运行的请求。
+        """
+        image_llm_provider = request.image_llm_provider or settings.image_provider
+        semaphore = self._get_image_semaphore(image_llm_provider)
+        for attempt in range(1 + settings.image_retries):
+            async with semaphore:
+                try:
+                    image_url = await self.generate_image(
+                        prompt=segment["image_prompt"],
+                        resolution=request.resolution,
+                        image_llm_provider=request.image_llm_provider,
+                        image_llm_model=request.image_llm_model,
+                    )
+                    if image_url:
+                        return image_url
+                    logger.warning(f"Empty image url for scene {index}, try: {attempt + 1}")
+                except asyncio.TimeoutError:
+                    logger.warning(f"Image generation timed out for scene {index}, try: {attempt + 1}")
+                except Exception as e:
+                    logger.error(f"Failed to generate image for scene {index}, try: {attempt + 1}: {e}")
+        return None
     
+    def singleflight_stats(self) -> List[Dict[str, Any]]:
+        return [self._response_flight.stats(), self._image_flight.stats()]
+
     def get_llm_providers(self) -> Dict[str, List[str]]:
         imgLLMList = []
         textLLMList = []
@@ -231,27 +385,36 @@ class LLMService:
             raise LLMResponseValidationError("Response must be an array")
 
         for i, scene in enumerate(response):
-            if not isinstance(scene, dict):
-                raise LLMResponseValidationError(f"story item {i} must be an object")
-            
-            if "text" not in scene:
-                raise LLMResponseValidationError(f"Scene {i} missing 'text' field")
-            
-            if "image_prompt" not in scene:
-                raise LLMResponseValidationError(f"Scene {i} missing 'image_prompt' field")
-            
-            if not isinstance(scene["text"], str):
-                raise LLMResponseValidationError(f"Scene {i} 'text' must be a string")
-            
-            if not isinstance(scene["image_prompt"], str):
-                raise LLMResponseValidationError(f"Scene {i} 'image_prompt' must be a string")
+            self._validate_scene(i, scene)
+
+    def _validate_scene(self, i: int, scene: any) -> None:
+        """验证单个场景
+
+        Raises:
+            LLMResponseValidationError: 场景格式错误
+        """
+        if not isinstance(scene, dict):
+            raise LLMResponseValidationError(f"story item {i} must be an object")
+        
+        if "text" not in scene:
+            raise LLMResponseValidationError(f"Scene {i} missing 'text' field")
+        
+        if "image_prompt" not in scene:
+            raise LLMResponseValidationError(f"Scene {i} missing 'image_prompt' field")
+        
+        if not isinstance(scene["text"], str):
+            raise LLMResponseValidationError(f"Scene {i} 'text' must be a string")
+        
+        if not isinstance(scene["image_prompt"], str):
+            raise LLMResponseValidationError(f"Scene {i} 'image_prompt' must be a string")
 
-    async def _generate_response(self, *, text_llm_provider: str = None, text_llm_model: str = None, messages: List[Dict[str, str]], response_format: str = "json_object") -> any:
+    async def _generate_response(self, *, text_llm_provider: str = None, text_llm_model: str = None, messages: List[Dict[str, str]], response_format: str = "json_object", use_cache: bool = True) -> any:
         """生成 LLM 响应
 
         Args:
             messages: 消息列表
             response_format: 响应格式，默认为 json_object
+            use_cache: 是否读取缓存的响应，为 False 时重新请求并刷新缓存
 
         Returns:
             Dict[str, Any]: 解析后的响应
@@ -260,33 +423,45 @@ class LLMService:
             Exception: 请求失败或解析失败时抛出异常
         """
         if text_llm_provider == None:
-            text_llm_provider = settings.text_llm_provider
-        if text_llm_provider == "aliyun":
-            text_client = self.aliyun_text_client
-        elif text_llm_provider == "openai":
-            text_client = self.openai_client
-        elif text_llm_provider == "deepseek":
-            text_client = deepseek_client
-        elif text_llm_provider == "ollama":
-            text_client = ollama_client
-        elif text_llm_provider == "siliconflow":
-            text_client = siliconflow_client
-        elif text_llm_provider == "glm":
-            text_client = glm_client
+            text_llm_provider = settings.text_provider
+        text_client = provider_clients.get(text_llm_provider)
         if text_llm_model == None:
             text_llm_model = settings.text_llm_model
-        response = text_client.chat.completions.create(
-            model= text_llm_model,
-            response_format={"type": response_format},
-            messages=messages,
-        )
-        try:
-            content = response.choices[0].message.content
-            result = json.loads(content)
-            return result
-        except Exception as e:
-            logger.error(f"Failed to parse response: {e}")
-            raise e
+
+        # single-flight 与缓存使用同一个 key，没有启用缓存时也按相同方式计算
+        key = ResponseCache.make_key(provider=text_llm_provider, model=text_llm_model, messages=messages, response_format=response_format)
+        content = None
+        if response_cache and use_cache:
+            content = await asyncio.to_thread(response_cache.get, key)
+        if content is not None:
+            logger.info(f"llm cache hit, key: {key}")
+            return json.loads(content)
+
+        async def request() -> str:
+            response = await text_client.chat.completions.create(
+                model= text_llm_model,
+                response_format={"type": response_format},
+                messages=messages,
+            )
+            try:
+                content = response.choices[0].message.content
+                json.loads(content)
+            except Exception as e:
+                logger.error(f"Failed to parse response: {e}")
+                raise e
+            # 只缓存能正确解析的响应
+            if response_cache:
+                await asyncio.to_thread(response_cache.set, key, content)
+            return content
+
+        # 合并的调用共享同一份原始文本，各自解析，返回的对象互不影响
+        while True:
+            try:
+                content = await self._response_flight.do(key, request)
+            except _StreamAborted:
+                # 合并进的流式生成中途退出，由自己重新发起
+                continue
+            return json.loads(content)
 
     async def _get_story_prompt(self, story_prompt: str = None, language: Language = Language.CHINESE_CN, segments: int = 3) -> str:
         """生成故事提示词
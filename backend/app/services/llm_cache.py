@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from loguru import logger
+
+from app.config import settings
+from app.utils import utils
+
+
+class MemoryCacheBackend:
+    """进程内 LRU 缓存"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: float):
+        with self._lock:
+            self._data[key] = (time.time() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+
+class SQLiteCacheBackend:
+    """基于 SQLite 文件的缓存，多个 worker 进程可以共享"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """打开连接，退出时提交（出错时回滚）并关闭；sqlite3 的连接自身作为上下文管理器时不会关闭"""
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT value FROM llm_cache WHERE key = ? AND expires_at >= ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, ttl: float):
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, time.time() + ttl),
+            )
+            conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (time.time(),))
+
+
+class ResponseCache:
+    """LLM 原始响应缓存
+
+    缓存的是模型返回的原始文本，命中后仍走与实时调用相同的解析和校验流程。
+    sqlite 后端的读写是阻塞的，在异步代码中通过 asyncio.to_thread 调用 get 和 set。
+    """
+
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*, provider: str, model: str, messages: List[Dict[str, str]], response_format: str) -> str:
+        normalized = [
+            {"role": message["role"], "content": " ".join(str(message["content"]).split())}
+            for message in messages
+        ]
+        payload = json.dumps(
+            {"provider": provider, "model": model, "messages": normalized, "response_format": response_format},
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logger.error(f"Failed to read llm cache: {e}")
+            value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value: str):
+        try:
+            self.backend.set(key, value, self.ttl)
+        except Exception as e:
+            logger.error(f"Failed to write llm cache: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": type(self.backend).__name__, "hits": self.hits, "misses": self.misses}
+
+
+def create_response_cache() -> Optional[ResponseCache]:
+    """根据配置创建响应缓存，llm_cache_backend 为 none 时返回 None"""
+    backend_name = settings.llm_cache_backend.lower()
+    if backend_name == "memory":
+        backend = MemoryCacheBackend(settings.llm_cache_max_entries)
+    elif backend_name == "sqlite":
+        backend = SQLiteCacheBackend(os.path.join(utils.cache_dir(), "llm_cache.sqlite3"))
+    elif backend_name == "none":
+        return None
+    else:
+        raise ValueError(f"Unsupported llm cache backend: {settings.llm_cache_backend}")
+    return ResponseCache(backend, settings.llm_cache_ttl)
+
+
+# 创建缓存实例
+response_cache = create_response_cache()
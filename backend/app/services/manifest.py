@@ -0,0 +1,83 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional
+
+from loguru import logger
+
+from app.utils import task_store
+
+MANIFEST_FILE = "manifest.json"
+# 每个场景参与渲染的输入文件：图片、语音、字幕
+SCENE_INPUTS = ("png", "mp3", "srt")
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def sha1_file(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """任务产物清单 tasks/<id>/manifest.json
+
+    files 记录任务目录下每个产物的内容哈希，大小和修改时间不变时直接使用记录的哈希，不重新读文件；
+    segments 记录每个场景片段由哪些输入（图片、语音、字幕的哈希和渲染参数）生成。
+    输入的内容变化时片段的输入键随之变化，只有这些片段需要重新渲染，修改时间变化而内容相同时仍然复用。
+
+    清单只在主进程中读写，渲染进程池里的子进程不访问。
+    """
+
+    def __init__(self, task_dir: str):
+        self.task_dir = task_dir
+        self.path = os.path.join(task_dir, MANIFEST_FILE)
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.segments: Dict[str, str] = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self.files = data.get("files") or {}
+                self.segments = data.get("segments") or {}
+            except Exception as e:
+                logger.warning(f"Ignoring broken manifest {self.path}: {e}")
+
+    def file_hash(self, name: str) -> Optional[str]:
+        """任务目录下文件的内容哈希，文件不存在时返回 None"""
+        path = os.path.join(self.task_dir, name)
+        if not os.path.exists(path):
+            self.files.pop(name, None)
+            return None
+        stat = os.stat(path)
+        entry = self.files.get(name)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["sha1"]
+        digest = sha1_file(path)
+        self.files[name] = {"sha1": digest, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        return digest
+
+    def segment_key(self, index: int, engine: str, profile: tuple) -> str:
+        """场景片段的输入键：渲染引擎、渲染参数和各输入文件的哈希"""
+        parts = [engine, *map(str, profile)]
+        parts += [self.file_hash(f"{index}.{ext}") or "" for ext in SCENE_INPUTS]
+        return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()
+
+    def _segment_name(self, segment_file: str) -> str:
+        return os.path.relpath(segment_file, self.task_dir).replace(os.sep, "/")
+
+    def segment_is_fresh(self, segment_file: str, key: str) -> bool:
+        """片段存在且由相同的输入生成时可以直接复用"""
+        return os.path.exists(segment_file) and self.segments.get(self._segment_name(segment_file)) == key
+
+    def record_segment(self, segment_file: str, key: str):
+        name = self._segment_name(segment_file)
+        self.segments[name] = key
+        self.file_hash(name)
+        self.save()
+
+    def save(self):
+        """原子地写入，中途退出不会留下写了一半的清单"""
+        task_store.write_json(self.path, {"files": self.files, "segments": self.segments})
@@ -0,0 +1,248 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+import imageio_ffmpeg
+from loguru import logger
+from PIL import Image
+
+from app.config import settings
+from app.services.manifest import Manifest
+from app.services.subtitle import SubtitleCues, get_font_path, write_ass
+
+# 与 moviepy 引擎保持一致的输出参数
+FPS = 24
+AUDIO_SAMPLE_RATE = 44100
+# 图片放大比例，放大后的图片在时长内从左向右平移
+IMAGE_SCALE = 1.2
+
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+class RenderProfile(NamedTuple):
+    """渲染参数，height 为 0 时保持图片原尺寸"""
+    name: str
+    # 上报进度使用的阶段名
+    stage: str
+    output: str
+    height: int
+    fps: int
+    preset: str
+    crf: int
+
+
+def get_profile(quality: str = "full") -> RenderProfile:
+    """按渲染质量取渲染参数
+
+    preview 缩小到 preview_height、降低帧率并使用最快的编码参数，用于检查节奏；full 为原尺寸完整质量。
+    """
+    if quality == "preview":
+        return RenderProfile("preview", "preview", "preview.mp4", settings.preview_height, settings.preview_fps, settings.preview_preset, settings.preview_crf)
+    return RenderProfile("full", "render", "video.mp4", 0, FPS, settings.ffmpeg_preset, settings.ffmpeg_crf)
+
+
+def output_size(width: int, height: int, max_height: int = 0) -> Tuple[int, int]:
+    """按最大高度等比缩小后的画面尺寸，max_height 为 0 时不缩小，yuv420p 要求宽高为偶数"""
+    if max_height and height > max_height:
+        width, height = width * max_height / height, max_height
+    return int(width) // 2 * 2, int(height) // 2 * 2
+
+
+def get_ffmpeg() -> str:
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """渲染进程池，所有任务共享
+
+    使用 spawn 启动子进程，避免 fork 带上事件循环和线程池的状态。
+    """
+    global _process_pool
+    if _process_pool is None:
+        workers = settings.render_workers or os.cpu_count() or 2
+        _process_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _process_pool
+
+
+def shutdown_process_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+def segment_path(task_dir: str, index: int, engine: str, profile: str = "full") -> str:
+    """场景片段路径，不同引擎、不同渲染质量的编码参数不同，片段分开存放"""
+    segment_dir = os.path.join(task_dir, "segments")
+    os.makedirs(segment_dir, exist_ok=True)
+    if profile != "full":
+        engine = f"{engine}_{profile}"
+    return os.path.join(segment_dir, f"{engine}_{index}.mp4")
+
+
+def _escape_filter_path(path: str) -> str:
+    """转义 filtergraph 参数中的路径"""
+    return path.replace("\\", "/").replace(":", "\\:").replace("'", "\\'")
+
+
+async def run_ffmpeg(args: List[str], duration: float = 0, on_progress: Optional[Callable[[float], None]] = None):
+    """执行 ffmpeg 命令，duration 大于 0 时通过 on_progress 回调 0~1 的进度"""
+    cmd = [get_ffmpeg(), "-y", "-hide_banner", "-loglevel", "error", "-nostats", "-progress", "pipe:1", *args]
+    logger.debug(f"Running ffmpeg: {' '.join(cmd)}")
+    process = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+
+    async def read_progress():
+        async for line in process.stdout:
+            key, _, value = line.decode(errors="ignore").strip().partition("=")
+            if key == "out_time_ms" and duration > 0 and on_progress and value.isdigit():
+                # out_time_ms 实际单位是微秒
+                on_progress(min(1.0, int(value) / 1_000_000 / duration))
+
+    try:
+        _, stderr = await asyncio.gather(read_progress(), process.stderr.read())
+        returncode = await process.wait()
+    except asyncio.CancelledError:
+        # 任务被关闭或其它片段失败时结束 ffmpeg 进程，避免它在后台继续写任务目录
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+        await process.wait()
+        raise
+    if returncode != 0:
+        raise RuntimeError(f"ffmpeg exited with code {returncode}: {stderr.decode(errors='ignore').strip()}")
+
+
+def build_scene_args(image_file: str, audio_file: str, ass_file: Optional[str], duration: float, width: int, height: int, output_file: str, profile: Optional[RenderProfile] = None) -> List[str]:
+    """构建单个场景的 ffmpeg 参数
+
+    一个 filtergraph 完成：放大图片、随时间平移裁剪出 width x height 的画面、叠加 ASS 字幕，
+    再与语音一起编码为 H.264 + AAC。帧率和编码参数取自 profile，默认为完整质量。
+    """
+    profile = profile or get_profile()
+    scaled_w = int(width * IMAGE_SCALE) // 2 * 2
+    scaled_h = int(height * IMAGE_SCALE) // 2 * 2
+    filters = [
+        f"scale={scaled_w}:{scaled_h}",
+        f"crop={width}:{height}:x='(iw-ow)*t/{duration:.3f}':y='(ih-oh)/2'",
+    ]
+    if ass_file:
+        fonts_dir = os.path.dirname(get_font_path())
+        filters.append(f"ass='{_escape_filter_path(ass_file)}':fontsdir='{_escape_filter_path(fonts_dir)}'")
+    filters.append("format=yuv420p")
+    return [
+        "-loop", "1", "-framerate", str(profile.fps), "-i", image_file,
+        "-i", audio_file,
+        "-filter_complex", f"[0:v]{','.join(filters)}[v]",
+        "-map", "[v]", "-map", "1:a",
+        "-t", f"{duration:.3f}",
+        "-r", str(profile.fps),
+        "-c:v", "libx264", "-preset", profile.preset, "-crf", str(profile.crf),
+        "-c:a", "aac", "-ar", str(AUDIO_SAMPLE_RATE), "-ac", "2",
+        output_file,
+    ]
+
+
+async def render_scene(task_dir: str, index: int, on_progress: Optional[Callable[[float], None]] = None, cues: Optional[SubtitleCues] = None, profile: Optional[RenderProfile] = None, manifest: Optional[Manifest] = None) -> str:
+    """渲染单个场景片段，图片、语音、字幕的内容和渲染参数都没有变化时直接复用已有片段
+
+    cues 为语音阶段生成的字幕，不传时读取 <index>.srt。
+    ASS 字幕按图片原尺寸排版，缩小输出时由 libass 按比例缩放。
+    """
+    profile = profile or get_profile()
+    manifest = manifest or Manifest(task_dir)
+    output_file = segment_path(task_dir, index, "ffmpeg", profile.name)
+    key = manifest.segment_key(index, "ffmpeg", profile)
+    if manifest.segment_is_fresh(output_file, key):
+        logger.info(f"Reusing segment for scene {index}: {output_file}")
+        return output_file
+    image_file = os.path.join(task_dir, f"{index}.png")
+    audio_file = os.path.join(task_dir, f"{index}.mp3")
+    subtitle_file = os.path.join(task_dir, f"{index}.srt")
+    for path in (image_file, audio_file) if cues else (image_file, audio_file, subtitle_file):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Required file not found for scene {index}: {path}")
+
+    subtitle_items = cues or SubtitleCues.from_srt(subtitle_file)
+    duration = subtitle_items.duration
+    with Image.open(image_file) as image:
+        # yuv420p 要求宽高为偶数
+        width, height = image.width // 2 * 2, image.height // 2 * 2
+
+    ass_file = os.path.join(task_dir, f"{index}.ass")
+    write_ass(subtitle_items, ass_file, width, height, get_font_path())
+    tmp_file = output_file.replace(".mp4", ".part.mp4")
+    output_width, output_height = output_size(width, height, profile.height)
+    await run_ffmpeg(
+        build_scene_args(image_file, audio_file, ass_file, duration, output_width, output_height, tmp_file, profile),
+        duration=duration,
+        on_progress=on_progress,
+    )
+    os.replace(tmp_file, output_file)
+    manifest.record_segment(output_file, key)
+    return output_file
+
+
+def _escape_concat_path(path: str) -> str:
+    return os.path.abspath(path).replace("'", "'\\''")
+
+
+async def concat_segments(segment_files: List[str], output_file: str):
+    """用 concat demuxer 拼接编码参数相同的片段，不重新编码
+
+    先输出到临时文件再替换，拼接过程中访问视频地址得到的仍是上一次的完整视频。
+    """
+    list_file = output_file + ".txt"
+    with open(list_file, "w", encoding="utf-8") as f:
+        for segment_file in segment_files:
+            f.write(f"file '{_escape_concat_path(segment_file)}'\n")
+    tmp_file = output_file.replace(".mp4", ".part.mp4")
+    try:
+        await run_ffmpeg(["-f", "concat", "-safe", "0", "-i", list_file, "-c", "copy", "-movflags", "+faststart", tmp_file])
+        os.replace(tmp_file, output_file)
+    finally:
+        os.remove(list_file)
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+
+async def render_video(task_dir: str, scene_count: int, progress=None, cues: Optional[List[Optional[SubtitleCues]]] = None, profile: Optional[RenderProfile] = None) -> str:
+    """使用 ffmpeg 渲染整个视频
+
+    每个场景一个 filtergraph，最多 render_workers 个场景同时渲染，最后直接拼接。
+    cues 为按场景顺序排列的字幕，缺少时读取字幕文件；profile 默认为完整质量。
+    """
+    profile = profile or get_profile()
+    manifest = Manifest(task_dir)
+    start = time.perf_counter()
+    if progress:
+        progress(profile.stage, 0)
+    semaphore = asyncio.Semaphore(settings.render_workers or os.cpu_count() or 2)
+    fractions = [0.0] * scene_count
+
+    async def render_one(index: int) -> str:
+        def on_progress(fraction: float):
+            fractions[index - 1] = fraction
+            if progress:
+                progress(profile.stage, int(sum(fractions) * 95 / scene_count))
+
+        async with semaphore:
+            logger.info(f"Rendering scene {index} with ffmpeg")
+            segment_file = await render_scene(task_dir, index, on_progress, cues[index - 1] if cues else None, profile, manifest)
+        on_progress(1.0)
+        return segment_file
+
+    segment_files = await asyncio.gather(*[render_one(index) for index in range(1, scene_count + 1)])
+
+    video_file = os.path.join(task_dir, profile.output)
+    logger.info(f"Concatenating {len(segment_files)} segments to {video_file}")
+    await concat_segments(segment_files, video_file)
+    if progress:
+        progress(profile.stage, 100, elapsed=time.perf_counter() - start)
+    return video_file
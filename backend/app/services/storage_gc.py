@@ -0,0 +1,293 @@
+import asyncio
+import os
+import re
+import shutil
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from loguru import logger
+
+from app.config import settings
+from app.models.const import TASK_STATE_COMPLETE
+from app.schemas.video import RenderQuality
+from app.services import render
+from app.services.manifest import MANIFEST_FILE
+from app.services.task import FINAL_STATES, TASK_FILE, task_manager
+from app.utils import task_store, utils
+
+# 清理的产物类别：整个任务、已完成任务的中间产物、中断的写入和渲染残留、/api/voice/generate 的临时文件
+CLASSES = ("tasks", "intermediates", "partials", "temp")
+# 删除中间产物时保留的文件：任务状态、故事、清单和最终视频
+KEEP_FILES = {TASK_FILE, "story.json", MANIFEST_FILE, *(render.get_profile(quality).output for quality in RenderQuality)}
+# 场景图片 <i>.png 是源输入而不是中间产物：图片服务返回的签名地址很快过期，删除后修改场景时无法重新下载
+_SCENE_IMAGE = re.compile(r"^\d+\.png$")
+# atomic_open 和下载的 .part、渲染的 .part.mp4、拼接列表 .mp4.txt、缓存的 .tmp
+_PARTIAL = re.compile(r"\.part$|\.part\.mp4$|\.mp4\.txt$|\.tmp$")
+# generate_voice 未指定路径时在工作目录下生成的文件
+_TEMP = re.compile(r"^temp_[0-9a-f-]{36}\.(mp3|srt)$")
+# 待删除的任务先改名到这里，再在后台线程中删除
+TRASH_PREFIX = ".trash-"
+
+
+class TaskUsage(NamedTuple):
+    """任务目录的磁盘占用，last_access 为目录下文件最近一次访问或修改的时间"""
+    task_id: str
+    path: str
+    files: int
+    size: int
+    intermediate_size: int
+    last_access: float
+
+
+def _remove_file(path: str) -> int:
+    """删除文件，返回释放的字节数，文件已不存在时返回 0"""
+    try:
+        size = os.path.getsize(path)
+        os.remove(path)
+        return size
+    except OSError:
+        return 0
+
+
+def _is_kept(name: str) -> bool:
+    """删除中间产物时保留的任务目录顶层文件；中断写入的残留由 partials 清理"""
+    return name in KEEP_FILES or _SCENE_IMAGE.match(name) is not None or _PARTIAL.search(name) is not None
+
+
+def _remove_tree(path: str) -> int:
+    """删除目录，返回其中的文件数"""
+    files = sum(len(names) for _, _, names in os.walk(path))
+    shutil.rmtree(path, ignore_errors=True)
+    return files
+
+
+def _tree_size(path: str) -> int:
+    size = 0
+    for dir_path, _, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.path.getsize(os.path.join(dir_path, name))
+            except OSError:
+                pass
+    return size
+
+
+def scan_task(task_id: str, path: str) -> TaskUsage:
+    files = 0
+    size = 0
+    intermediate_size = 0
+    last_access = 0.0
+    for dir_path, _, names in os.walk(path):
+        for name in names:
+            try:
+                stat = os.stat(os.path.join(dir_path, name))
+            except OSError:
+                continue
+            files += 1
+            size += stat.st_size
+            last_access = max(last_access, stat.st_atime, stat.st_mtime)
+            if dir_path != path or not _is_kept(name):
+                intermediate_size += stat.st_size
+    return TaskUsage(task_id, path, files, size, intermediate_size, last_access)
+
+
+class StorageGC:
+    """任务目录和临时文件的磁盘清理
+
+    定期执行，每次依次：
+    1. 删除超过 gc_temp_max_age 未修改的临时文件、中断的写入和渲染残留；
+    2. 已结束的任务超过 gc_task_max_age 未访问时整个删除，已完成的任务超过 gc_intermediate_max_age
+       未访问时只删除语音、字幕和片段，保留场景图片和视频（之后修改场景时会重新合成语音、重新渲染片段）；
+    3. 任务目录总大小超过 gc_max_bytes 时，按最近访问时间从旧到新删除已结束的任务。
+    排队和执行中的任务不会被清理。
+    """
+
+    def __init__(self):
+        self._loop_task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.runs = 0
+        self.last_run_at: Optional[float] = None
+        self.last_elapsed: Optional[float] = None
+        self.last_error: Optional[str] = None
+        # 累计释放的字节数和删除的文件数，按类别统计
+        self.reclaimed_bytes: Dict[str, int] = {name: 0 for name in CLASSES}
+        self.removed_files: Dict[str, int] = {name: 0 for name in CLASSES}
+        self.tasks_removed = 0
+        self.tasks_bytes = 0
+
+    def _record(self, name: str, size: int, files: int = 1):
+        self.reclaimed_bytes[name] += size
+        self.removed_files[name] += files
+
+    def _sweep_partials(self, now: float) -> List[Tuple[str, int]]:
+        """删除过期的临时文件和残留，返回 [(类别, 字节数)]"""
+        removed = []
+        max_age = settings.gc_temp_max_age
+        if not max_age:
+            return removed
+        tasks_root = utils.task_dir()
+        for entry in os.scandir(tasks_root):
+            # 上次清理中途退出时留下的待删除目录
+            if entry.name.startswith(TRASH_PREFIX) and entry.is_dir():
+                size = _tree_size(entry.path)
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed.append(("partials", size))
+        for root in (tasks_root, utils.cache_dir()):
+            for dir_path, _, files in os.walk(root):
+                for name in files:
+                    if not _PARTIAL.search(name):
+                        continue
+                    path = os.path.join(dir_path, name)
+                    try:
+                        if now - os.path.getmtime(path) <= max_age:
+                            continue
+                    except OSError:
+                        continue
+                    removed.append(("partials", _remove_file(path)))
+        for directory in {os.getcwd(), utils.get_root_dir()}:
+            for entry in os.scandir(directory):
+                if not _TEMP.match(entry.name) or not entry.is_file():
+                    continue
+                try:
+                    if now - entry.stat().st_mtime <= max_age:
+                        continue
+                except OSError:
+                    continue
+                removed.append(("temp", _remove_file(entry.path)))
+        return removed
+
+    def _scan_tasks(self) -> List[TaskUsage]:
+        root = utils.task_dir()
+        return [scan_task(task_id, utils.task_dir(task_id, create=False)) for task_id in task_store.iter_task_ids(root)]
+
+    def _is_removable(self, task_id: str) -> Tuple[bool, Optional[str]]:
+        """任务是否已结束，返回 (是否可以清理, 状态)；没有 task.json 的目录按已结束处理"""
+        task = task_manager.get(task_id)
+        if task is None:
+            return True, None
+        return task.state in FINAL_STATES, task.state
+
+    async def _remove_task(self, usage: TaskUsage) -> bool:
+        """从任务管理器中移除任务，目录改名后在后台线程中删除，改名之后不会再被读取到"""
+        trash = os.path.join(utils.task_dir(), f"{TRASH_PREFIX}{usage.task_id}-{utils.get_uuid(True)}")
+        try:
+            os.replace(usage.path, trash)
+        except OSError as e:
+            logger.warning(f"Failed to remove task {usage.task_id}: {e}")
+            return False
+        task_manager.forget(usage.task_id)
+        await asyncio.to_thread(shutil.rmtree, trash, True)
+        shard_dir = os.path.dirname(usage.path)
+        if shard_dir != utils.task_dir():
+            try:
+                os.rmdir(shard_dir)
+            except OSError:
+                pass
+        self._record("tasks", usage.size, usage.files)
+        self.tasks_removed += 1
+        logger.info(f"Removed task {usage.task_id}, {usage.size} bytes")
+        return True
+
+    async def _remove_intermediates(self, usage: TaskUsage) -> int:
+        """删除任务目录下除保留文件以外的产物，返回删除的文件数
+
+        先把这些产物改名移到待删除目录（只改名，很快），之后任务目录里已经没有它们，再在后台线程中删除。
+        """
+        trash = os.path.join(utils.task_dir(), f"{TRASH_PREFIX}{usage.task_id}-{utils.get_uuid(True)}")
+        os.makedirs(trash)
+        for entry in os.scandir(usage.path):
+            if not _is_kept(entry.name):
+                os.replace(entry.path, os.path.join(trash, entry.name))
+        files = await asyncio.to_thread(_remove_tree, trash)
+        self._record("intermediates", usage.intermediate_size, files)
+        logger.info(f"Removed intermediates of task {usage.task_id}, {usage.intermediate_size} bytes")
+        return files
+
+    async def collect(self) -> Dict[str, Any]:
+        """执行一次清理，返回本次释放的字节数"""
+        async with self._lock:
+            start = time.perf_counter()
+            now = time.time()
+            before = dict(self.reclaimed_bytes)
+            try:
+                for name, size in await asyncio.to_thread(self._sweep_partials, now):
+                    self._record(name, size)
+
+                usages = await asyncio.to_thread(self._scan_tasks)
+                remaining: List[TaskUsage] = []
+                total = 0
+                for usage in usages:
+                    # 扫描在后台线程中进行，删除前在事件循环中重新确认状态；确认和改名之间没有 await，不会有新的修改提交进来，
+                    # 改名之后再在后台线程中删除
+                    removable, state = self._is_removable(usage.task_id)
+                    age = now - usage.last_access
+                    if removable and settings.gc_task_max_age and age > settings.gc_task_max_age and await self._remove_task(usage):
+                        continue
+                    if (
+                        state == TASK_STATE_COMPLETE
+                        and usage.intermediate_size
+                        and settings.gc_intermediate_max_age
+                        and age > settings.gc_intermediate_max_age
+                    ):
+                        await self._remove_intermediates(usage)
+                        usage = usage._replace(size=usage.size - usage.intermediate_size, intermediate_size=0)
+                    total += usage.size
+                    if removable:
+                        remaining.append(usage)
+
+                if settings.gc_max_bytes and total > settings.gc_max_bytes:
+                    for usage in sorted(remaining, key=lambda item: item.last_access):
+                        if total <= settings.gc_max_bytes:
+                            break
+                        removable, _ = self._is_removable(usage.task_id)
+                        if removable and await self._remove_task(usage):
+                            total -= usage.size
+                self.tasks_bytes = total
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                raise
+            finally:
+                self.runs += 1
+                self.last_run_at = now
+                self.last_elapsed = round(time.perf_counter() - start, 3)
+
+            reclaimed = {name: self.reclaimed_bytes[name] - before[name] for name in CLASSES}
+            logger.info(f"Storage gc reclaimed {sum(reclaimed.values())} bytes {reclaimed}, tasks use {total} bytes")
+            return {"reclaimed_bytes": reclaimed, "tasks_bytes": total, "elapsed": self.last_elapsed}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "last_run_at": self.last_run_at,
+            "last_elapsed": self.last_elapsed,
+            "last_error": self.last_error,
+            "reclaimed_bytes": {**self.reclaimed_bytes, "total": sum(self.reclaimed_bytes.values())},
+            "removed_files": self.removed_files,
+            "tasks_removed": self.tasks_removed,
+            "tasks_bytes": self.tasks_bytes,
+            "max_bytes": settings.gc_max_bytes,
+        }
+
+    async def _collect_loop(self):
+        while True:
+            try:
+                await self.collect()
+            except Exception as e:
+                logger.warning(f"Storage gc failed: {e}")
+            await asyncio.sleep(settings.gc_interval)
+
+    def start(self):
+        """按配置启动后台清理"""
+        if settings.gc_enabled and self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._collect_loop())
+
+    async def stop(self):
+        if self._loop_task:
+            self._loop_task.cancel()
+            await asyncio.gather(self._loop_task, return_exceptions=True)
+            self._loop_task = None
+
+
+# 创建服务实例
+storage_gc = StorageGC()
@@ -0,0 +1,242 @@
+import os
+import re
+from array import array
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from app.config import settings
+from app.services.text_layout import layout_text, load_font
+from app.utils import task_store, utils
+
+# 字幕样式，moviepy 和 ffmpeg 两种渲染引擎共用
+SUBTITLE_FONT_NAME = "STHeitiLight.ttc"
+SUBTITLE_FONT_SIZE = 60
+SUBTITLE_COLOR = "white"
+SUBTITLE_STROKE_COLOR = "black"
+SUBTITLE_STROKE_WIDTH = 2
+# 字幕最大宽度占画面宽度的比例
+SUBTITLE_MAX_WIDTH_RATIO = 0.9
+# 字幕底边距离画面底部：画面高度的 5% 再加 50 像素
+SUBTITLE_BOTTOM_RATIO = 0.05
+SUBTITLE_BOTTOM_OFFSET = 50
+# 多行字幕的行间距，与 moviepy TextClip 的 interline 默认值一致
+SUBTITLE_LINE_SPACING = 4
+# 字幕位图缓存的条目数
+SUBTITLE_SPRITE_CACHE_SIZE = 1024
+
+
+_SRT_TIME = re.compile(r"(\d+):(\d+):(\d+)[,.](\d+)\s*-->\s*(\d+):(\d+):(\d+)[,.](\d+)")
+
+
+class SubtitleCues:
+    """内存中的字幕
+
+    开始、结束时间（秒）用 array 存放，文本单独一个列表。迭代得到 ((开始, 结束), 文本)，
+    与 moviepy file_to_subtitles 的返回格式相同，渲染阶段可以直接使用，SRT/VTT 只作为导出文件。
+    """
+
+    __slots__ = ("starts", "ends", "texts")
+
+    def __init__(self, items: Iterable[Tuple[Tuple[float, float], str]] = ()):
+        self.starts = array("d")
+        self.ends = array("d")
+        self.texts: List[str] = []
+        for (start, end), text in items:
+            self.append(start, end, text)
+
+    def append(self, start: float, end: float, text: str):
+        self.starts.append(start)
+        self.ends.append(end)
+        self.texts.append(text)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __iter__(self) -> Iterator[Tuple[Tuple[float, float], str]]:
+        return iter(zip(zip(self.starts, self.ends), self.texts))
+
+    def __getstate__(self):
+        return self.starts, self.ends, self.texts
+
+    def __setstate__(self, state):
+        self.starts, self.ends, self.texts = state
+
+    @property
+    def duration(self) -> float:
+        """最后一条字幕的结束时间"""
+        return max(self.ends, default=0.0)
+
+    def to_srt(self) -> str:
+        items = [
+            f"{i}\n{_srt_timestamp(start)} --> {_srt_timestamp(end)}\n{text}\n"
+            for i, ((start, end), text) in enumerate(self, 1)
+        ]
+        return "\n".join(items) + "\n"
+
+    def to_vtt(self) -> str:
+        items = [
+            f"{_srt_timestamp(start, '.')} --> {_srt_timestamp(end, '.')}\n{text}\n"
+            for (start, end), text in self
+        ]
+        return "WEBVTT\n\n" + "\n".join(items)
+
+    def write_srt(self, srt_file: str):
+        with task_store.atomic_open(srt_file, "w") as f:
+            f.write(self.to_srt())
+
+    def write_vtt(self, vtt_file: str):
+        with task_store.atomic_open(vtt_file, "w") as f:
+            f.write(self.to_vtt())
+
+    @classmethod
+    def from_srt(cls, srt_file: str) -> "SubtitleCues":
+        """读取 SRT 文件，用于只有字幕文件的场景（测试模式、任务恢复）"""
+        cues = cls()
+        with open(srt_file, "r", encoding="utf-8") as f:
+            blocks = re.split(r"\n\s*\n", f.read().strip())
+        for block in blocks:
+            lines = block.splitlines()
+            for n, line in enumerate(lines):
+                match = _SRT_TIME.search(line)
+                if match:
+                    h1, m1, s1, ms1, h2, m2, s2, ms2 = (int(value) for value in match.groups())
+                    cues.append(
+                        h1 * 3600 + m1 * 60 + s1 + ms1 / 1000,
+                        h2 * 3600 + m2 * 60 + s2 + ms2 / 1000,
+                        "\n".join(lines[n + 1:]),
+                    )
+                    break
+        return cues
+
+
+def _srt_timestamp(seconds: float, separator: str = ",") -> str:
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    secs, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{milliseconds:03d}"
+
+
+def get_font_path() -> str:
+    """获取字幕字体路径，优先使用配置 subtitle_font_path"""
+    font_path = settings.subtitle_font_path or os.path.join(utils.resource_dir(), "fonts", SUBTITLE_FONT_NAME)
+    if not os.path.exists(font_path):
+        raise FileNotFoundError("Font file not found: " + font_path)
+    return font_path
+
+
+def wrap_text(text, max_width, font="Arial", fontsize=60):
+    """按最大宽度换行，返回 (换行后的文本, 高度)，排版规则见 text_layout.layout_text"""
+    layout = layout_text(text.strip(), font, fontsize, max_width)
+    return layout.text, layout.height
+
+
+@lru_cache(maxsize=SUBTITLE_SPRITE_CACHE_SIZE)
+def render_subtitle_sprite(
+    text: str,
+    font_path: str,
+    font_size: int = SUBTITLE_FONT_SIZE,
+    color: str = SUBTITLE_COLOR,
+    stroke_color: str = SUBTITLE_STROKE_COLOR,
+    stroke_width: int = SUBTITLE_STROKE_WIDTH,
+    max_width: float = 0,
+) -> np.ndarray:
+    """把一条字幕渲染成 RGBA 位图
+
+    先按 max_width 换行，再按 moviepy TextClip（method="label"）相同的方式排版和描边，
+    结果按全部参数缓存，相同的字幕只光栅化一次。返回的数组是只读的，调用方不要修改。
+
+    Args:
+        text: 字幕文本
+        font_path: 字体文件路径
+        font_size: 字号
+        color, stroke_color: 文字颜色和描边颜色
+        stroke_width: 描边宽度
+        max_width: 最大宽度，0 表示不换行
+
+    Returns:
+        np.ndarray: 形状为 (高, 宽, 4) 的 uint8 数组
+    """
+    if max_width:
+        text = layout_text(text.strip(), font_path, font_size, max_width).text
+    font = load_font(font_path, font_size)
+    draw = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+    left, top, right, bottom = draw.multiline_textbbox(
+        (0, 0), text, font=font, spacing=SUBTITLE_LINE_SPACING, stroke_width=stroke_width, anchor="lm"
+    )
+    width, height = max(1, int(right - left)), max(1, int(bottom - top))
+    image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    ImageDraw.Draw(image).multiline_text(
+        (0, height / 2),
+        text,
+        fill=color,
+        font=font,
+        spacing=SUBTITLE_LINE_SPACING,
+        stroke_width=stroke_width,
+        stroke_fill=stroke_color,
+        anchor="lm",
+    )
+    sprite = np.asarray(image)
+    sprite.setflags(write=False)
+    return sprite
+
+
+def _ass_timestamp(seconds: float) -> str:
+    centiseconds = int(round(seconds * 100))
+    hours, centiseconds = divmod(centiseconds, 360000)
+    minutes, centiseconds = divmod(centiseconds, 6000)
+    secs, centiseconds = divmod(centiseconds, 100)
+    return f"{hours:d}:{minutes:02d}:{secs:02d}.{centiseconds:02d}"
+
+
+def write_ass(subtitle_items: Iterable[Tuple[Tuple[float, float], str]], ass_file: str, width: int, height: int, font_path: str):
+    """把字幕写成 ASS 文件，样式与 moviepy 渲染的字幕保持一致
+
+    moviepy 的 TextClip 左对齐排版、整体水平居中，底边位于画面高度 95% 再向上 50 像素，
+    这里用 PIL 计算同样的文字框宽度，再用 \\pos 把每条字幕的左下角放到相同的位置。
+
+    Args:
+        subtitle_items: SubtitleCues 或 [((开始时间, 结束时间), 文本)]
+        ass_file: ASS 文件路径
+        width, height: 画面尺寸
+        font_path: 字体文件路径
+    """
+    font = load_font(font_path, SUBTITLE_FONT_SIZE)
+    font_name = font.getname()[0]
+    # PIL 的字号是 em 大小，libass 的字号是 ascent + descent 的高度
+    ascent, descent = font.getmetrics()
+    draw = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+    lines = [
+        "[Script Info]",
+        "ScriptType: v4.00+",
+        f"PlayResX: {width}",
+        f"PlayResY: {height}",
+        "WrapStyle: 2",
+        "ScaledBorderAndShadow: yes",
+        "",
+        "[V4+ Styles]",
+        "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding",
+        f"Style: Default,{font_name},{ascent + descent},&H00FFFFFF,&H00FFFFFF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,{SUBTITLE_STROKE_WIDTH},0,1,0,0,0,1",
+        "",
+        "[Events]",
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text",
+    ]
+    max_width = width * SUBTITLE_MAX_WIDTH_RATIO
+    for (start, end), text in subtitle_items:
+        # 与 moviepy 引擎一样预先换行，libass 不会在没有空格的中文里自动换行
+        wrapped, _ = wrap_text(text, max_width=max_width, font=font_path, fontsize=SUBTITLE_FONT_SIZE)
+        left, top, right, bottom = draw.multiline_textbbox(
+            (0, 0), wrapped, font=font, spacing=SUBTITLE_LINE_SPACING, stroke_width=SUBTITLE_STROKE_WIDTH, anchor="lm"
+        )
+        x = (width - (right - left)) / 2
+        # 以文字框左下角定位，libass 的行高与 PIL 略有不同，保证底边对齐
+        y = height * (1 - SUBTITLE_BOTTOM_RATIO) - SUBTITLE_BOTTOM_OFFSET
+        wrapped = wrapped.replace("{", "(").replace("}", ")").replace("\n", "\\N")
+        lines.append(
+            f"Dialogue: 0,{_ass_timestamp(start)},{_ass_timestamp(end)},Default,,0,0,0,,{{\\pos({x:.0f},{y:.0f})}}{wrapped}"
+        )
+    with task_store.atomic_open(ass_file, "w") as f:
+        f.write("\n".join(lines) + "\n")
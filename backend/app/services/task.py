@@ -0,0 +1,388 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from app.config import settings
+from app.exceptions import IdempotencyKeyConflict, TaskConflict
+from app.models.const import (
+    TASK_STATE_COMPLETE,
+    TASK_STATE_FAILED,
+    TASK_STATE_PROCESSING,
+    TASK_STATE_QUEUED,
+)
+from app.schemas.video import RenderQuality, SceneEditRequest, VideoGenerateRequest
+from app.services import render
+from app.services.video import edit_scene, generate_video, render_task
+from app.utils import task_store, utils
+
+# 各阶段在整体进度中所占的权重
+STAGE_WEIGHTS = {
+    "story": 10,
+    "images": 20,
+    "voice": 20,
+    "preview": 20,
+    "render": 50,
+}
+
+TASK_FILE = "task.json"
+# 事件流的心跳间隔（秒），避免代理因空闲断开长连接
+EVENT_HEARTBEAT = 15
+FINAL_STATES = (TASK_STATE_COMPLETE, TASK_STATE_FAILED)
+
+
+def get_task_url(task_id: str, filename: str = "video.mp4") -> str:
+    """获取任务目录下文件的访问地址，路径与 /tasks 静态目录下的分片目录一致"""
+    return f"http://{settings.video_url}:{settings.backend_port}/tasks/{task_store.task_relpath(utils.task_dir(), task_id)}/{filename}"
+
+
+def task_stages(request: VideoGenerateRequest) -> List[str]:
+    """任务包含的阶段：只预览时没有 render，不预览时没有 preview"""
+    stages = ["story", "images", "voice"]
+    if request.quality == RenderQuality.preview:
+        stages.append("preview")
+        if not request.full_after_preview:
+            return stages
+    stages.append("render")
+    return stages
+
+
+def request_hash(request: VideoGenerateRequest) -> str:
+    """生成参数的规范化哈希
+
+    未指定的服务商、模型和渲染引擎替换为当前配置中的值，去掉不影响结果的字段，
+    按键排序后序列化，写法不同但实际生成结果相同的请求得到同一个哈希。
+    """
+    data = request.model_dump(mode="json", exclude={"task_id", "no_cache"})
+    data["text_llm_provider"] = request.text_llm_provider or settings.text_provider
+    data["text_llm_model"] = request.text_llm_model or settings.text_llm_model
+    data["image_llm_provider"] = request.image_llm_provider or settings.image_provider
+    data["image_llm_model"] = request.image_llm_model or settings.image_llm_model
+    data["render_engine"] = request.render_engine or settings.render_engine
+    data["story_prompt"] = (request.story_prompt or "").strip()
+    payload = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Task:
+    """视频生成任务"""
+
+    def __init__(self, task_id: str, request: VideoGenerateRequest):
+        self.task_id = task_id
+        self.request = request
+        self.state = TASK_STATE_QUEUED
+        self.stages: Dict[str, int] = {stage: 0 for stage in task_stages(request)}
+        # 各阶段耗时（秒），用于分析延迟构成
+        self.timings: Dict[str, float] = {}
+        self.video_url: Optional[str] = None
+        # 预览视频地址，预览完成后即可查看，完整视频可能还在渲染
+        self.preview_url: Optional[str] = None
+        self.message: Optional[str] = None
+        # 待执行的场景修改 {"scene": 序号, **SceneEditRequest}，为 None 时执行完整的生成
+        self.edit: Optional[Dict[str, Any]] = None
+        # 待执行的重新渲染的质量，为 None 时执行完整的生成
+        self.render: Optional[str] = None
+        # 用于去重：生成参数的规范化哈希和客户端的 Idempotency-Key
+        self.request_hash: Optional[str] = None
+        self.idempotency_key: Optional[str] = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        # 事件流订阅者，每个连接一个队列
+        self._subscribers: List[asyncio.Queue] = []
+
+    @property
+    def progress(self) -> int:
+        """整体进度，按任务包含的阶段的权重加权"""
+        total = sum(STAGE_WEIGHTS.get(stage, 0) * percent for stage, percent in self.stages.items())
+        return total // (sum(STAGE_WEIGHTS.get(stage, 0) for stage in self.stages) or 1)
+
+    def update(self, stage: str, percent: int, **data):
+        """pipeline 的进度回调
+
+        data 中的 elapsed 记录为阶段耗时，其余字段随事件推送给订阅者，
+        以 _file 结尾的字段会转换成 _url 形式的访问地址。
+        """
+        self.stages[stage] = max(0, min(100, int(percent)))
+        if "elapsed" in data:
+            self.timings[stage] = round(data["elapsed"], 3)
+        self.updated_at = time.time()
+        event = {"stage": stage, "percent": self.stages[stage], "progress": self.progress}
+        for key, value in data.items():
+            if key.endswith("_file"):
+                event[key[:-len("_file")] + "_url"] = get_task_url(self.task_id, os.path.basename(value)) if value else None
+            else:
+                event[key] = value
+        if event.get("preview_url"):
+            self.preview_url = event["preview_url"]
+        self.publish(stage, event)
+
+    def publish(self, event: str, data: Dict[str, Any]):
+        """推送事件给所有订阅者"""
+        for queue in self._subscribers:
+            queue.put_nowait((event, data))
+
+    async def events(self, heartbeat: float = EVENT_HEARTBEAT) -> AsyncIterator[Tuple[str, Optional[Dict[str, Any]]]]:
+        """任务事件流
+
+        先返回当前状态快照，然后逐个返回 pipeline 事件，直到任务完成或失败。
+        空闲超过 heartbeat 秒时返回 ("ping", None)。
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.append(queue)
+        try:
+            yield "snapshot", self.to_dict()
+            while self.state not in FINAL_STATES or not queue.empty():
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield "ping", None
+        finally:
+            self._subscribers.remove(queue)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "task_id": self.task_id,
+            "state": self.state,
+            "progress": self.progress,
+            "stages": self.stages,
+            "timings": self.timings,
+            "video_url": self.video_url,
+            "preview_url": self.preview_url,
+            "message": self.message,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+    def save(self):
+        """将任务状态写入任务目录下的 task.json，用于重启后恢复"""
+        data = self.to_dict()
+        data["request"] = self.request.model_dump(mode="json")
+        data["edit"] = self.edit
+        data["render"] = self.render
+        data["request_hash"] = self.request_hash
+        data["idempotency_key"] = self.idempotency_key
+        task_store.write_json(os.path.join(utils.task_dir(self.task_id), TASK_FILE), data)
+
+    @classmethod
+    def load(cls, task_id: str) -> Optional["Task"]:
+        """从 task.json 读取任务，不存在或格式错误时返回 None"""
+        if not task_store.is_valid_id(task_id):
+            return None
+        task_file = os.path.join(utils.task_dir(task_id, create=False), TASK_FILE)
+        if not os.path.exists(task_file):
+            return None
+        try:
+            with open(task_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            task = cls(task_id, VideoGenerateRequest(**data["request"]))
+        except Exception as e:
+            logger.error(f"Failed to load task {task_id}: {e}")
+            return None
+        task.state = data.get("state", TASK_STATE_QUEUED)
+        task.stages.update(data.get("stages") or {})
+        task.timings.update(data.get("timings") or {})
+        task.video_url = data.get("video_url")
+        task.preview_url = data.get("preview_url")
+        task.message = data.get("message")
+        task.edit = data.get("edit")
+        task.render = data.get("render")
+        task.request_hash = data.get("request_hash")
+        task.idempotency_key = data.get("idempotency_key")
+        task.created_at = data.get("created_at", task.created_at)
+        task.updated_at = data.get("updated_at", task.updated_at)
+        return task
+
+
+class TaskManager:
+    """视频生成任务队列
+
+    提交的任务进入队列，由固定数量的 worker 依次执行，
+    服务重启时会把未完成的任务重新放回队列。
+    生成参数相同或 Idempotency-Key 相同的请求复用已有的任务，不重复生成。
+    """
+
+    def __init__(self, max_workers: int = 2):
+        self.max_workers = max_workers
+        self._tasks: Dict[str, Task] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        # 请求哈希 -> 任务ID，Idempotency-Key -> 任务ID
+        self._request_hashes: Dict[str, str] = {}
+        self._idempotency_keys: Dict[str, str] = {}
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_workers)]
+        self._resume()
+        logger.info(f"Task manager started with {self.max_workers} workers")
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def _indexed(self, index: Dict[str, str], key: str) -> Optional[Task]:
+        task_id = index.get(key)
+        if task_id is None:
+            return None
+        task = self.get(task_id)
+        if task is None:
+            # 任务目录已被删除
+            index.pop(key, None)
+        return task
+
+    def _index(self, task: Task):
+        if task.request_hash and not task.edit:
+            self._request_hashes[task.request_hash] = task.task_id
+        if task.idempotency_key:
+            self._idempotency_keys[task.idempotency_key] = task.task_id
+
+    def find_existing(self, request: VideoGenerateRequest, idempotency_key: Optional[str] = None) -> Optional[Task]:
+        """查找可以复用的任务
+
+        带 Idempotency-Key 时返回该 key 对应的任务，不论成功与否；key 对应的生成参数不同时抛出 IdempotencyKeyConflict。
+        否则按生成参数的哈希查找进行中或已完成的任务，失败的任务不复用；
+        no_cache 的请求要求重新生成故事，只复用进行中的任务（客户端超时重试），测试模式不去重。
+        """
+        digest = request_hash(request)
+        if idempotency_key:
+            task = self._indexed(self._idempotency_keys, idempotency_key)
+            if task is not None:
+                if task.request_hash != digest:
+                    raise IdempotencyKeyConflict(f"Idempotency-Key {idempotency_key} was used for a different request")
+                return task
+        if request.test_mode:
+            return None
+        task = self._indexed(self._request_hashes, digest)
+        if task is None or task.state == TASK_STATE_FAILED:
+            return None
+        if request.no_cache and task.state in FINAL_STATES:
+            return None
+        return task
+
+    def submit(self, request: VideoGenerateRequest, idempotency_key: Optional[str] = None) -> Task:
+        """提交任务，立即返回
+
+        测试模式指定的任务ID正在执行时抛出 TaskConflict；task.json 写入成功后才登记任务。
+        """
+        if request.test_mode and request.task_id:
+            task_id = request.task_id
+            if not task_store.is_valid_id(task_id):
+                raise ValueError(f"Invalid task id: {task_id}")
+            running = self._tasks.get(task_id)
+            if running is not None and running.state not in FINAL_STATES:
+                raise TaskConflict(f"Task is still running: {task_id}")
+        else:
+            task_id = task_store.new_task_id()
+        task = Task(task_id, request)
+        task.request_hash = request_hash(request)
+        task.idempotency_key = idempotency_key
+        task.save()
+        self._tasks[task_id] = task
+        self._index(task)
+        self._queue.put_nowait(task)
+        logger.info(f"Task {task_id} queued")
+        return task
+
+    def submit_edit(self, task: Task, scene: int, edit: SceneEditRequest) -> Task:
+        """提交场景修改，在原任务上重新执行，只重新生成受影响的产物"""
+        task.edit = {"scene": scene, **edit.model_dump()}
+        task.render = None
+        # 修改后的视频不再对应原来的生成参数
+        if self._request_hashes.get(task.request_hash) == task.task_id:
+            del self._request_hashes[task.request_hash]
+        task.state = TASK_STATE_QUEUED
+        task.stages = {stage: 0 for stage in task_stages(task.request)}
+        task.message = None
+        task.updated_at = time.time()
+        self._tasks[task.task_id] = task
+        task.save()
+        task.publish("state", task.to_dict())
+        self._queue.put_nowait(task)
+        logger.info(f"Task {task.task_id} queued for editing scene {scene}")
+        return task
+
+    def submit_render(self, task: Task, quality: RenderQuality) -> Task:
+        """提交重新渲染，在原任务上按指定质量渲染，复用已有的图片、语音和片段"""
+        task.render = quality.value
+        task.edit = None
+        if quality == RenderQuality.full and task.request.quality == RenderQuality.preview:
+            # 与 render_task 写入 story.json 的一致，之后修改场景时也渲染完整质量
+            task.request = task.request.model_copy(update={"full_after_preview": True})
+        task.state = TASK_STATE_QUEUED
+        task.stages = {stage: 0 for stage in ("images", "voice", render.get_profile(quality).stage)}
+        task.message = None
+        task.updated_at = time.time()
+        self._tasks[task.task_id] = task
+        task.save()
+        task.publish("state", task.to_dict())
+        self._queue.put_nowait(task)
+        logger.info(f"Task {task.task_id} queued for {quality.value} render")
+        return task
+
+    def forget(self, task_id: str):
+        """任务目录被删除后，从内存和去重索引中移除"""
+        self._tasks.pop(task_id, None)
+        for index in (self._request_hashes, self._idempotency_keys):
+            for key in [key for key, value in index.items() if value == task_id]:
+                del index[key]
+
+    def get(self, task_id: str) -> Optional[Task]:
+        task = self._tasks.get(task_id)
+        if task is None:
+            task = Task.load(task_id)
+        return task
+
+    async def _worker(self):
+        while True:
+            task = await self._queue.get()
+            try:
+                await self._run(task)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, task: Task):
+        task.state = TASK_STATE_PROCESSING
+        task.save()
+        task.publish("state", task.to_dict())
+        try:
+            if task.edit:
+                edit = dict(task.edit)
+                scene = edit.pop("scene")
+                video_file = await edit_scene(task.task_id, scene, SceneEditRequest(**edit), progress=task.update)
+            elif task.render:
+                video_file = await render_task(task.task_id, RenderQuality(task.render), progress=task.update)
+            else:
+                video_file = await generate_video(task.request, task_id=task.task_id, progress=task.update)
+            task.state = TASK_STATE_COMPLETE
+            task.video_url = get_task_url(utils.extract_id(video_file), os.path.basename(video_file))
+        except Exception as e:
+            logger.error(f"Task {task.task_id} failed: {e}")
+            task.state = TASK_STATE_FAILED
+            task.message = str(e)
+        task.updated_at = time.time()
+        task.save()
+        task.publish("complete" if task.state == TASK_STATE_COMPLETE else "failed", task.to_dict())
+
+    def _resume(self):
+        """重新排队上次未完成的任务，并重建去重索引"""
+        for task_id in sorted(task_store.iter_task_ids(utils.task_dir())):
+            task = Task.load(task_id)
+            if task is None:
+                continue
+            self._index(task)
+            if task.state not in (TASK_STATE_QUEUED, TASK_STATE_PROCESSING):
+                continue
+            logger.info(f"Resuming task {task_id}")
+            task.state = TASK_STATE_QUEUED
+            self._tasks[task_id] = task
+            self._queue.put_nowait(task)
+
+
+# 创建服务实例
+task_manager = TaskManager(max_workers=settings.video_workers)
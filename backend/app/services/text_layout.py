@@ -0,0 +1,133 @@
+import re
+from functools import lru_cache
+from typing import List, NamedTuple
+
+from PIL import ImageFont
+
+# 不能出现在行首的标点，归入前一个排版单元
+NO_BREAK_BEFORE = set("，。、；：？！,.;:?!…‥）)]}》〉」』】〕”’々ーぁぃぅぇぉっゃゅょゎァィゥェォッャュョヮヵヶ")
+# 不能出现在行尾的标点，归入后一个排版单元
+NO_BREAK_AFTER = set("（([{《〈「『【〔“‘")
+# 空白、连续的非中日文字符（一个英文单词、一个数字、一串韩文）、单个中日文字符，各自是一个切分单元
+_TOKEN = re.compile(r"\s+|[^\s⺀-鿿　-〿豈-﫿＀-￯]+|.")
+
+
+class _Advances(dict):
+    """字符 -> 字宽，第一次用到时向字体查询"""
+
+    def __init__(self, font: ImageFont.FreeTypeFont):
+        super().__init__()
+        self.font = font
+
+    def __missing__(self, char: str) -> float:
+        width = self[char] = self.font.getlength(char)
+        return width
+
+
+class FontMetrics:
+    """一个字体和字号的度量，逐字缓存字宽，文本宽度按字宽累加，不再每次对整段文本排版"""
+
+    def __init__(self, font: ImageFont.FreeTypeFont):
+        self.font = font
+        self.advances = _Advances(font)
+        ascent, descent = font.getmetrics()
+        self.line_height = ascent + descent
+        self.space_width = self.advances[" "]
+
+    def width(self, text: str) -> float:
+        return sum(map(self.advances.__getitem__, text))
+
+
+class TextLayout(NamedTuple):
+    """换行结果，lines 和 widths 一一对应"""
+    lines: List[str]
+    widths: List[float]
+    line_height: int
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+    @property
+    def width(self) -> float:
+        return max(self.widths, default=0)
+
+    @property
+    def height(self) -> int:
+        return len(self.lines) * self.line_height
+
+
+@lru_cache(maxsize=32)
+def load_font(font_path: str, font_size: int) -> ImageFont.FreeTypeFont:
+    """加载字体，同一字体和字号只解析一次"""
+    return ImageFont.truetype(font_path, font_size)
+
+
+@lru_cache(maxsize=32)
+def get_metrics(font_path: str, font_size: int) -> FontMetrics:
+    return FontMetrics(load_font(font_path, font_size))
+
+
+def _units(paragraph: str, metrics: FontMetrics) -> List[list]:
+    """把一段文本切成不可再分的排版单元 [文本, 宽度, 前面是否有空格]
+
+    英文单词整体作为一个单元，中日文每个字是一个单元；行首禁则标点并入前一个单元，
+    行尾禁则标点与后一个单元合并，保证换行不会落在它们旁边。
+    """
+    units = []
+    space = False
+    for token in _TOKEN.findall(paragraph):
+        if token.isspace():
+            space = True
+            continue
+        width = metrics.width(token)
+        if units and (token[0] in NO_BREAK_BEFORE or units[-1][0][-1] in NO_BREAK_AFTER):
+            unit = units[-1]
+            if space:
+                unit[0] += " "
+                unit[1] += metrics.space_width
+            unit[0] += token
+            unit[1] += width
+        else:
+            units.append([token, width, space])
+        space = False
+    return units
+
+
+def layout_text(text: str, font_path: str, font_size: int, max_width: float) -> TextLayout:
+    """按最大宽度贪心换行
+
+    每个字符的宽度只向字体查询一次，每个排版单元只处理一次，耗时与文本长度成线性关系。
+    英文在空格处换行，中日文在字与字之间换行并遵守行首、行尾禁则；单个单元超过最大宽度时按字符切开。
+    原有的换行符保留。
+    """
+    metrics = get_metrics(font_path, font_size)
+    lines = []
+    widths = []
+
+    for paragraph in text.split("\n"):
+        line = ""
+        line_width = 0.0
+        for unit_text, unit_width, space in _units(paragraph, metrics):
+            gap = metrics.space_width if space and line else 0
+            if line and line_width + gap + unit_width > max_width:
+                lines.append(line)
+                widths.append(line_width)
+                line, line_width, gap = "", 0.0, 0
+            if not line and unit_width > max_width:
+                for char in unit_text:
+                    char_width = metrics.advances[char]
+                    if line and line_width + char_width > max_width:
+                        lines.append(line)
+                        widths.append(line_width)
+                        line, line_width = "", 0.0
+                    line += char
+                    line_width += char_width
+                continue
+            line += (" " if gap else "") + unit_text
+            line_width += gap + unit_width
+        if line or not paragraph.strip():
+            lines.append(line)
+            widths.append(line_width)
+
+    return TextLayout(lines, widths, metrics.line_height)
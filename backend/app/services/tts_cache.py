@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from typing import Any, Dict, Optional
+
+from edge_tts import SubMaker
+from loguru import logger
+
+from app.config import settings
+from app.utils import task_store, utils
+
+
+class TTSCache:
+    """语音合成结果的磁盘缓存
+
+    以 (规范化文本, 语音名称, 语速) 的哈希为键，每个条目包含
+    <key>.mp3 和记录 WordBoundary 时间信息的 <key>.json。
+    总大小超过 max_bytes 时按最近访问时间淘汰。
+    get、put 和 evict 都是阻塞的文件操作，在异步代码中通过 asyncio.to_thread 调用。
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(text: str, voice_name: str, voice_rate: float) -> str:
+        normalized = " ".join(text.split())
+        payload = json.dumps([normalized, voice_name, float(voice_rate)], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _paths(self, key: str):
+        return os.path.join(self.cache_dir, f"{key}.mp3"), os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str, audio_file: str) -> Optional[SubMaker]:
+        """命中时把音频复制到 audio_file 并返回还原的 SubMaker"""
+        mp3_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            shutil.copyfile(mp3_path, audio_file)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # 更新访问时间，用于 LRU 淘汰
+        os.utime(mp3_path)
+        os.utime(meta_path)
+        sub_maker = SubMaker()
+        sub_maker.offset = [tuple(offset) for offset in meta["offset"]]
+        sub_maker.subs = meta["subs"]
+        with self._lock:
+            self.hits += 1
+        return sub_maker
+
+    def put(self, key: str, audio_file: str, sub_maker: SubMaker):
+        mp3_path, meta_path = self._paths(key)
+        try:
+            # 原子地写入，避免并发读到不完整的条目
+            with open(audio_file, "rb") as src, task_store.atomic_open(mp3_path, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            with task_store.atomic_open(meta_path, "w") as f:
+                json.dump({"offset": sub_maker.offset, "subs": sub_maker.subs}, f, ensure_ascii=False)
+        except OSError as e:
+            logger.error(f"Failed to write tts cache {key}: {e}")
+            return
+        self.evict()
+
+    def evict(self):
+        """淘汰最久未访问的条目，直到总大小不超过 max_bytes"""
+        entries: Dict[str, Dict[str, Any]] = {}
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            key = name.split(".")[0]
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entry = entries.setdefault(key, {"size": 0, "last_access": 0.0, "paths": []})
+            entry["size"] += stat.st_size
+            entry["last_access"] = max(entry["last_access"], stat.st_mtime)
+            entry["paths"].append(path)
+
+        total = sum(entry["size"] for entry in entries.values())
+        for key, entry in sorted(entries.items(), key=lambda item: item[1]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            for path in entry["paths"]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= entry["size"]
+            with self._lock:
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        size = 0
+        entries = 0
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".mp3"):
+                entries += 1
+            try:
+                size += os.path.getsize(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+# 创建缓存实例
+tts_cache = TTSCache(utils.cache_dir("tts"), settings.tts_cache_max_bytes)
@@ -1,88 +1,301 @@
 import os
 import time
 import json
-from typing import List
+import asyncio
+from typing import Callable, Dict, List, Optional, Tuple
+from app.config import settings
 from app.schemas.llm import StoryGenerationRequest
 from loguru import logger
 from app.models.const import StoryType, ImageStyle
-from app.schemas.video import VideoGenerateRequest, StoryScene
+from app.schemas.video import VideoGenerateRequest, StoryScene, RenderQuality, SceneEditRequest
 from app.services.llm import llm_service
-from app.services.voice import generate_voice
-from app.utils import utils
+from app.services.voice import VoiceResult, generate_voice, generate_voices
+from app.services.download import download_image, download_scene_image, download_scene_images
+from app.services.subtitle import (
+    SUBTITLE_BOTTOM_OFFSET,
+    SUBTITLE_BOTTOM_RATIO,
+    SUBTITLE_FONT_SIZE,
+    SUBTITLE_MAX_WIDTH_RATIO,
+    SUBTITLE_STROKE_WIDTH,
+    SubtitleCues,
+    get_font_path,
+    render_subtitle_sprite,
+)
+from app.services import render
+from app.services.manifest import Manifest
+from app.utils import task_store, utils
 from moviepy import (
     VideoFileClip,
     ImageClip,
     AudioFileClip,
-    TextClip,
     CompositeVideoClip,
-    concatenate_videoclips,
     afx,
 )
-from moviepy.video.tools import subtitles
-from moviepy.video.tools.subtitles import SubtitlesClip
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
 import numpy as np
-import requests
 import random
 
-def wrap_text(text, max_width, font="Arial", fontsize=60):
-    # Create ImageFont
-    font = ImageFont.truetype(font, fontsize)
+# 进度回调: progress(stage, percent, **data)
+ProgressCallback = Callable[..., None]
+
 
-    def get_text_size(inner_text):
-        inner_text = inner_text.strip()
-        left, top, right, bottom = font.getbbox(inner_text)
-        return right - left, bottom - top
+def _noop_progress(stage: str, percent: int, **data):
+    pass
 
-    width, height = get_text_size(text)
-    if width <= max_width:
-        return text, height
 
-    # logger.warning(f"wrapping text, max_width: {max_width}, text_width: {width}, text: {text}")
+def build_scene_clip(task_dir: str, i: int, font_path: str, cues: Optional[SubtitleCues] = None, height: int = 0):
+    """用 moviepy 构建单个场景的剪辑：平移的图片、语音和字幕
 
-    processed = True
+    cues 为语音阶段生成的字幕，不传时读取 <i>.srt。
+    height 大于 0 且小于图片高度时，先把图片缩小到该高度再合成，字幕按同样的比例缩小。
+    """
+    # 获取文件路径
+    image_file = os.path.join(task_dir, f"{i}.png")
+    audio_file = os.path.join(task_dir, f"{i}.mp3")
+    subtitle_file = os.path.join(task_dir, f"{i}.srt")
+    logger.info(f"Processing scene {i}")
 
-    _wrapped_lines_ = []
-    words = text.split(" ")
-    _txt_ = ""
-    for word in words:
-        _before = _txt_
-        _txt_ += f"{word} "
-        _width, _height = get_text_size(_txt_)
-        if _width <= max_width:
-            continue
+    # 获取字幕的总时长
+    subs = cues or SubtitleCues.from_srt(subtitle_file)
+    subtitle_duration = subs.duration
+            
+    # 创建图片剪辑
+    scale = 1.0
+    with Image.open(image_file) as image:
+        if height and image.height > height:
+            size = render.output_size(image.width, image.height, height)
+            scale = size[1] / image.height
+            image_clip = ImageClip(np.asarray(image.convert("RGB").resize(size, Image.BILINEAR)))
         else:
-            if _txt_.strip() == word.strip():
-                processed = False
-                break
-            _wrapped_lines_.append(_before)
-            _txt_ = f"{word} "
-    _wrapped_lines_.append(_txt_)
-    if processed:
-        _wrapped_lines_ = [line.strip() for line in _wrapped_lines_]
-        result = "\n".join(_wrapped_lines_).strip()
-        height = len(_wrapped_lines_) * height
-        # logger.warning(f"wrapped text: {result}")
-        return result, height
-
-    _wrapped_lines_ = []
-    chars = list(text)
-    _txt_ = ""
-    for word in chars:
-        _txt_ += word
-        _width, _height = get_text_size(_txt_)
-        if _width <= max_width:
-            continue
+            image_clip = ImageClip(image_file)
+    origin_image_w, origin_image_h = image_clip.size  # 获取放大后的图片尺寸
+    image_scale = render.IMAGE_SCALE
+    image_clip = image_clip.resized((origin_image_w*image_scale,origin_image_h*image_scale))
+    image_w, image_h = image_clip.size  # 获取放大后的图片尺寸
+    # 确保图片视频时长至少和字幕一样长
+    image_clip = image_clip.with_duration(subtitle_duration)
+
+    width_diff = origin_image_w * (image_scale-1)
+    def debug_position(t):
+        # print(f"当前时间 t = {t}", subtitle_duration, width_diff, width_diff/subtitle_duration*t)  # 输出当前时间
+        return (-width_diff/subtitle_duration*t, 'center')
+    image_clip = image_clip.with_position(debug_position)
+    # 创建音频剪辑
+    audio_clip = AudioFileClip(audio_file)
+    image_clip = image_clip.with_audio(audio_clip)
+    # 添加字幕
+    if not subs:
+        logger.warning(f"No subtitles for scene {i}")
+        return image_clip
+
+    try:
+        max_width = origin_image_w * SUBTITLE_MAX_WIDTH_RATIO
+        text_clips = []
+        for (start, end), phrase in subs:
+            # 字幕位图按文本和样式缓存，相同的字幕只光栅化一次
+            sprite = render_subtitle_sprite(
+                phrase,
+                font_path,
+                font_size=max(1, round(SUBTITLE_FONT_SIZE * scale)),
+                stroke_width=max(1, round(SUBTITLE_STROKE_WIDTH * scale)),
+                max_width=max_width,
+            )
+            _clip = ImageClip(sprite)
+            _clip = _clip.with_start(start)
+            _clip = _clip.with_end(end)
+            _clip = _clip.with_duration(end - start)
+            _clip = _clip.with_position(("center", origin_image_h * (1 - SUBTITLE_BOTTOM_RATIO) - _clip.h - SUBTITLE_BOTTOM_OFFSET * scale))
+            text_clips.append(_clip)
+        video_clip = CompositeVideoClip([image_clip, *text_clips], (origin_image_w, origin_image_h))
+        logger.info(f"Added subtitles for scene {i}")
+        return video_clip
+    except Exception as e:
+        logger.error(f"Failed to add subtitles for scene {i}: {str(e)}")
+        return image_clip
+
+
+def render_scene_segment(task_dir: str, i: int, font_path: str, profile: render.RenderProfile, cues: Optional[SubtitleCues] = None) -> str:
+    """渲染单个场景片段，在渲染进程池中执行
+
+    同一 profile 的片段使用相同的编码参数，便于直接拼接。能否复用已有片段由主进程按清单判断。
+    """
+    segment_file = render.segment_path(task_dir, i, "moviepy", profile.name)
+    clip = build_scene_clip(task_dir, i, font_path, cues, profile.height)
+    tmp_file = segment_file.replace(".mp4", ".part.mp4")
+    clip.write_videofile(
+        tmp_file,
+        fps=profile.fps,
+        codec='libx264',
+        audio_codec='aac',
+        audio_fps=render.AUDIO_SAMPLE_RATE,
+        preset=profile.preset,
+        ffmpeg_params=["-crf", str(profile.crf)],
+        temp_audiofile_path=os.path.dirname(segment_file),
+        logger=None,
+    )
+    clip.close()
+    os.replace(tmp_file, segment_file)
+    return segment_file
+
+
+async def synthesize_scenes(task_dir: str, scenes: List[StoryScene], voice_name: str, voice_rate: float, progress: Optional[ProgressCallback] = None) -> List[VoiceResult]:
+    """并发为所有场景生成语音和字幕
+
+    并发数由 tts_concurrency 限制，单个场景的重试由 edge_tts_voice 负责。
+    开启 tts_batch 时所有场景合成一次请求。
+
+    Returns:
+        List[VoiceResult]: 按场景顺序排列的语音文件、字幕文件和内存中的字幕
+    """
+    report = progress or _noop_progress
+    start = time.perf_counter()
+    if settings.tts_batch and len(scenes) > 1:
+        # 整篇故事一次 TTS 请求，再按词边界切分到各场景
+        logger.info(f"Synthesizing voice for {len(scenes)} scenes in one request")
+        results = await generate_voices(
+            [scene.text for scene in scenes],
+            voice_name,
+            voice_rate,
+            [os.path.join(task_dir, f"{i}.mp3") for i in range(1, len(scenes) + 1)],
+            [os.path.join(task_dir, f"{i}.srt") for i in range(1, len(scenes) + 1)],
+        )
+        for i, result in enumerate(results, 1):
+            report("voice", i * 100 // len(scenes), scene=i, audio_file=result.audio_file, subtitle_file=result.subtitle_file)
+        report("voice", 100, elapsed=time.perf_counter() - start)
+        return results
+
+    semaphore = asyncio.Semaphore(max(1, settings.tts_concurrency))
+    finished = 0
+
+    async def synthesize(i: int, scene: StoryScene) -> VoiceResult:
+        nonlocal finished
+        async with semaphore:
+            logger.info(f"Synthesizing voice for scene {i}")
+            result = await generate_voice(
+                scene.text,
+                voice_name,
+                voice_rate,
+                os.path.join(task_dir, f"{i}.mp3"),
+                os.path.join(task_dir, f"{i}.srt"),
+            )
+        finished += 1
+        report("voice", finished * 100 // len(scenes), scene=i, audio_file=result.audio_file, subtitle_file=result.subtitle_file)
+        return result
+
+    results = await asyncio.gather(*[synthesize(i, scene) for i, scene in enumerate(scenes, 1)])
+    report("voice", 100, elapsed=time.perf_counter() - start)
+    return results
+
+
+async def prepare_streamed_scenes(task_dir: str, story_request: StoryGenerationRequest, voice_name: str, voice_rate: float, progress: Optional[ProgressCallback] = None) -> Tuple[List[StoryScene], List[Optional[SubtitleCues]]]:
+    """边生成故事边准备场景素材
+
+    故事以流式返回，每个场景到达后立即开始生成、下载图片和合成语音，
+    后面的场景还在生成时前面的场景已经在处理，文本生成的耗时大部分不在关键路径上。
+
+    Returns:
+        Tuple[List[StoryScene], List[Optional[SubtitleCues]]]: 按顺序排列的场景（url 为生成的图片地址）和各场景的字幕
+    """
+    report = progress or _noop_progress
+    download_semaphore = asyncio.Semaphore(max(1, settings.download_concurrency))
+    tts_semaphore = asyncio.Semaphore(max(1, settings.tts_concurrency))
+    segments = []
+    tasks = []
+    voices: Dict[int, VoiceResult] = {}
+    finished = {"images": 0, "voice": 0}
+    start = time.perf_counter()
+
+    def finish(stage: str, i: int, **data):
+        finished[stage] += 1
+        # 故事还没生成完时总数未知，按请求的分段数估算
+        report(stage, min(99, finished[stage] * 100 // max(story_request.segments, len(segments))), scene=i, **data)
+
+    async def prepare_image(i: int, segment: dict):
+        segment["url"] = await llm_service.generate_segment_image(i, segment, story_request)
+        image_path = await download_scene_image(task_dir, i, segment["url"], download_semaphore)
+        finish("images", i, url=segment["url"], image_file=image_path)
+
+    async def prepare_voice(i: int, segment: dict):
+        async with tts_semaphore:
+            logger.info(f"Synthesizing voice for scene {i}")
+            voices[i] = await generate_voice(
+                segment["text"],
+                voice_name,
+                voice_rate,
+                os.path.join(task_dir, f"{i}.mp3"),
+                os.path.join(task_dir, f"{i}.srt"),
+            )
+        finish("voice", i, audio_file=voices[i].audio_file, subtitle_file=voices[i].subtitle_file)
+
+    try:
+        async for segment in llm_service.stream_story(story_request):
+            segments.append(segment)
+            i = len(segments)
+            logger.info(f"Scene {i} ready, preparing image and voice")
+            report("story", min(99, i * 100 // story_request.segments), scene=i, text=segment["text"], image_prompt=segment["image_prompt"])
+            tasks.append(asyncio.create_task(prepare_image(i, segment)))
+            if not settings.tts_batch:
+                tasks.append(asyncio.create_task(prepare_voice(i, segment)))
+        report("story", 100, elapsed=time.perf_counter() - start)
+        if settings.tts_batch:
+            # 一次合成整篇故事需要全部文本，等故事生成完再开始
+            scenes = [StoryScene(text=segment["text"], image_prompt=segment["image_prompt"]) for segment in segments]
+            batch = asyncio.create_task(synthesize_scenes(task_dir, scenes, voice_name, voice_rate, report))
+            tasks.append(batch)
+        await asyncio.gather(*tasks)
+        if settings.tts_batch:
+            voices.update(enumerate(batch.result(), 1))
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+    elapsed = time.perf_counter() - start
+    report("images", 100, elapsed=elapsed)
+    report("voice", 100, elapsed=elapsed)
+    scenes = [StoryScene(text=segment["text"], image_prompt=segment["image_prompt"], url=segment["url"]) for segment in segments]
+    return scenes, [voices[i].cues for i in range(1, len(segments) + 1)]
+
+
+async def render_scenes(task_dir: str, scene_count: int, profile: render.RenderProfile, render_engine: str, report: ProgressCallback, cues: List[Optional[SubtitleCues]]) -> str:
+    """按 profile 渲染所有场景并拼接，返回视频文件路径"""
+    if render_engine == "ffmpeg":
+        return await render.render_video(task_dir, scene_count, report, cues, profile)
+    if render_engine != "moviepy":
+        raise ValueError(f"Unsupported render engine: {render_engine}")
+
+    # 每个场景在进程池中渲染为独立片段，最后不重新编码直接拼接
+    logger.info(f"Rendering {scene_count} scene segments ({profile.name})")
+    report(profile.stage, 0)
+    render_start = time.perf_counter()
+    font_path = get_font_path()
+    logger.info(f"Using font: {font_path}")
+    loop = asyncio.get_running_loop()
+    pool = render.get_process_pool()
+    manifest = Manifest(task_dir)
+    finished = 0
+
+    async def render_segment(i: int) -> str:
+        nonlocal finished
+        segment_file = render.segment_path(task_dir, i, "moviepy", profile.name)
+        key = manifest.segment_key(i, "moviepy", profile)
+        if manifest.segment_is_fresh(segment_file, key):
+            logger.info(f"Reusing segment for scene {i}: {segment_file}")
         else:
-            _wrapped_lines_.append(_txt_)
-            _txt_ = ""
-    _wrapped_lines_.append(_txt_)
-    result = "\n".join(_wrapped_lines_).strip()
-    height = len(_wrapped_lines_) * height
-    # logger.warning(f"wrapped text: {result}")
-    return result, height
-
-async def create_video_with_scenes(task_dir: str, scenes: List[StoryScene], voice_name: str, voice_rate: float, test_mode: bool = False) -> str:
+            await loop.run_in_executor(pool, render_scene_segment, task_dir, i, font_path, profile, cues[i - 1])
+            manifest.record_segment(segment_file, key)
+        finished += 1
+        report(profile.stage, finished * 95 // scene_count, scene=i)
+        return segment_file
+
+    segment_files = await asyncio.gather(*[render_segment(i) for i in range(1, scene_count + 1)])
+    video_file = os.path.join(task_dir, profile.output)
+    logger.info(f"Writing video to {video_file}")
+    await render.concat_segments(segment_files, video_file)
+    report(profile.stage, 100, elapsed=time.perf_counter() - render_start)
+    return video_file
+
+
+async def create_video_with_scenes(task_dir: str, scenes: List[StoryScene], voice_name: str, voice_rate: float, test_mode: bool = False, progress: Optional[ProgressCallback] = None, voice_ready: bool = False, render_engine: Optional[str] = None, cues: Optional[List[Optional[SubtitleCues]]] = None, quality: RenderQuality = RenderQuality.full, full_after_preview: bool = False) -> str:
     """创建带有场景的视频
 
     Args:
@@ -91,134 +304,57 @@ async def create_video_with_scenes(task_dir: str, scenes: List[StoryScene], voic
         voice_name (str): 语音名称
         voice_rate (float): 语音速率
         test_mode (bool): 是否为测试模式，如果是则使用已有的图片、音频、字幕文件
+        progress (ProgressCallback, optional): 进度回调
+        voice_ready (bool): 语音和字幕已由 synthesize_scenes 生成，跳过 TTS
+        render_engine (str, optional): 渲染引擎 moviepy / ffmpeg，默认取配置 render_engine
+        cues (List[SubtitleCues], optional): 语音阶段生成的各场景字幕，缺少时读取字幕文件
+        quality (RenderQuality): 渲染质量，preview 输出 preview.mp4，full 输出 video.mp4
+        full_after_preview (bool): quality 为 preview 时，预览完成后继续渲染完整质量的视频，
+            两次渲染共用同一份图片、语音和字幕
+
+    Returns:
+        str: 最后渲染的视频文件路径
     """
-    clips = []
-    for i, scene in enumerate(scenes, 1):
-        try:
-            # 获取文件路径
-            image_file = os.path.join(task_dir, f"{i}.png")
-            audio_file = os.path.join(task_dir, f"{i}.mp3")
-            subtitle_file = os.path.join(task_dir, f"{i}.srt")
-
-            # 测试模式下检查文件是否存在
-            if test_mode:
-                if not (os.path.exists(image_file) and os.path.exists(audio_file) and os.path.exists(subtitle_file)):
-                    logger.warning(f"Test mode: Required files not found for scene {i}")
-                    raise FileNotFoundError("Required files not found")
-            else:
-                # 正式模式下生成所需文件
-                logger.info(f"Processing scene {i}")
-                audio_file, subtitle_file = await generate_voice(
-                    scene.text,
-                    voice_name,
-                    voice_rate,
-                    audio_file,
-                    subtitle_file
-                )
-            
-            # 获取字幕的总时长
-            subs = subtitles.file_to_subtitles(subtitle_file, encoding="utf-8")
-            subtitle_duration = max([tb for ((ta, tb), txt) in subs])
-                    
-            # 创建图片剪辑
-            image_clip = ImageClip(image_file)
-            origin_image_w, origin_image_h = image_clip.size  # 获取放大后的图片尺寸
-            image_scale = 1.2
-            image_clip = image_clip.resized((origin_image_w*image_scale,origin_image_h*image_scale))
-            image_w, image_h = image_clip.size  # 获取放大后的图片尺寸
-            # 确保图片视频时长至少和字幕一样长
-            image_clip = image_clip.with_duration(subtitle_duration)
-
-            width_diff = origin_image_w * (image_scale-1)
-            def debug_position(t):
-                # print(f"当前时间 t = {t}", subtitle_duration, width_diff, width_diff/subtitle_duration*t)  # 输出当前时间
-                return (-width_diff/subtitle_duration*t, 'center')
-            image_clip = image_clip.with_position(debug_position)
-            # 创建音频剪辑
-            audio_clip = AudioFileClip(audio_file)
-            image_clip = image_clip.with_audio(audio_clip)
-            # 使用系统字体
-            font_path = os.path.join(utils.resource_dir(), "fonts", "STHeitiLight.ttc")
-            if not os.path.exists(font_path):
-                logger.warning("Font file not found, using default font")
-                raise FileNotFoundError("Font file not found: " + font_path)
-            else:
-                logger.info(f"Using font: {font_path}")
-            
-            print(f"Using font: {font_path}")
-            # 添加字幕
-            if os.path.exists(subtitle_file):
-                logger.info(f"Loading subtitle file: {subtitle_file}")
-                try:
-                    def make_textclip(text):
-                        return TextClip(
-                            text=text,
-                            font=font_path,
-                            font_size=60,
-                        )
-                    def create_text_clip(subtitle_item):
-                        phrase = subtitle_item[1]
-                        max_width = (origin_image_w * 0.9)
-                        wrapped_txt, txt_height = wrap_text(
-                            phrase, max_width=max_width, font=font_path, fontsize=60
-                        )
-                        _clip = TextClip(
-                            text=wrapped_txt,
-                            font=font_path,
-                            font_size=60,
-                            color="white",
-                            stroke_color="black",
-                            stroke_width=2,
-                        )
-                        duration = subtitle_item[0][1] - subtitle_item[0][0]
-                        _clip = _clip.with_start(subtitle_item[0][0])
-                        _clip = _clip.with_end(subtitle_item[0][1])
-                        _clip = _clip.with_duration(duration)
-                        _clip = _clip.with_position(("center", origin_image_h * 0.95 - _clip.h - 50))
-                        return _clip
-                    
-                    sub = SubtitlesClip(subtitle_file, encoding="utf-8", make_textclip=make_textclip)
-
-                    text_clips = []
-                    for item in sub.subtitles:
-                        clip = create_text_clip(subtitle_item=item)
-                        text_clips.append(clip)
-                    video_clip = CompositeVideoClip([image_clip, *text_clips], (origin_image_w, origin_image_h))
-                    clips.append(video_clip)
-                    logger.info(f"Added subtitles for scene {i}")
-                except Exception as e:
-                    logger.error(f"Failed to add subtitles for scene {i}: {str(e)}")
-                    clips.append(image_clip)
-            else:
-                logger.warning(f"Subtitle file not found: {subtitle_file}")
-                clips.append(image_clip)
-        except Exception as e:
-            logger.error(f"Failed to process scene {i}: {str(e)}")
-            raise e
-    
-    if not clips:
+    report = progress or _noop_progress
+    if not test_mode and not voice_ready:
+        results = await synthesize_scenes(task_dir, scenes, voice_name, voice_rate, report)
+        cues = [result.cues for result in results]
+    cues = cues or [None] * len(scenes)
+    render_engine = render_engine or settings.render_engine
+    scene_count = len(scenes)
+    # 测试模式下检查文件是否存在
+    if test_mode:
+        for i in range(1, scene_count + 1):
+            required = [os.path.join(task_dir, f"{i}.{ext}") for ext in ("png", "mp3", "srt")]
+            if not all(os.path.exists(path) for path in required):
+                logger.warning(f"Test mode: Required files not found for scene {i}")
+                raise FileNotFoundError("Required files not found")
+    if not scene_count:
         raise ValueError("No valid clips to combine")
 
-    # 合并所有片段
-    logger.info("Merging all clips")
-    final_clip = concatenate_videoclips(clips)
-    video_file = os.path.join(task_dir, "video.mp4")
-    logger.info(f"Writing video to {video_file}")
-    final_clip.write_videofile(video_file, fps=24, codec='libx264', audio_codec='aac')
-    
+    profile = render.get_profile(quality)
+    video_file = await render_scenes(task_dir, scene_count, profile, render_engine, report, cues)
+    if profile.name == "preview":
+        report(profile.stage, 100, preview_file=video_file)
+        if full_after_preview:
+            video_file = await render_scenes(task_dir, scene_count, render.get_profile(), render_engine, report, cues)
     return video_file
 
 
-async def generate_video(request: VideoGenerateRequest):
+async def generate_video(request: VideoGenerateRequest, task_id: Optional[str] = None, progress: Optional[ProgressCallback] = None):
     """生成视频
 
     Args:
         request (VideoGenerateRequest): 视频生成请求
+        task_id (str, optional): 任务ID，任务目录中已有 story.json 时从中恢复
+        progress (ProgressCallback, optional): 进度回调
     """
+    report = progress or _noop_progress
     try:
+        story_file = os.path.join(utils.task_dir(task_id), "story.json") if task_id else None
         # 测试模式下，从 story.json 中读取请求参数
         if request.test_mode:
-            task_id = request.task_id or str(int(time.time()))
+            task_id = task_id or request.task_id or task_store.new_task_id()
             task_dir = utils.task_dir(task_id)
             if not os.path.exists(task_dir):
                 raise ValueError(f"Task directory not found: {task_dir}")
@@ -234,6 +370,17 @@ async def generate_video(request: VideoGenerateRequest):
             request = VideoGenerateRequest(**story_data)
             request.test_mode = True
             scenes = [StoryScene(**scene) for scene in story_data.get("scenes", [])]
+            report("story", 100)
+            report("images", 100)
+        elif story_file and os.path.exists(story_file):
+            # 服务重启后，从已写入的 story.json 恢复任务，只补齐缺失的图片
+            task_dir = utils.task_dir(task_id)
+            logger.info(f"Resuming task {task_id} from {story_file}")
+            with open(story_file, "r", encoding="utf-8") as f:
+                story_data = json.load(f)
+            request = VideoGenerateRequest(**story_data)
+            scenes = [StoryScene(**scene) for scene in story_data.get("scenes", [])]
+            report("story", 100)
         else:
             req = StoryGenerationRequest(
                 resolution=request.resolution,
@@ -243,35 +390,149 @@ async def generate_video(request: VideoGenerateRequest):
                 text_llm_provider=request.text_llm_provider,
                 text_llm_model=request.text_llm_model,
                 image_llm_provider=request.image_llm_provider,
-                image_llm_model=request.image_llm_model
+                image_llm_model=request.image_llm_model,
+                no_cache=request.no_cache,
             )
-            story_list = await llm_service.generate_story_with_images(request=req)
-            scenes = [StoryScene(text=scene["text"], image_prompt=scene["image_prompt"], url=scene["url"]) for scene in story_list]
+            task_id = task_id or task_store.new_task_id()
+            task_dir = utils.task_dir(task_id)
+            os.makedirs(task_dir, exist_ok=True)
+            # 图片和语音在故事生成过程中就已准备好
+            scenes, cues = await prepare_streamed_scenes(task_dir, req, request.voice_name, request.voice_rate, report)
             
             # 保存 story.json
             story_data = request.model_dump()
             story_data["scenes"] = [scene.model_dump() for scene in scenes]
-            task_id = str(int(time.time()))
-            task_dir = utils.task_dir(task_id)
-            os.makedirs(task_dir, exist_ok=True)
             story_file = os.path.join(task_dir, "story.json")
-            for i, scene in enumerate(story_list, 1):
-                if scene.get("url"):
-                    image_path = os.path.join(task_dir, f"{i}.png")
-                    try:
-                        response = requests.get(scene["url"])
-                        if response.status_code == 200:
-                            with open(image_path, "wb") as f:
-                                f.write(response.content)
-                            logger.info(f"Downloaded image {i} to {image_path}")
-                    except Exception as e:
-                        logger.error(f"Failed to download image {i}: {e}")
-
-            with open(story_file, "w", encoding="utf-8") as f:
-                json.dump(story_data, f, ensure_ascii=False, indent=2)
-        # return ""
+            task_store.write_json(story_file, story_data)
+            return await create_video_with_scenes(task_dir, scenes, request.voice_name, request.voice_rate, progress=report, voice_ready=True, render_engine=request.render_engine, cues=cues, quality=request.quality, full_after_preview=request.full_after_preview)
+        if request.test_mode:
+            return await create_video_with_scenes(task_dir, scenes, request.voice_name, request.voice_rate, test_mode=True, progress=report, render_engine=request.render_engine, quality=request.quality, full_after_preview=request.full_after_preview)
+
+        # 图片下载和语音合成互不依赖，同时进行
+        _, voices = await asyncio.gather(
+            download_scene_images(task_dir, scenes, report),
+            synthesize_scenes(task_dir, scenes, request.voice_name, request.voice_rate, report),
+        )
         # 生成视频
-        return await create_video_with_scenes(task_dir, scenes, request.voice_name, request.voice_rate, request.test_mode)
+        return await create_video_with_scenes(task_dir, scenes, request.voice_name, request.voice_rate, progress=report, voice_ready=True, render_engine=request.render_engine, cues=[voice.cues for voice in voices], quality=request.quality, full_after_preview=request.full_after_preview)
     except Exception as e:
         logger.error(f"Failed to generate video: {e}")
-        raise e
\ No newline at end of file
+        raise e
+
+
+def load_story(task_id: str) -> Tuple[VideoGenerateRequest, List[StoryScene]]:
+    """读取任务目录下的 story.json，返回生成参数和场景列表"""
+    story_file = os.path.join(utils.task_dir(task_id), "story.json")
+    if not os.path.exists(story_file):
+        raise ValueError(f"Story file not found: {story_file}")
+    with open(story_file, "r", encoding="utf-8") as f:
+        story_data = json.load(f)
+    return VideoGenerateRequest(**story_data), [StoryScene(**scene) for scene in story_data.get("scenes", [])]
+
+
+async def restore_scene_voices(task_dir: str, scenes: List[StoryScene], voice_name: str, voice_rate: float, report: ProgressCallback, regenerate: int = 0) -> List[Optional[SubtitleCues]]:
+    """补齐任务目录中缺少的场景语音和字幕（如被磁盘清理删除），regenerate 指定的场景（序号从 1 开始）总是重新合成
+
+    Returns:
+        List[Optional[SubtitleCues]]: 各场景新合成的字幕，沿用已有文件的场景为 None，渲染时读取字幕文件
+    """
+    start = time.perf_counter()
+    cues: List[Optional[SubtitleCues]] = [None] * len(scenes)
+    for i, scene in enumerate(scenes, 1):
+        audio_file = os.path.join(task_dir, f"{i}.mp3")
+        subtitle_file = os.path.join(task_dir, f"{i}.srt")
+        if i == regenerate or not (os.path.exists(audio_file) and os.path.exists(subtitle_file)):
+            logger.info(f"Synthesizing voice for scene {i}")
+            result = await generate_voice(scene.text, voice_name, voice_rate, audio_file, subtitle_file)
+            cues[i - 1] = result.cues
+            report("voice", 100, scene=i, audio_file=result.audio_file, subtitle_file=result.subtitle_file)
+    report("voice", 100, elapsed=time.perf_counter() - start)
+    return cues
+
+
+async def edit_scene(task_id: str, index: int, edit: SceneEditRequest, progress: Optional[ProgressCallback] = None) -> str:
+    """修改单个场景并重新组装视频
+
+    只重新生成受修改影响的产物：图片地址或提示词变化时重新获取该场景的图片，文本变化时重新合成该场景的语音和字幕。
+    story.json 在新的图片和语音就绪后才更新，中途失败时任务可以按原来的修改重新执行。
+    渲染时按清单中的内容哈希判断，其余场景的片段直接复用，最后重新拼接。
+
+    Args:
+        task_id (str): 任务ID
+        index (int): 场景序号，从 1 开始
+        edit (SceneEditRequest): 修改内容
+        progress (ProgressCallback, optional): 进度回调
+    """
+    report = progress or _noop_progress
+    request, scenes = load_story(task_id)
+    if not 1 <= index <= len(scenes):
+        raise ValueError(f"Scene {index} not found, the story has {len(scenes)} scenes")
+    task_dir = utils.task_dir(task_id)
+    scene = scenes[index - 1]
+    text_changed = edit.text is not None and edit.text != scene.text
+    image_changed = (
+        edit.regenerate_image
+        or (edit.url is not None and edit.url != scene.url)
+        or (edit.image_prompt is not None and edit.image_prompt != scene.image_prompt)
+    )
+    scene.text = edit.text or scene.text
+    scene.image_prompt = edit.image_prompt or scene.image_prompt
+    report("story", 100, scene=index, text=scene.text, image_prompt=scene.image_prompt)
+
+    start = time.perf_counter()
+    if image_changed:
+        url = edit.url
+        if not url:
+            story_request = StoryGenerationRequest(
+                resolution=request.resolution,
+                story_prompt=request.story_prompt or scene.text,
+                language=request.language,
+                segments=len(scenes),
+                image_llm_provider=request.image_llm_provider,
+                image_llm_model=request.image_llm_model,
+            )
+            url = await llm_service.generate_segment_image(index, {"text": scene.text, "image_prompt": scene.image_prompt}, story_request)
+            if not url:
+                raise ValueError(f"Failed to generate image for scene {index}")
+        # 下载成功后才替换原图片
+        image_file = await download_image(url, os.path.join(task_dir, f"{index}.png"))
+        scene.url = url
+        report("images", 100, scene=index, url=url, image_file=image_file)
+    # 其它场景缺少的图片一并补齐
+    await download_scene_images(task_dir, scenes)
+    report("images", 100, elapsed=time.perf_counter() - start)
+
+    cues = await restore_scene_voices(task_dir, scenes, request.voice_name, request.voice_rate, report, regenerate=index if text_changed else 0)
+
+    story_data = request.model_dump()
+    story_data["scenes"] = [current.model_dump() for current in scenes]
+    task_store.write_json(os.path.join(task_dir, "story.json"), story_data)
+
+    return await create_video_with_scenes(task_dir, scenes, request.voice_name, request.voice_rate, progress=report, voice_ready=True, render_engine=request.render_engine, cues=cues, quality=request.quality, full_after_preview=request.full_after_preview)
+
+
+async def render_task(task_id: str, quality: RenderQuality, progress: Optional[ProgressCallback] = None) -> str:
+    """在已有任务上按指定质量重新渲染，用于看过预览后再渲染完整质量的视频
+
+    图片、语音和字幕沿用任务目录中已有的文件，只补齐缺少的；渲染时按清单中的内容哈希判断，
+    同一质量已渲染过且内容未变的片段直接复用。预览任务升级到完整质量后在 story.json 中记录
+    full_after_preview，之后修改场景时预览和完整质量的视频都会重新渲染。
+
+    Args:
+        task_id (str): 任务ID
+        quality (RenderQuality): 渲染质量
+        progress (ProgressCallback, optional): 进度回调
+    """
+    report = progress or _noop_progress
+    request, scenes = load_story(task_id)
+    task_dir = utils.task_dir(task_id)
+    await download_scene_images(task_dir, scenes, report)
+    cues = await restore_scene_voices(task_dir, scenes, request.voice_name, request.voice_rate, report)
+
+    if quality == RenderQuality.full and request.quality == RenderQuality.preview and not request.full_after_preview:
+        request.full_after_preview = True
+        story_data = request.model_dump()
+        story_data["scenes"] = [scene.model_dump() for scene in scenes]
+        task_store.write_json(os.path.join(task_dir, "story.json"), story_data)
+
+    return await create_video_with_scenes(task_dir, scenes, request.voice_name, request.voice_rate, progress=report, voice_ready=True, render_engine=request.render_engine, cues=cues, quality=quality)
@@ -1,5 +1,6 @@
 import os
 import asyncio
+import shutil
 import time
 import uuid
 import json
@@ -7,1065 +8,39 @@ import edge_tts
 import re
 import xml.sax.saxutils
 from edge_tts import SubMaker, submaker
-from edge_tts.submaker import mktimestamp
-from moviepy.video.tools import subtitles
 from loguru import logger
-from typing import Tuple
+from typing import List, NamedTuple, Optional, Tuple
 from xml.sax.saxutils import unescape
+from app.config import settings
+from app.services.alignment import align_words
+from app.services.subtitle import SubtitleCues
+from app.services.tts_cache import tts_cache
+from app.services.voice_catalog import voice_catalog
+from app.utils.mp3 import iter_frames
+from app.utils.segment import iter_spans, split_clauses
+from app.utils import task_store
+from app.utils.singleflight import SingleFlight
 
-PUNCTUATIONS = [
-    "?",
-    ",",
-    ".",
-    "、",
-    ";",
-    ":",
-    "!",
-    "…",
-    "？",
-    "，",
-    "。",
-    "、",
-    "；",
-    "：",
-    "！",
-    "...",
-]
+# 相同文本、语音和语速的并发合成只调用一次 Edge TTS，key 与 TTS 缓存相同
+tts_flight = SingleFlight("tts")
 
-def split_string_by_punctuations(s):
-    result = []
-    txt = ""
 
-    previous_char = ""
-    next_char = ""
-    for i in range(len(s)):
-        char = s[i]
-        if char == "\n":
-            if txt.strip():  # 只有在非空的情况下才添加
-                result.append(txt.strip())
-            txt = ""
-            continue
-
-        if i > 0:
-            previous_char = s[i - 1]
-        if i < len(s) - 1:
-            next_char = s[i + 1]
-
-        if char == "." and previous_char.isdigit() and next_char.isdigit():
-            txt += char
-            continue
+class VoiceResult(NamedTuple):
+    """语音合成结果，cues 为内存中的字幕，生成失败时为 None"""
+    audio_file: str
+    subtitle_file: str
+    cues: Optional[SubtitleCues]
 
-        if char not in PUNCTUATIONS:
-            txt += char
-        else:
-            if txt.strip():  # 只有在非空的情况下才添加
-                result.append(txt.strip())
-            txt = ""
-    if txt.strip():  # 最后一段如果非空也要添加
-        result.append(txt.strip())
-    
-    # 过滤掉空字符串和只包含标点符号的片段
-    def is_valid_segment(segment):
-        # 去掉所有标点符号后还有内容的才是有效片段
-        return bool(re.sub(r'[^\w\s]', '', segment).strip())
-    
-    result = list(filter(is_valid_segment, result))
-    return result
 
 def get_all_azure_voices(filter_locals=None) -> list[str]:
+    """获取语音列表，格式为 <name>-<gender>
+
+    Args:
+        filter_locals: locale 或语言前缀，如 zh-CN、en，默认常用的几种语言
+    """
     if filter_locals is None:
         filter_locals = ["zh-CN", "en-US", "zh-TW", "ja-JP", "ko-KR"]
-    voices_str = """
-Name: af-ZA-AdriNeural
-Gender: Female
-
-Name: af-ZA-WillemNeural
-Gender: Male
-
-Name: am-ET-AmehaNeural
-Gender: Male
-
-Name: am-ET-MekdesNeural
-Gender: Female
-
-Name: ar-AE-FatimaNeural
-Gender: Female
-
-Name: ar-AE-HamdanNeural
-Gender: Male
-
-Name: ar-BH-AliNeural
-Gender: Male
-
-Name: ar-BH-LailaNeural
-Gender: Female
-
-Name: ar-DZ-AminaNeural
-Gender: Female
-
-Name: ar-DZ-IsmaelNeural
-Gender: Male
-
-Name: ar-EG-SalmaNeural
-Gender: Female
-
-Name: ar-EG-ShakirNeural
-Gender: Male
-
-Name: ar-IQ-BasselNeural
-Gender: Male
-
-Name: ar-IQ-RanaNeural
-Gender: Female
-
-Name: ar-JO-SanaNeural
-Gender: Female
-
-Name: ar-JO-TaimNeural
-Gender: Male
-
-Name: ar-KW-FahedNeural
-Gender: Male
-
-Name: ar-KW-NouraNeural
-Gender: Female
-
-Name: ar-LB-LaylaNeural
-Gender: Female
-
-Name: ar-LB-RamiNeural
-Gender: Male
-
-Name: ar-LY-ImanNeural
-Gender: Female
-
-Name: ar-LY-OmarNeural
-Gender: Male
-
-Name: ar-MA-JamalNeural
-Gender: Male
-
-Name: ar-MA-MounaNeural
-Gender: Female
-
-Name: ar-OM-AbdullahNeural
-Gender: Male
-
-Name: ar-OM-AyshaNeural
-Gender: Female
-
-Name: ar-QA-AmalNeural
-Gender: Female
-
-Name: ar-QA-MoazNeural
-Gender: Male
-
-Name: ar-SA-HamedNeural
-Gender: Male
-
-Name: ar-SA-ZariyahNeural
-Gender: Female
-
-Name: ar-SY-AmanyNeural
-Gender: Female
-
-Name: ar-SY-LaithNeural
-Gender: Male
-
-Name: ar-TN-HediNeural
-Gender: Male
-
-Name: ar-TN-ReemNeural
-Gender: Female
-
-Name: ar-YE-MaryamNeural
-Gender: Female
-
-Name: ar-YE-SalehNeural
-Gender: Male
-
-Name: az-AZ-BabekNeural
-Gender: Male
-
-Name: az-AZ-BanuNeural
-Gender: Female
-
-Name: bg-BG-BorislavNeural
-Gender: Male
-
-Name: bg-BG-KalinaNeural
-Gender: Female
-
-Name: bn-BD-NabanitaNeural
-Gender: Female
-
-Name: bn-BD-PradeepNeural
-Gender: Male
-
-Name: bn-IN-BashkarNeural
-Gender: Male
-
-Name: bn-IN-TanishaaNeural
-Gender: Female
-
-Name: bs-BA-GoranNeural
-Gender: Male
-
-Name: bs-BA-VesnaNeural
-Gender: Female
-
-Name: ca-ES-EnricNeural
-Gender: Male
-
-Name: ca-ES-JoanaNeural
-Gender: Female
-
-Name: cs-CZ-AntoninNeural
-Gender: Male
-
-Name: cs-CZ-VlastaNeural
-Gender: Female
-
-Name: cy-GB-AledNeural
-Gender: Male
-
-Name: cy-GB-NiaNeural
-Gender: Female
-
-Name: da-DK-ChristelNeural
-Gender: Female
-
-Name: da-DK-JeppeNeural
-Gender: Male
-
-Name: de-AT-IngridNeural
-Gender: Female
-
-Name: de-AT-JonasNeural
-Gender: Male
-
-Name: de-CH-JanNeural
-Gender: Male
-
-Name: de-CH-LeniNeural
-Gender: Female
-
-Name: de-DE-AmalaNeural
-Gender: Female
-
-Name: de-DE-ConradNeural
-Gender: Male
-
-Name: de-DE-FlorianMultilingualNeural
-Gender: Male
-
-Name: de-DE-KatjaNeural
-Gender: Female
-
-Name: de-DE-KillianNeural
-Gender: Male
-
-Name: de-DE-SeraphinaMultilingualNeural
-Gender: Female
-
-Name: el-GR-AthinaNeural
-Gender: Female
-
-Name: el-GR-NestorasNeural
-Gender: Male
-
-Name: en-AU-NatashaNeural
-Gender: Female
-
-Name: en-AU-WilliamNeural
-Gender: Male
-
-Name: en-CA-ClaraNeural
-Gender: Female
-
-Name: en-CA-LiamNeural
-Gender: Male
-
-Name: en-GB-LibbyNeural
-Gender: Female
-
-Name: en-GB-MaisieNeural
-Gender: Female
-
-Name: en-GB-RyanNeural
-Gender: Male
-
-Name: en-GB-SoniaNeural
-Gender: Female
-
-Name: en-GB-ThomasNeural
-Gender: Male
-
-Name: en-HK-SamNeural
-Gender: Male
-
-Name: en-HK-YanNeural
-Gender: Female
-
-Name: en-IE-ConnorNeural
-Gender: Male
-
-Name: en-IE-EmilyNeural
-Gender: Female
-
-Name: en-IN-NeerjaExpressiveNeural
-Gender: Female
-
-Name: en-IN-NeerjaNeural
-Gender: Female
-
-Name: en-IN-PrabhatNeural
-Gender: Male
-
-Name: en-KE-AsiliaNeural
-Gender: Female
-
-Name: en-KE-ChilembaNeural
-Gender: Male
-
-Name: en-NG-AbeoNeural
-Gender: Male
-
-Name: en-NG-EzinneNeural
-Gender: Female
-
-Name: en-NZ-MitchellNeural
-Gender: Male
-
-Name: en-NZ-MollyNeural
-Gender: Female
-
-Name: en-PH-JamesNeural
-Gender: Male
-
-Name: en-PH-RosaNeural
-Gender: Female
-
-Name: en-SG-LunaNeural
-Gender: Female
-
-Name: en-SG-WayneNeural
-Gender: Male
-
-Name: en-TZ-ElimuNeural
-Gender: Male
-
-Name: en-TZ-ImaniNeural
-Gender: Female
-
-Name: en-US-AnaNeural
-Gender: Female
-
-Name: en-US-AndrewMultilingualNeural
-Gender: Male
-
-Name: en-US-AndrewNeural
-Gender: Male
-
-Name: en-US-AriaNeural
-Gender: Female
-
-Name: en-US-AvaMultilingualNeural
-Gender: Female
-
-Name: en-US-AvaNeural
-Gender: Female
-
-Name: en-US-BrianMultilingualNeural
-Gender: Male
-
-Name: en-US-BrianNeural
-Gender: Male
-
-Name: en-US-ChristopherNeural
-Gender: Male
-
-Name: en-US-EmmaMultilingualNeural
-Gender: Female
-
-Name: en-US-EmmaNeural
-Gender: Female
-
-Name: en-US-EricNeural
-Gender: Male
-
-Name: en-US-GuyNeural
-Gender: Male
-
-Name: en-US-JennyNeural
-Gender: Female
-
-Name: en-US-MichelleNeural
-Gender: Female
-
-Name: en-US-RogerNeural
-Gender: Male
-
-Name: en-US-SteffanNeural
-Gender: Male
-
-Name: en-ZA-LeahNeural
-Gender: Female
-
-Name: en-ZA-LukeNeural
-Gender: Male
-
-Name: es-AR-ElenaNeural
-Gender: Female
-
-Name: es-AR-TomasNeural
-Gender: Male
-
-Name: es-BO-MarceloNeural
-Gender: Male
-
-Name: es-BO-SofiaNeural
-Gender: Female
-
-Name: es-CL-CatalinaNeural
-Gender: Female
-
-Name: es-CL-LorenzoNeural
-Gender: Male
-
-Name: es-CO-GonzaloNeural
-Gender: Male
-
-Name: es-CO-SalomeNeural
-Gender: Female
-
-Name: es-CR-JuanNeural
-Gender: Male
-
-Name: es-CR-MariaNeural
-Gender: Female
-
-Name: es-CU-BelkysNeural
-Gender: Female
-
-Name: es-CU-ManuelNeural
-Gender: Male
-
-Name: es-DO-EmilioNeural
-Gender: Male
-
-Name: es-DO-RamonaNeural
-Gender: Female
-
-Name: es-EC-AndreaNeural
-Gender: Female
-
-Name: es-EC-LuisNeural
-Gender: Male
-
-Name: es-ES-AlvaroNeural
-Gender: Male
-
-Name: es-ES-ElviraNeural
-Gender: Female
-
-Name: es-ES-XimenaNeural
-Gender: Female
-
-Name: es-GQ-JavierNeural
-Gender: Male
-
-Name: es-GQ-TeresaNeural
-Gender: Female
-
-Name: es-GT-AndresNeural
-Gender: Male
-
-Name: es-GT-MartaNeural
-Gender: Female
-
-Name: es-HN-CarlosNeural
-Gender: Male
-
-Name: es-HN-KarlaNeural
-Gender: Female
-
-Name: es-MX-DaliaNeural
-Gender: Female
-
-Name: es-MX-JorgeNeural
-Gender: Male
-
-Name: es-NI-FedericoNeural
-Gender: Male
-
-Name: es-NI-YolandaNeural
-Gender: Female
-
-Name: es-PA-MargaritaNeural
-Gender: Female
-
-Name: es-PA-RobertoNeural
-Gender: Male
-
-Name: es-PE-AlexNeural
-Gender: Male
-
-Name: es-PE-CamilaNeural
-Gender: Female
-
-Name: es-PR-KarinaNeural
-Gender: Female
-
-Name: es-PR-VictorNeural
-Gender: Male
-
-Name: es-PY-MarioNeural
-Gender: Male
-
-Name: es-PY-TaniaNeural
-Gender: Female
-
-Name: es-SV-LorenaNeural
-Gender: Female
-
-Name: es-SV-RodrigoNeural
-Gender: Male
-
-Name: es-US-AlonsoNeural
-Gender: Male
-
-Name: es-US-PalomaNeural
-Gender: Female
-
-Name: es-UY-MateoNeural
-Gender: Male
-
-Name: es-UY-ValentinaNeural
-Gender: Female
-
-Name: es-VE-PaolaNeural
-Gender: Female
-
-Name: es-VE-SebastianNeural
-Gender: Male
-
-Name: et-EE-AnuNeural
-Gender: Female
-
-Name: et-EE-KertNeural
-Gender: Male
-
-Name: fa-IR-DilaraNeural
-Gender: Female
-
-Name: fa-IR-FaridNeural
-Gender: Male
-
-Name: fi-FI-HarriNeural
-Gender: Male
-
-Name: fi-FI-NooraNeural
-Gender: Female
-
-Name: fil-PH-AngeloNeural
-Gender: Male
-
-Name: fil-PH-BlessicaNeural
-Gender: Female
-
-Name: fr-BE-CharlineNeural
-Gender: Female
-
-Name: fr-BE-GerardNeural
-Gender: Male
-
-Name: fr-CA-AntoineNeural
-Gender: Male
-
-Name: fr-CA-JeanNeural
-Gender: Male
-
-Name: fr-CA-SylvieNeural
-Gender: Female
-
-Name: fr-CA-ThierryNeural
-Gender: Male
-
-Name: fr-CH-ArianeNeural
-Gender: Female
-
-Name: fr-CH-FabriceNeural
-Gender: Male
-
-Name: fr-FR-DeniseNeural
-Gender: Female
-
-Name: fr-FR-EloiseNeural
-Gender: Female
-
-Name: fr-FR-HenriNeural
-Gender: Male
-
-Name: fr-FR-RemyMultilingualNeural
-Gender: Male
-
-Name: fr-FR-VivienneMultilingualNeural
-Gender: Female
-
-Name: ga-IE-ColmNeural
-Gender: Male
-
-Name: ga-IE-OrlaNeural
-Gender: Female
-
-Name: gl-ES-RoiNeural
-Gender: Male
-
-Name: gl-ES-SabelaNeural
-Gender: Female
-
-Name: gu-IN-DhwaniNeural
-Gender: Female
-
-Name: gu-IN-NiranjanNeural
-Gender: Male
-
-Name: he-IL-AvriNeural
-Gender: Male
-
-Name: he-IL-HilaNeural
-Gender: Female
-
-Name: hi-IN-MadhurNeural
-Gender: Male
-
-Name: hi-IN-SwaraNeural
-Gender: Female
-
-Name: hr-HR-GabrijelaNeural
-Gender: Female
-
-Name: hr-HR-SreckoNeural
-Gender: Male
-
-Name: hu-HU-NoemiNeural
-Gender: Female
-
-Name: hu-HU-TamasNeural
-Gender: Male
-
-Name: id-ID-ArdiNeural
-Gender: Male
-
-Name: id-ID-GadisNeural
-Gender: Female
-
-Name: is-IS-GudrunNeural
-Gender: Female
-
-Name: is-IS-GunnarNeural
-Gender: Male
-
-Name: it-IT-DiegoNeural
-Gender: Male
-
-Name: it-IT-ElsaNeural
-Gender: Female
-
-Name: it-IT-GiuseppeMultilingualNeural
-Gender: Male
-
-Name: it-IT-IsabellaNeural
-Gender: Female
-
-Name: iu-Cans-CA-SiqiniqNeural
-Gender: Female
-
-Name: iu-Cans-CA-TaqqiqNeural
-Gender: Male
-
-Name: iu-Latn-CA-SiqiniqNeural
-Gender: Female
-
-Name: iu-Latn-CA-TaqqiqNeural
-Gender: Male
-
-Name: ja-JP-KeitaNeural
-Gender: Male
-
-Name: ja-JP-NanamiNeural
-Gender: Female
-
-Name: jv-ID-DimasNeural
-Gender: Male
-
-Name: jv-ID-SitiNeural
-Gender: Female
-
-Name: ka-GE-EkaNeural
-Gender: Female
-
-Name: ka-GE-GiorgiNeural
-Gender: Male
-
-Name: kk-KZ-AigulNeural
-Gender: Female
-
-Name: kk-KZ-DauletNeural
-Gender: Male
-
-Name: km-KH-PisethNeural
-Gender: Male
-
-Name: km-KH-SreymomNeural
-Gender: Female
-
-Name: kn-IN-GaganNeural
-Gender: Male
-
-Name: kn-IN-SapnaNeural
-Gender: Female
-
-Name: ko-KR-HyunsuMultilingualNeural
-Gender: Male
-
-Name: ko-KR-InJoonNeural
-Gender: Male
-
-Name: ko-KR-SunHiNeural
-Gender: Female
-
-Name: lo-LA-ChanthavongNeural
-Gender: Male
-
-Name: lo-LA-KeomanyNeural
-Gender: Female
-
-Name: lt-LT-LeonasNeural
-Gender: Male
-
-Name: lt-LT-OnaNeural
-Gender: Female
-
-Name: lv-LV-EveritaNeural
-Gender: Female
-
-Name: lv-LV-NilsNeural
-Gender: Male
-
-Name: mk-MK-AleksandarNeural
-Gender: Male
-
-Name: mk-MK-MarijaNeural
-Gender: Female
-
-Name: ml-IN-MidhunNeural
-Gender: Male
-
-Name: ml-IN-SobhanaNeural
-Gender: Female
-
-Name: mn-MN-BataaNeural
-Gender: Male
-
-Name: mn-MN-YesuiNeural
-Gender: Female
-
-Name: mr-IN-AarohiNeural
-Gender: Female
-
-Name: mr-IN-ManoharNeural
-Gender: Male
-
-Name: ms-MY-OsmanNeural
-Gender: Male
-
-Name: ms-MY-YasminNeural
-Gender: Female
-
-Name: mt-MT-GraceNeural
-Gender: Female
-
-Name: mt-MT-JosephNeural
-Gender: Male
-
-Name: my-MM-NilarNeural
-Gender: Female
-
-Name: my-MM-ThihaNeural
-Gender: Male
-
-Name: nb-NO-FinnNeural
-Gender: Male
-
-Name: nb-NO-PernilleNeural
-Gender: Female
-
-Name: ne-NP-HemkalaNeural
-Gender: Female
-
-Name: ne-NP-SagarNeural
-Gender: Male
-
-Name: nl-BE-ArnaudNeural
-Gender: Male
-
-Name: nl-BE-DenaNeural
-Gender: Female
-
-Name: nl-NL-ColetteNeural
-Gender: Female
-
-Name: nl-NL-FennaNeural
-Gender: Female
-
-Name: nl-NL-MaartenNeural
-Gender: Male
-
-Name: pl-PL-MarekNeural
-Gender: Male
-
-Name: pl-PL-ZofiaNeural
-Gender: Female
-
-Name: ps-AF-GulNawazNeural
-Gender: Male
-
-Name: ps-AF-LatifaNeural
-Gender: Female
-
-Name: pt-BR-AntonioNeural
-Gender: Male
-
-Name: pt-BR-FranciscaNeural
-Gender: Female
-
-Name: pt-BR-ThalitaMultilingualNeural
-Gender: Female
-
-Name: pt-PT-DuarteNeural
-Gender: Male
-
-Name: pt-PT-RaquelNeural
-Gender: Female
-
-Name: ro-RO-AlinaNeural
-Gender: Female
-
-Name: ro-RO-EmilNeural
-Gender: Male
-
-Name: ru-RU-DmitryNeural
-Gender: Male
-
-Name: ru-RU-SvetlanaNeural
-Gender: Female
-
-Name: si-LK-SameeraNeural
-Gender: Male
-
-Name: si-LK-ThiliniNeural
-Gender: Female
-
-Name: sk-SK-LukasNeural
-Gender: Male
-
-Name: sk-SK-ViktoriaNeural
-Gender: Female
-
-Name: sl-SI-PetraNeural
-Gender: Female
-
-Name: sl-SI-RokNeural
-Gender: Male
-
-Name: so-SO-MuuseNeural
-Gender: Male
-
-Name: so-SO-UbaxNeural
-Gender: Female
-
-Name: sq-AL-AnilaNeural
-Gender: Female
-
-Name: sq-AL-IlirNeural
-Gender: Male
-
-Name: sr-RS-NicholasNeural
-Gender: Male
-
-Name: sr-RS-SophieNeural
-Gender: Female
-
-Name: su-ID-JajangNeural
-Gender: Male
-
-Name: su-ID-TutiNeural
-Gender: Female
-
-Name: sv-SE-MattiasNeural
-Gender: Male
-
-Name: sv-SE-SofieNeural
-Gender: Female
-
-Name: sw-KE-RafikiNeural
-Gender: Male
-
-Name: sw-KE-ZuriNeural
-Gender: Female
-
-Name: sw-TZ-DaudiNeural
-Gender: Male
-
-Name: sw-TZ-RehemaNeural
-Gender: Female
-
-Name: ta-IN-PallaviNeural
-Gender: Female
-
-Name: ta-IN-ValluvarNeural
-Gender: Male
-
-Name: ta-LK-KumarNeural
-Gender: Male
-
-Name: ta-LK-SaranyaNeural
-Gender: Female
-
-Name: ta-MY-KaniNeural
-Gender: Female
-
-Name: ta-MY-SuryaNeural
-Gender: Male
-
-Name: ta-SG-AnbuNeural
-Gender: Male
-
-Name: ta-SG-VenbaNeural
-Gender: Female
-
-Name: te-IN-MohanNeural
-Gender: Male
-
-Name: te-IN-ShrutiNeural
-Gender: Female
-
-Name: th-TH-NiwatNeural
-Gender: Male
-
-Name: th-TH-PremwadeeNeural
-Gender: Female
-
-Name: tr-TR-AhmetNeural
-Gender: Male
-
-Name: tr-TR-EmelNeural
-Gender: Female
-
-Name: uk-UA-OstapNeural
-Gender: Male
-
-Name: uk-UA-PolinaNeural
-Gender: Female
-
-Name: ur-IN-GulNeural
-Gender: Female
-
-Name: ur-IN-SalmanNeural
-Gender: Male
-
-Name: ur-PK-AsadNeural
-Gender: Male
-
-Name: ur-PK-UzmaNeural
-Gender: Female
-
-Name: uz-UZ-MadinaNeural
-Gender: Female
-
-Name: uz-UZ-SardorNeural
-Gender: Male
-
-Name: vi-VN-HoaiMyNeural
-Gender: Female
-
-Name: vi-VN-NamMinhNeural
-Gender: Male
-
-Name: zh-CN-XiaoxiaoNeural
-Gender: Female
-
-Name: zh-CN-XiaoyiNeural
-Gender: Female
-
-Name: zh-CN-YunjianNeural
-Gender: Male
-
-Name: zh-CN-YunxiNeural
-Gender: Male
-
-Name: zh-CN-YunxiaNeural
-Gender: Male
-
-Name: zh-CN-YunyangNeural
-Gender: Male
-
-Name: zh-CN-liaoning-XiaobeiNeural
-Gender: Female
-
-Name: zh-CN-shaanxi-XiaoniNeural
-Gender: Female
-
-Name: zh-HK-HiuGaaiNeural
-Gender: Female
-
-Name: zh-HK-HiuMaanNeural
-Gender: Female
-
-Name: zh-HK-WanLungNeural
-Gender: Male
-
-Name: zh-TW-HsiaoChenNeural
-Gender: Female
-
-Name: zh-TW-HsiaoYuNeural
-Gender: Female
-
-Name: zh-TW-YunJheNeural
-Gender: Male
-
-Name: zu-ZA-ThandoNeural
-Gender: Female
-
-Name: zu-ZA-ThembaNeural
-Gender: Male
-    """.strip()
-    voices = []
-    name = ""
-    for line in voices_str.split("\n"):
-        line = line.strip()
-        if not line:
-            continue
-        if line.startswith("Name: "):
-            name = line[6:].strip()
-        if line.startswith("Gender: "):
-            gender = line[8:].strip()
-            if name and gender:
-                # voices.append({
-                #     "name": name,
-                #     "gender": gender,
-                # })
-                if filter_locals:
-                    for filter_local in filter_locals:
-                        if name.lower().startswith(filter_local.lower()):
-                            voices.append(f"{name}-{gender}")
-                else:
-                    voices.append(f"{name}-{gender}")
-                name = ""
-    voices.sort()
-    return voices
+    return voice_catalog.filter(filter_locals)
 
 
 def parse_voice_name(name: str):
@@ -1086,7 +61,7 @@ def convert_rate_to_percent(rate: float) -> str:
         return f"{percent}%"
 
 
-async def generate_voice(text: str, voice_name: str, voice_rate: float = 0, audio_file: str = None, subtitle_file: str = None) -> Tuple[str, str]:
+async def generate_voice(text: str, voice_name: str, voice_rate: float = 0, audio_file: str = None, subtitle_file: str = None) -> VoiceResult:
     """生成语音和字幕
 
     Args:
@@ -1097,22 +72,244 @@ async def generate_voice(text: str, voice_name: str, voice_rate: float = 0, audi
         subtitle_file (str, optional): 字幕文件路径. Defaults to None.
 
     Returns:
-        Tuple[str, str]: 语音文件路径, 字幕文件路径
+        VoiceResult: 语音文件路径, 字幕文件路径, 内存中的字幕
     """
     if audio_file is None:
         audio_file = f"temp_{uuid.uuid4()}.mp3"
     if subtitle_file is None:
         subtitle_file = f"temp_{uuid.uuid4()}.srt"
 
-    # 生成语音
-    sub_maker = await edge_tts_voice(text, voice_name, audio_file, voice_rate)
+    # 生成语音，相同文本、语音和语速的结果直接从缓存读取；缓存的读写、淘汰和文件复制都在后台线程中进行，不阻塞事件循环
+    sub_maker = None
+    cache_key = tts_cache.make_key(text, voice_name, voice_rate)
+    if settings.tts_cache_enabled:
+        sub_maker = await asyncio.to_thread(tts_cache.get, cache_key, audio_file)
+        if sub_maker:
+            logger.info(f"tts cache hit, key: {cache_key}")
+    if not sub_maker:
+        async def synthesize() -> Tuple[str, Optional[SubMaker]]:
+            if len(text) > settings.tts_chunk_chars:
+                result = await edge_tts_voice_chunked(text, voice_name, audio_file, voice_rate)
+            else:
+                result = await edge_tts_voice(text, voice_name, audio_file, voice_rate)
+            if result and settings.tts_cache_enabled:
+                await asyncio.to_thread(tts_cache.put, cache_key, audio_file, result)
+            return audio_file, result
+
+        # 合并到其它调用时，语音写在发起合成的调用的文件里，复制一份
+        synthesized_file, sub_maker = await tts_flight.do(cache_key, synthesize)
+        if sub_maker and synthesized_file != audio_file:
+            await asyncio.to_thread(shutil.copyfile, synthesized_file, audio_file)
     # 生成字幕
+    cues = None
     if sub_maker:
-        await generate_subtitle(sub_maker, text, subtitle_file)
+        cues = await generate_subtitle(sub_maker, text, subtitle_file)
     else:
         logger.error("Failed to generate sub_maker")
     
-    return audio_file, subtitle_file
+    return VoiceResult(audio_file, subtitle_file, cues)
+
+
+async def generate_voices(texts: List[str], voice_name: str, voice_rate: float, audio_files: List[str], subtitle_files: List[str]) -> List[VoiceResult]:
+    """一次 TTS 请求为多段文本生成语音和字幕
+
+    缓存中没有的文本合在一起调用一次 edge_tts_voices，再切分回各段；
+    切分失败时退回逐段调用 edge_tts_voice。
+
+    Returns:
+        List[VoiceResult]: 与 texts 顺序一致的合成结果
+    """
+    sub_makers: List[Optional[SubMaker]] = [None] * len(texts)
+    cache_keys = [tts_cache.make_key(text, voice_name, voice_rate) for text in texts]
+    if settings.tts_cache_enabled:
+        for i, cache_key in enumerate(cache_keys):
+            sub_makers[i] = await asyncio.to_thread(tts_cache.get, cache_key, audio_files[i])
+            if sub_makers[i]:
+                logger.info(f"tts cache hit, key: {cache_key}")
+
+    pending = [i for i, sub_maker in enumerate(sub_makers) if not sub_maker]
+    if len(pending) > 1:
+        results = await edge_tts_voices([texts[i] for i in pending], voice_name, [audio_files[i] for i in pending], voice_rate)
+        for i, sub_maker in zip(pending, results or []):
+            sub_makers[i] = sub_maker
+    for i in pending:
+        if not sub_makers[i]:
+            sub_makers[i] = await edge_tts_voice(texts[i], voice_name, audio_files[i], voice_rate)
+        if sub_makers[i] and settings.tts_cache_enabled:
+            await asyncio.to_thread(tts_cache.put, cache_keys[i], audio_files[i], sub_makers[i])
+
+    results = []
+    for text, sub_maker, audio_file, subtitle_file in zip(texts, sub_makers, audio_files, subtitle_files):
+        cues = None
+        if sub_maker:
+            cues = await generate_subtitle(sub_maker, text, subtitle_file)
+        else:
+            logger.error("Failed to generate sub_maker")
+        results.append(VoiceResult(audio_file, subtitle_file, cues))
+    return results
+
+
+async def _edge_tts_stream(text: str, voice_name: str, rate_str: str) -> Tuple[bytes, List[Tuple[int, int, str]]]:
+    """调用一次 Edge TTS，返回音频数据和 WordBoundary 列表 [(offset, duration, text)]
+
+    Raises:
+        ValueError: 没有收到 WordBoundary
+    """
+    communicate = edge_tts.Communicate(text, voice_name, rate=rate_str)
+    audio = bytearray()
+    words = []
+    async for chunk in communicate.stream():
+        if chunk["type"] == "audio":
+            audio += chunk["data"]
+        elif chunk["type"] == "WordBoundary":
+            words.append((chunk["offset"], chunk["duration"], chunk["text"]))
+    if not words:
+        raise ValueError("no word boundary received")
+    return bytes(audio), words
+
+
+def split_text_chunks(text: str, max_chars: int) -> List[str]:
+    """把长文本在句子边界切成不超过 max_chars 的片段
+
+    切分点取在标点之后，与 split_clauses 的断句一致，
+    保证字幕的每一行都完整地落在一个片段里。单句超过 max_chars 时不再切分。
+    """
+    sentences = [text[start:end] for start, _, end in iter_spans(text)]
+
+    chunks = []
+    chunk = ""
+    for sentence in sentences:
+        if chunk and len(chunk) + len(sentence) > max_chars:
+            chunks.append(chunk)
+            chunk = ""
+        chunk += sentence
+    if chunk.strip():
+        chunks.append(chunk)
+    # 只有标点的片段并入前一个片段，避免 TTS 收到没有可读内容的文本
+    merged = []
+    for chunk in chunks:
+        if merged and not re.sub(r"[^\w]", "", chunk):
+            merged[-1] += chunk
+        else:
+            merged.append(chunk)
+    return merged
+
+
+async def edge_tts_voice_chunked(text: str, voice_name: str, voice_file: str, voice_rate: float = 0) -> SubMaker:
+    """长文本分片并发合成
+
+    按句子边界切成 tts_chunk_chars 以内的片段，并发调用 Edge TTS，失败时只重试失败的片段，
+    最后按顺序拼接 MP3 帧，字幕时间加上前面片段的累计时长。
+    """
+    rate_str = convert_rate_to_percent(voice_rate)
+    chunks = split_text_chunks(text, settings.tts_chunk_chars)
+    semaphore = asyncio.Semaphore(max(1, settings.tts_concurrency))
+    results: List[Optional[Tuple[bytes, List[Tuple[int, int, str]]]]] = [None] * len(chunks)
+
+    async def synthesize(index: int):
+        async with semaphore:
+            try:
+                results[index] = await _edge_tts_stream(chunks[index], voice_name, rate_str)
+            except Exception as e:
+                logger.error(f"failed, chunk: {index + 1}/{len(chunks)}, error: {str(e)}")
+
+    for i in range(3):
+        pending = [index for index, result in enumerate(results) if result is None]
+        if not pending:
+            break
+        logger.info(f"start, voice name: {voice_name}, chunks: {len(pending)}/{len(chunks)}, try: {i + 1}")
+        await asyncio.gather(*[synthesize(index) for index in pending])
+    if any(result is None for result in results):
+        logger.error(f"failed, {sum(result is None for result in results)} chunks not synthesized")
+        return None
+
+    sub_maker = edge_tts.SubMaker()
+    chunk_start = 0
+    with task_store.atomic_open(voice_file, "wb") as file:
+        for audio, words in results:
+            for offset, duration, word in words:
+                sub_maker.create_sub((offset + chunk_start, duration), word)
+            for frame_offset, length, duration in iter_frames(audio):
+                file.write(audio[frame_offset:frame_offset + length])
+                chunk_start += duration
+    logger.info(f"completed, output file: {voice_file}, chunks: {len(chunks)}")
+    return sub_maker
+
+
+def _group_words(texts: List[str], words: List[Tuple[int, int, str]]) -> Optional[List[List[Tuple[int, int, str]]]]:
+    """按字符数把 WordBoundary 分配到各段文本，对不上时返回 None
+
+    只比较文字字符（去掉标点和空白），每段的最后一个词必须正好结束在该段的最后一个字符上。
+    """
+    groups: List[List[Tuple[int, int, str]]] = [[] for _ in texts]
+    boundaries = []
+    total = 0
+    for text in texts:
+        total += len(re.sub(r"\W+", "", text))
+        boundaries.append(total)
+    index = 0
+    count = 0
+    for word in words:
+        while index < len(texts) and count >= boundaries[index]:
+            index += 1
+        if index == len(texts):
+            return None
+        groups[index].append(word)
+        count += len(re.sub(r"\W+", "", unescape(word[2])))
+        if count > boundaries[index]:
+            return None
+    if count != total or not all(groups):
+        return None
+    return groups
+
+
+async def edge_tts_voices(texts: List[str], voice_name: str, voice_files: List[str], voice_rate: float = 0) -> Optional[List[SubMaker]]:
+    """一次 Edge TTS 请求合成多段文本，再切分成各段的语音
+
+    各段之间用换行分隔，切分点取前一段最后一个词结束和后一段第一个词开始的中间，
+    并对齐到 MP3 帧边界，各段字幕的时间减去该段起点。
+
+    Returns:
+        Optional[List[SubMaker]]: 各段的 SubMaker，合成或切分失败时返回 None
+    """
+    rate_str = convert_rate_to_percent(voice_rate)
+    audio = None
+    for i in range(3):
+        try:
+            logger.info(f"start, voice name: {voice_name}, texts: {len(texts)}, try: {i + 1}")
+            audio, words = await _edge_tts_stream("\n".join(texts), voice_name, rate_str)
+            break
+        except Exception as e:
+            logger.error(f"failed, error: {str(e)}")
+    if audio is None:
+        return None
+
+    groups = _group_words(texts, words)
+    if groups is None:
+        logger.warning("failed to split batched voice by word boundaries")
+        return None
+    # 切分时间点，单位与 offset 相同（100 纳秒）
+    cuts = [(prev[-1][0] + prev[-1][1] + group[0][0]) // 2 for prev, group in zip(groups, groups[1:])]
+    cuts.append(float("inf"))
+
+    sub_makers = []
+    frames = iter_frames(audio)
+    frame = next(frames, None)
+    frame_start = 0
+    for group, cut, voice_file in zip(groups, cuts, voice_files):
+        segment_start = frame_start
+        with task_store.atomic_open(voice_file, "wb") as file:
+            while frame and frame_start < cut:
+                offset, length, duration = frame
+                file.write(audio[offset:offset + length])
+                frame_start += duration
+                frame = next(frames, None)
+        sub_maker = edge_tts.SubMaker()
+        for offset, duration, text in group:
+            sub_maker.create_sub((offset - segment_start, duration), text)
+        sub_makers.append(sub_maker)
+        logger.info(f"completed, output file: {voice_file}")
+    return sub_makers
 
 
 async def edge_tts_voice(text: str, voice_name: str, voice_file: str, voice_rate: float = 0) -> SubMaker:
@@ -1125,7 +322,7 @@ async def edge_tts_voice(text: str, voice_name: str, voice_file: str, voice_rate
             communicate = edge_tts.Communicate(text, voice_name, rate=rate_str)
             sub_maker = edge_tts.SubMaker()
             
-            with open(voice_file, "wb") as file:
+            with task_store.atomic_open(voice_file, "wb") as file:
                 async for chunk in communicate.stream():
                     if chunk["type"] == "audio":
                         file.write(chunk["data"])
@@ -1146,22 +343,23 @@ async def edge_tts_voice(text: str, voice_name: str, voice_file: str, voice_rate
     return None
 
 
-async def generate_subtitle(sub_maker: edge_tts.SubMaker, text: str, subtitle_file: str):
-    """生成字幕文件"""
+async def generate_subtitle(sub_maker: edge_tts.SubMaker, text: str, subtitle_file: str) -> Optional[SubtitleCues]:
+    """生成字幕，返回内存中的字幕并导出字幕文件"""
     try:
         if not sub_maker or not hasattr(sub_maker, "subs") or not sub_maker.subs:
             print("No subtitles to generate: sub_maker is None or sub_maker.subs is empty")
-            return
+            return None
 
         print(f"Generating subtitles with {len(sub_maker.subs)} items")
         
         # 直接使用创建字幕的函数
-        await create_subtitle(sub_maker=sub_maker, text=text, subtitle_file=subtitle_file)
+        return await create_subtitle(sub_maker=sub_maker, text=text, subtitle_file=subtitle_file)
             
     except Exception as e:
         print(f"failed to generate subtitle: {str(e)}")
         import traceback
         print(traceback.format_exc())
+        return None
 
 
 def get_audio_duration(sub_maker: edge_tts.SubMaker) -> float:
@@ -1186,90 +384,35 @@ def _format_text(text: str) -> str:
 
 
 
-async def create_subtitle(sub_maker: edge_tts.SubMaker, text: str, subtitle_file: str):
+async def create_subtitle(sub_maker: edge_tts.SubMaker, text: str, subtitle_file: str) -> Optional[SubtitleCues]:
     """
     优化字幕文件
     1. 将字幕文件按照标点符号分割成多行
-    2. 逐行匹配字幕文件中的文本
-    3. 生成新的字幕文件
+    2. 将 TTS 的词边界对齐到每一行
+    3. 生成内存中的字幕，并导出为字幕文件
     """
     text = _format_text(text)
 
-    def formatter(idx: int, start_time: float, end_time: float, sub_text: str) -> str:
-        """
-        1
-        00:00:00,000 --> 00:00:02,360
-        跑步是一项简单易行的运动
-        """
-        start_t = mktimestamp(start_time).replace(".", ",")
-        end_t = mktimestamp(end_time).replace(".", ",")
-        return f"{idx}\n{start_t} --> {end_t}\n{sub_text}\n"
-
-    start_time = -1.0
-    sub_items = []
-    sub_index = 0
-
-    script_lines = split_string_by_punctuations(text)
+    script_lines = split_clauses(text)
     logger.debug(f"Split text into {len(script_lines)} lines: {script_lines}")
 
-    def match_line(_sub_line: str, _sub_index: int):
-        if len(script_lines) <= _sub_index:
-            return ""
-
-        _line = script_lines[_sub_index]
-        if _sub_line == _line:
-            return script_lines[_sub_index].strip()
-
-        _sub_line_ = re.sub(r"[^\w\s]", "", _sub_line)
-        _line_ = re.sub(r"[^\w\s]", "", _line)
-        if _sub_line_ == _line_:
-            return _line_.strip()
-
-        _sub_line_ = re.sub(r"\W+", "", _sub_line)
-        _line_ = re.sub(r"\W+", "", _line)
-        if _sub_line_ == _line_:
-            return _line.strip()
-
-        return ""
-
-    sub_line = ""
-
     try:
-        for _, (offset, sub) in enumerate(zip(sub_maker.offset, sub_maker.subs)):
-            _start_time, end_time = offset
-            if start_time < 0:
-                start_time = _start_time
-
-            sub = unescape(sub)
-            sub_line += sub
-            sub_text = match_line(sub_line, sub_index)
-            if sub_text:
-                sub_index += 1
-                line = formatter(
-                    idx=sub_index,
-                    start_time=start_time,
-                    end_time=end_time,
-                    sub_text=sub_text,
-                )
-                sub_items.append(line)
-                start_time = -1.0
-                sub_line = ""
-        if len(sub_items) == len(script_lines):
-            with open(subtitle_file, "w", encoding="utf-8") as file:
-                file.write("\n".join(sub_items) + "\n")
-            try:
-                sbs = subtitles.file_to_subtitles(subtitle_file, encoding="utf-8")
-                duration = max([tb for ((ta, tb), txt) in sbs])
-                logger.info(
-                    f"completed, subtitle file created: {subtitle_file}, duration: {duration}"
-                )
-            except Exception as e:
-                logger.error(f"failed, error: {str(e)}")
-                os.remove(subtitle_file)
-        else:
-            logger.error(
-                f"failed, sub_items len: {len(sub_items)}, script_lines len: {len(script_lines)}"
-            )
-
+        # offset 的单位是 100 纳秒
+        words = [
+            (start / 10000000, end / 10000000, unescape(sub))
+            for (start, end), sub in zip(sub_maker.offset, sub_maker.subs)
+        ]
+        cues = align_words(script_lines, words)
+        if not cues:
+            logger.error(f"failed, no cues aligned, script_lines len: {len(script_lines)}")
+            return None
+        if len(cues) != len(script_lines):
+            logger.warning(f"merged unaligned lines, cues len: {len(cues)}, script_lines len: {len(script_lines)}")
+        cues.write_srt(subtitle_file)
+        logger.info(
+            f"completed, subtitle file created: {subtitle_file}, duration: {cues.duration}"
+        )
+        return cues
     except Exception as e:
         logger.error(f"failed, error: {str(e)}")
+    return None
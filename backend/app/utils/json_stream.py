@@ -0,0 +1,69 @@
+import json
+from typing import Any, List
+
+
+class JSONArrayStreamParser:
+    """增量解析 {"<key>": [{...}, {...}]} 形式的 JSON
+
+    流式接口每次返回一小段文本，feed 追加文本并返回这次新解析完成的数组元素，
+    每个元素在它的右括号到达时立即返回，不需要等整个 JSON 结束。
+    只跟踪字符串和括号层级，不校验整体结构，最终结果仍应以完整文本的 json.loads 为准。
+    """
+
+    def __init__(self, key: str = "list"):
+        self.key = key
+        self.buffer = ""
+        # 数组开始之后才解析元素，-1 表示还没有找到数组
+        self._array_start = -1
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._item_start = -1
+        self._done = False
+
+    def _find_array(self) -> bool:
+        key_pos = self.buffer.find(f'"{self.key}"')
+        if key_pos < 0:
+            return False
+        bracket = self.buffer.find("[", key_pos)
+        if bracket < 0:
+            return False
+        self._array_start = bracket
+        self._pos = bracket + 1
+        return True
+
+    def feed(self, chunk: str) -> List[Any]:
+        """追加一段文本，返回新完成的数组元素"""
+        self.buffer += chunk
+        if self._done or (self._array_start < 0 and not self._find_array()):
+            return []
+        items = []
+        buffer = self.buffer
+        while self._pos < len(buffer):
+            char = buffer[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if self._depth == 0:
+                    self._item_start = self._pos
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == 0:
+                    # 数组结束
+                    self._done = True
+                    self._pos += 1
+                    break
+                self._depth -= 1
+                if self._depth == 0:
+                    items.append(json.loads(buffer[self._item_start:self._pos + 1]))
+                    self._item_start = -1
+            self._pos += 1
+        return items
@@ -0,0 +1,58 @@
+from typing import Iterator, Tuple
+
+# MPEG 版本位 -> 版本，0b01 为保留值
+_VERSIONS = {0b00: 2.5, 0b10: 2, 0b11: 1}
+# (版本 1 / 2、2.5, layer) -> 比特率表（kbps），下标为比特率索引
+_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 2.5: [11025, 12000, 8000]}
+
+
+def _parse_header(header: bytes) -> Tuple[int, int]:
+    """解析 4 字节帧头，返回 (帧长度, 帧时长)，不是合法帧头时返回 (0, 0)"""
+    if header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return 0, 0
+    version = _VERSIONS.get((header[1] >> 3) & 0b11)
+    layer = 4 - ((header[1] >> 1) & 0b11)
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0b11
+    if version is None or layer == 4 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return 0, 0
+    bitrate = _BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][sample_rate_index]
+    padding = (header[2] >> 1) & 0b1
+    if layer == 1:
+        return (12 * bitrate // sample_rate + padding) * 4, 384 * 10000000 // sample_rate
+    samples = 1152 if layer == 2 or version == 1 else 576
+    return samples // 8 * bitrate // sample_rate + padding, samples * 10000000 // sample_rate
+
+
+def iter_frames(data: bytes) -> Iterator[Tuple[int, int, int]]:
+    """遍历 MP3 数据中的帧
+
+    跳过开头的 ID3 标签、Xing/Info 信息帧和帧之间无法识别的字节。
+
+    Yields:
+        Tuple[int, int, int]: (字节偏移, 帧长度, 帧时长)，时长单位为 100 纳秒，与 edge-tts 的 offset 一致
+    """
+    pos = 0
+    if data[:3] == b"ID3" and len(data) >= 10:
+        pos = 10 + ((data[6] & 0x7F) << 21 | (data[7] & 0x7F) << 14 | (data[8] & 0x7F) << 7 | (data[9] & 0x7F))
+    first = True
+    while pos + 4 <= len(data):
+        length, duration = _parse_header(data[pos:pos + 4])
+        if not length:
+            pos += 1
+            continue
+        # 信息帧记录的是整个文件的帧数和长度，切分后不再准确，不计入音频
+        is_info = first and (b"Xing" in data[pos:pos + 64] or b"Info" in data[pos:pos + 64])
+        first = False
+        if not is_info:
+            yield pos, length, duration
+        pos += length
@@ -0,0 +1,113 @@
+import re
+from typing import Iterable, Iterator, List, Pattern, Tuple
+
+from app.models import const
+
+# 两个数字之间的这些符号是数字的一部分（2.5、10,000、10:30），不断句
+_NUMERIC_SEPARATORS = ".,:"
+# 紧跟在标点之后的右引号、右括号归入前一段
+_CLOSERS = "[”’」』）)》\"']*"
+# 至少包含一个文字字符的片段才有内容
+_WORD = re.compile(r"\w")
+
+
+def _delimiter_pattern(punctuations: Iterable[str]) -> Pattern:
+    """把标点列表编译成一个分隔符正则
+
+    多字符标点（如 "..."）优先匹配，连续的标点和其后的右引号合并成一个分隔符，换行单独作为分隔符。
+    """
+    punctuations = set(punctuations)
+    multi = sorted((p for p in punctuations if len(p) > 1), key=len, reverse=True)
+    parts = [re.escape(p) for p in multi]
+    singles = []
+    for char in sorted(p for p in punctuations if len(p) == 1):
+        if char in _NUMERIC_SEPARATORS:
+            parts.append(rf"(?<!\d){re.escape(char)}|{re.escape(char)}(?!\d)")
+        else:
+            singles.append(re.escape(char))
+    if singles:
+        parts.append("[" + "".join(singles) + "]")
+    return re.compile(r"\n|(?:" + "|".join(parts) + ")+" + _CLOSERS)
+
+
+_CLAUSE_DELIMITER = _delimiter_pattern(const.PUNCTUATIONS)
+_SENTENCE_DELIMITER = _delimiter_pattern(const.SENTENCE_PUNCTUATIONS)
+
+
+def _pattern(sentences: bool) -> Pattern:
+    return _SENTENCE_DELIMITER if sentences else _CLAUSE_DELIMITER
+
+
+def iter_spans(text: str, sentences: bool = False) -> Iterator[Tuple[int, int, int]]:
+    """遍历文本的切分位置
+
+    Args:
+        text: 文本
+        sentences: True 时只在句末标点处切分，否则在所有标点处切分
+
+    Yields:
+        Tuple[int, int, int]: (片段开始, 片段内容结束即分隔符开始, 分隔符结束)，
+        所有片段首尾相接覆盖整个文本
+    """
+    start = 0
+    for match in _pattern(sentences).finditer(text):
+        yield start, match.start(), match.end()
+        start = match.end()
+    if start < len(text):
+        yield start, len(text), len(text)
+
+
+def _pick(text: str, start: int, content_end: int, end: int, sentences: bool) -> str:
+    """按切分方式取出片段，没有文字内容时返回空串"""
+    if not _WORD.search(text, start, content_end):
+        return ""
+    return text[start:end if sentences else content_end].strip()
+
+
+def split_clauses(text: str) -> List[str]:
+    """在所有标点和换行处切分，去掉标点，用于字幕分行
+
+    小数、千分位和时间中的 . , : 不切分，"..." 和连续的标点只切一次，只有标点的片段被丢弃。
+    """
+    return [segment.strip() for segment in _CLAUSE_DELIMITER.split(text) if _WORD.search(segment)]
+
+
+def split_sentences(text: str) -> List[str]:
+    """在句末标点和换行处切分，保留句末标点"""
+    return [segment for segment in (_pick(text, *span, True) for span in iter_spans(text, True)) if segment]
+
+
+def contains_punctuation(text: str) -> bool:
+    """文本中是否有断句用的标点"""
+    return any(match.group() != "\n" for match in _CLAUSE_DELIMITER.finditer(text))
+
+
+class SegmentStream:
+    """增量切分，文本分多次到达时（如 LLM 流式输出）逐段返回完整的片段
+
+    分隔符出现在缓冲区末尾时可能还没结束（"..." 只到了一个点、"2." 后面可能是小数），
+    这样的片段等下一段文本到达或 close 时再返回，结果与一次性切分完整文本相同。
+    """
+
+    def __init__(self, sentences: bool = False):
+        self.sentences = sentences
+        self.buffer = ""
+
+    def feed(self, chunk: str) -> List[str]:
+        """追加一段文本，返回新完成的片段"""
+        self.buffer += chunk
+        buffer = self.buffer
+        segments = []
+        start = 0
+        for match in _pattern(self.sentences).finditer(buffer):
+            if match.end() == len(buffer):
+                break
+            segments.append(_pick(buffer, start, match.start(), match.end(), self.sentences))
+            start = match.end()
+        self.buffer = buffer[start:]
+        return [segment for segment in segments if segment]
+
+    def close(self) -> List[str]:
+        """文本结束，返回剩余的片段"""
+        buffer, self.buffer = self.buffer, ""
+        return split_sentences(buffer) if self.sentences else split_clauses(buffer)
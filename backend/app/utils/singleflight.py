@@ -0,0 +1,72 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """进程内的 single-flight：相同 key 的并发调用共享同一个进行中的请求
+
+    第一个调用者启动请求，请求完成前到达的相同 key 的调用直接等待同一个结果（或异常），
+    请求完成后 key 立即释放，之后的调用重新发起请求（通常会先命中缓存）。
+    请求在独立的 asyncio.Task 中执行，某个调用者被取消或超时不会影响其它等待者。
+    多个调用者拿到的是同一个结果对象，可变的结果应由调用方自行复制。
+
+    无法包成一个协程的请求（例如边接收边处理的流式输出）用 begin 登记，由调用方设置结果；
+    其它调用者用 join 合并进去。
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.calls = 0
+        # 实际发起的请求数和合并到进行中请求的调用数
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, func: Callable[[], Awaitable[T]]) -> T:
+        shared = self.join(key)
+        if shared is not None:
+            return await shared
+        self.calls += 1
+        self.executed += 1
+        task = asyncio.ensure_future(func())
+        self._register(key, task)
+        return await asyncio.shield(task)
+
+    def join(self, key: str) -> Optional[Awaitable[Any]]:
+        """key 有进行中的请求时合并进去，返回等待其结果的 awaitable，否则返回 None"""
+        future = self._inflight.get(key)
+        if future is None:
+            return None
+        self.calls += 1
+        self.coalesced += 1
+        return asyncio.shield(future)
+
+    def begin(self, key: str) -> asyncio.Future:
+        """登记一个由调用方自己执行的请求，调用方完成后必须对返回的 Future 设置结果或异常"""
+        self.calls += 1
+        self.executed += 1
+        future = asyncio.get_running_loop().create_future()
+        self._register(key, future)
+        return future
+
+    def _register(self, key: str, future: asyncio.Future):
+        self._inflight[key] = future
+        future.add_done_callback(lambda done: self._finish(key, done))
+
+    def _finish(self, key: str, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 所有调用者都已取消时，异常没有人读取，这里读取一次避免 asyncio 的告警
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "calls": self.calls,
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+        }
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator
+
+# 任务目录布局：tasks/<分片>/<任务ID>/，分片为任务ID哈希的前两位十六进制，最多 256 个子目录
+# 旧版本的任务直接放在 tasks/<任务ID>/ 下，仍然可以读取
+SHARD_WIDTH = 2
+_SHARD = re.compile(rf"^[0-9a-f]{{{SHARD_WIDTH}}}$")
+# 任务ID会出现在路径和 URL 中，只允许字母、数字、下划线和连字符
+_TASK_ID = re.compile(r"^[0-9A-Za-z_-]{1,64}$")
+# ULID 使用的 Crockford Base32 字母表
+_CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_RANDOM_BITS = 80
+
+_lock = threading.Lock()
+_last_ms = 0
+_last_random = 0
+
+
+def new_task_id() -> str:
+    """生成 ULID 格式的任务ID：48 位毫秒时间戳 + 80 位随机数，共 26 个字符
+
+    按字符串排序即按创建时间排序；同一毫秒内生成的ID在上一个的随机部分上加一，保证单调递增且不重复。
+    """
+    global _last_ms, _last_random
+    with _lock:
+        ms = int(time.time() * 1000)
+        if ms <= _last_ms:
+            ms = _last_ms
+            random_part = _last_random + 1
+            if random_part >> _RANDOM_BITS:
+                # 随机部分溢出，借用下一毫秒
+                ms += 1
+                random_part = int.from_bytes(os.urandom(_RANDOM_BITS // 8), "big")
+        else:
+            random_part = int.from_bytes(os.urandom(_RANDOM_BITS // 8), "big")
+        _last_ms, _last_random = ms, random_part
+    value = (ms << _RANDOM_BITS) | random_part
+    return "".join(_CROCKFORD[(value >> shift) & 31] for shift in range(125, -1, -5))
+
+
+def is_valid_id(task_id: str) -> bool:
+    return bool(task_id) and _TASK_ID.match(task_id) is not None
+
+
+def shard_of(task_id: str) -> str:
+    """任务ID所在的分片目录名，按哈希分散，避免同一时间段创建的任务集中在一个目录"""
+    return hashlib.sha1(task_id.encode("utf-8")).hexdigest()[:SHARD_WIDTH]
+
+
+def task_relpath(root: str, task_id: str) -> str:
+    """任务目录相对于 tasks 根目录的路径，以 / 分隔，也用于拼接访问地址
+
+    旧版本创建的平铺目录存在时沿用旧位置，否则使用分片目录。
+    """
+    if not is_valid_id(task_id):
+        raise ValueError(f"Invalid task id: {task_id}")
+    shard = shard_of(task_id)
+    if not os.path.isdir(os.path.join(root, shard, task_id)) and os.path.isdir(os.path.join(root, task_id)):
+        return task_id
+    return f"{shard}/{task_id}"
+
+
+def iter_task_ids(root: str) -> Iterator[str]:
+    """遍历 tasks 根目录下的所有任务ID，包括分片目录和旧版本的平铺目录"""
+    if not os.path.isdir(root):
+        return
+    for entry in os.scandir(root):
+        if not entry.is_dir():
+            continue
+        if _SHARD.match(entry.name):
+            for task_entry in os.scandir(entry.path):
+                if task_entry.is_dir() and shard_of(task_entry.name) == entry.name:
+                    yield task_entry.name
+        elif is_valid_id(entry.name):
+            yield entry.name
+
+
+def extract_id(path: str) -> str:
+    """从任务目录下的文件路径或访问地址中提取任务ID，兼容分片目录、旧版本的平铺目录、Windows 和 Linux 路径"""
+    parts = Path(path.replace("\\", "/")).parts
+    try:
+        index = parts.index("tasks")
+        first = parts[index + 1]
+    except (ValueError, IndexError):
+        raise ValueError(f"Invalid path format: {path}")
+    if len(parts) > index + 2 and _SHARD.match(first) and shard_of(parts[index + 2]) == first:
+        return parts[index + 2]
+    return first
+
+
+@contextmanager
+def atomic_open(path: str, mode: str = "w", **kwargs):
+    """先写同目录下的临时文件，成功后再替换目标文件
+
+    其它请求或重启后的恢复流程只会看到完整的旧文件或新文件，不会读到写了一半的内容；
+    写入过程中出错时删除临时文件，目标文件保持不变。
+    """
+    if "b" not in mode:
+        kwargs.setdefault("encoding", "utf-8")
+    tmp_path = f"{path}.{uuid.uuid4().hex}.part"
+    try:
+        with open(tmp_path, mode, **kwargs) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_json(path: str, data: Any):
+    """原子地写入 JSON 文件"""
+    with atomic_open(path, "w") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
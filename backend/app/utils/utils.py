@@ -8,11 +8,10 @@ import threading
 import urllib3
 from typing import Any, List
 from uuid import uuid4
-from pathlib import Path
 
 from loguru import logger
 
-from app.models import const
+from app.utils import segment, task_store
 
 urllib3.disable_warnings()
 
@@ -34,26 +33,37 @@ def resource_dir(sub_dir: str = ""):
         d = os.path.join(d, sub_dir)
     return d
 
-def task_dir(sub_dir: str = "") -> str:
+def task_dir(task_id: str = "", create: bool = True) -> str:
     """获取任务目录路径
     Args:
-        sub_dir (str, optional): 子目录名. Defaults to "".
+        task_id (str, optional): 任务ID，为空时返回 tasks 根目录. Defaults to "".
+        create (bool, optional): 目录不存在时是否创建. Defaults to True.
     Returns:
-        str: 任务目录的绝对路径
+        str: 任务目录的绝对路径，任务按ID的哈希分片存放在 tasks/<分片>/<任务ID>/
     """
     # 获取 backend 目录
     root_dir = get_root_dir()
     # 任务目录
     d = os.path.join(root_dir, "tasks")
-    if sub_dir:
-        d = os.path.join(d, sub_dir)
+    if task_id:
+        d = os.path.join(d, task_store.task_relpath(d, task_id))
     
     # 确保目录存在
-    os.makedirs(d, exist_ok=True)
+    if create:
+        os.makedirs(d, exist_ok=True)
     
     return d
 
 
+def cache_dir(sub_dir: str = "") -> str:
+    """获取缓存目录路径，不存在时自动创建"""
+    d = os.path.join(get_root_dir(), "cache")
+    if sub_dir:
+        d = os.path.join(d, sub_dir)
+    os.makedirs(d, exist_ok=True)
+    return d
+
+
 def font_dir(sub_dir: str = ""):
     d = resource_dir("fonts")
     if sub_dir:
@@ -118,81 +128,17 @@ def text_to_srt(idx: int, msg: str, start_time: float, end_time: float) -> str:
 
 
 def str_contains_punctuation(word):
-    for p in const.PUNCTUATIONS:
-        if p in word:
-            return True
-    return False
+    return segment.contains_punctuation(word)
 
 
 def split_string_by_punctuations(s):
-    result = []
-    txt = ""
-
-    previous_char = ""
-    next_char = ""
-    for i in range(len(s)):
-        char = s[i]
-        if char == "\n":
-            result.append(txt.strip())
-            txt = ""
-            continue
-
-        if i > 0:
-            previous_char = s[i - 1]
-        if i < len(s) - 1:
-            next_char = s[i + 1]
-
-        if char == "." and previous_char.isdigit() and next_char.isdigit():
-            # # In the case of "withdraw 10,000, charged at 2.5% fee", the dot in "2.5" should not be treated as a line break marker
-            txt += char
-            continue
-
-        if char not in const.PUNCTUATIONS:
-            txt += char
-        else:
-            result.append(txt.strip())
-            txt = ""
-    result.append(txt.strip())
-    # filter empty string
-    result = list(filter(None, result))
-    return result
+    """按所有标点切分，见 segment.split_clauses"""
+    return segment.split_clauses(s)
 
 
 def split_string_by_punctuations_new(text: str) -> List[str]:
-    """按标点符号分割文本"""
-    result = []
-    txt = ""
-
-    previous_char = ""
-    next_char = ""
-    for i in range(len(text)):
-        char = text[i]
-        if char == "\n":
-            if txt.strip():
-                result.append(txt.strip())
-            txt = ""
-            continue
-
-        if i > 0:
-            previous_char = text[i - 1]
-        if i < len(text) - 1:
-            next_char = text[i + 1]
-
-        if char == "." and previous_char.isdigit() and next_char.isdigit():
-            txt += char
-            continue
-
-        if char not in [".", "。", "！", "？", "...", "…"]:
-            txt += char
-        else:
-            txt += char
-            if txt.strip():
-                result.append(txt.strip())
-            txt = ""
-
-    if txt.strip():
-        result.append(txt.strip())
-    return result
+    """按句末标点切分并保留标点，见 segment.split_sentences"""
+    return segment.split_sentences(text)
 
 
 def random_str(length: int = 8) -> str:
@@ -234,15 +180,7 @@ def parse_extension(filename):
 
 def extract_id(video_file: str) -> str:
     """
-    从路径中提取 ID（tasks 目录下的第一级子目录名）
+    从路径中提取任务ID（tasks 目录下的任务目录名），见 task_store.extract_id
     兼容 Windows 和 Linux
     """
-    path = Path(video_file)
-
-    # 遍历路径的所有部分，查找 "tasks" 目录
-    try:
-        parts = path.parts
-        index = parts.index("tasks")  # 找到 "tasks" 目录的位置
-        return parts[index + 1]  # 返回紧跟其后的部分作为 ID
-    except (ValueError, IndexError):
-        raise ValueError(f"Invalid path format: {video_file}")
+    return task_store.extract_id(video_file)
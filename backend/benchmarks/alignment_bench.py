@@ -0,0 +1,143 @@
+"""比较逐词正则匹配（原 create_subtitle）和线性对齐的耗时
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.alignment_bench --sentences 50,200,800 --words-per-line 30
+"""
+import argparse
+import re
+import time
+
+from app.services.alignment import align_words
+from app.utils.segment import split_clauses
+
+
+def legacy_align(lines, words):
+    """原 create_subtitle 中的 match_line 逻辑，每个词之后对整行重跑三次正则"""
+
+    def match_line(_sub_line, _sub_index):
+        if len(lines) <= _sub_index:
+            return ""
+        _line = lines[_sub_index]
+        if _sub_line == _line:
+            return lines[_sub_index].strip()
+        _sub_line_ = re.sub(r"[^\w\s]", "", _sub_line)
+        _line_ = re.sub(r"[^\w\s]", "", _line)
+        if _sub_line_ == _line_:
+            return _line_.strip()
+        _sub_line_ = re.sub(r"\W+", "", _sub_line)
+        _line_ = re.sub(r"\W+", "", _line)
+        if _sub_line_ == _line_:
+            return _line.strip()
+        return ""
+
+    items = []
+    start_time = -1.0
+    sub_line = ""
+    for start, end, word in words:
+        if start_time < 0:
+            start_time = start
+        sub_line += word
+        sub_text = match_line(sub_line, len(items))
+        if sub_text:
+            items.append(((start_time, end), sub_text))
+            start_time = -1.0
+            sub_line = ""
+    # 行数对不上时原实现丢弃整个字幕
+    return items if len(items) == len(lines) else []
+
+
+DIGIT_WORDS = "零一二三四五六七八九"
+# 英文数字读成单词的例子：(脚本各行, TTS 读出的词，每词一秒, 每行期望的 (开始, 结束))
+NUMBER_CASES = [
+    (
+        ["In 1999 we moved", "to a new house", "near the river", "and stayed there"],
+        "In nineteen ninety nine we moved to a new house near the river and stayed there",
+        [(0, 6), (6, 10), (10, 13), (13, 16)],
+    ),
+    (
+        ["It costs 25 dollars", "and that is fine"],
+        "It costs twenty five dollars and that is fine",
+        [(0, 5), (5, 9)],
+    ),
+]
+
+
+def read_number(n: int) -> list:
+    """两位以内的数字按中文读法切成词，例如 25 -> ["二十", "五"]，12 -> ["十二"]"""
+    if n < 10:
+        return [DIGIT_WORDS[n]]
+    tens = ("" if n < 20 else DIGIT_WORDS[n // 10]) + "十"
+    if n < 20:
+        return [tens + (DIGIT_WORDS[n % 10] if n % 10 else "")]
+    return [tens] + ([DIGIT_WORDS[n % 10]] if n % 10 else [])
+
+
+def make_script(sentences: int, words_per_line: int, mismatch: bool):
+    """生成脚本、模拟的 TTS 词边界和每行期望的字幕时间
+
+    每行中间有一个数字，mismatch 时数字按中文读法读成文字，与脚本对不上，字数也不同。
+    """
+    lines = []
+    words = []
+    expected = []
+    t = 0.0
+    for n in range(sentences):
+        line_words = [f"词{n % 10}{k % 10}" for k in range(words_per_line - 1)]
+        line_words.insert(len(line_words) // 2, f"{n % 100}")
+        lines.append("".join(line_words) + "。")
+        line_start = t
+        for word in line_words:
+            spoken = read_number(int(word)) if mismatch and word.isdigit() else [word]
+            for item in spoken:
+                words.append((t, t + 0.2, item))
+                t += 0.25
+        expected.append((line_start, t - 0.05))
+    return "".join(lines), words, expected
+
+
+def timing_errors(cues, expected, tolerance: float = 1e-6) -> int:
+    """开始或结束时间与期望不一致的字幕条数，条数不同时全部算错"""
+    if len(cues) != len(expected):
+        return max(len(cues), len(expected))
+    return sum(
+        abs(start - expected_start) > tolerance or abs(end - expected_end) > tolerance
+        for ((start, end), _), (expected_start, expected_end) in zip(cues, expected)
+    )
+
+
+def measure(func, lines, words, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(lines, words)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sentences", default="50,200,800")
+    parser.add_argument("--words-per-line", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for sentences in (int(value) for value in args.sentences.split(",")):
+        text, words, _ = make_script(sentences, args.words_per_line, mismatch=False)
+        lines = split_clauses(text)
+        legacy = measure(legacy_align, lines, words, args.repeat)
+        linear = measure(align_words, lines, words, args.repeat)
+        print(f"{len(text):7d} chars {len(words):6d} words  legacy {legacy:9.2f} ms  linear {linear:8.2f} ms  {legacy / linear:6.1f}x")
+
+    # 检查每条字幕的开始和结束时间；数字读成文字时原实现丢弃全部字幕，线性对齐的时间不应受影响
+    for mismatch in (False, True):
+        text, words, expected = make_script(20, args.words_per_line, mismatch=mismatch)
+        lines = split_clauses(text)
+        legacy_cues = legacy_align(lines, words)
+        cues = align_words(lines, words)
+        label = "numbers spoken as words" if mismatch else "exact words"
+        print(f"{label}: lines {len(lines)}  legacy cues {len(legacy_cues)}  linear cues {len(cues)}  linear timing errors {timing_errors(list(cues), expected)}")
+    for lines, spoken, expected in NUMBER_CASES:
+        words = [(float(i), float(i + 1), word) for i, word in enumerate(spoken.split())]
+        cues = list(align_words(lines, words))
+        print(f"{lines[0]!r}: timing errors {timing_errors(cues, expected)}  cues {[cue_time for cue_time, _ in cues]}")
+
+if __name__ == "__main__":
+    main()
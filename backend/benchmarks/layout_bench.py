@@ -0,0 +1,100 @@
+"""比较原 wrap_text（每加一个词或字就对整行重新测量）和 layout_text（逐字缓存字宽）的换行耗时
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.layout_bench --font /path/to/font.ttf --chars 50,200,1000
+"""
+import argparse
+import time
+
+from PIL import ImageFont
+
+from app.services.text_layout import get_metrics, layout_text
+
+
+def legacy_wrap_text(text, max_width, font="Arial", fontsize=60):
+    """原 wrap_text：每次调用加载字体，先按空格换行，有单词超宽时整段退回逐字换行"""
+    font = ImageFont.truetype(font, fontsize)
+
+    def get_text_size(inner_text):
+        inner_text = inner_text.strip()
+        left, top, right, bottom = font.getbbox(inner_text)
+        return right - left, bottom - top
+
+    width, height = get_text_size(text)
+    if width <= max_width:
+        return text, height
+
+    processed = True
+    _wrapped_lines_ = []
+    words = text.split(" ")
+    _txt_ = ""
+    for word in words:
+        _before = _txt_
+        _txt_ += f"{word} "
+        _width, _height = get_text_size(_txt_)
+        if _width <= max_width:
+            continue
+        else:
+            if _txt_.strip() == word.strip():
+                processed = False
+                break
+            _wrapped_lines_.append(_before)
+            _txt_ = f"{word} "
+    _wrapped_lines_.append(_txt_)
+    if processed:
+        _wrapped_lines_ = [line.strip() for line in _wrapped_lines_]
+        result = "\n".join(_wrapped_lines_).strip()
+        height = len(_wrapped_lines_) * height
+        return result, height
+
+    _wrapped_lines_ = []
+    chars = list(text)
+    _txt_ = ""
+    for word in chars:
+        _txt_ += word
+        _width, _height = get_text_size(_txt_)
+        if _width <= max_width:
+            continue
+        else:
+            _wrapped_lines_.append(_txt_)
+            _txt_ = ""
+    _wrapped_lines_.append(_txt_)
+    result = "\n".join(_wrapped_lines_).strip()
+    height = len(_wrapped_lines_) * height
+    return result, height
+
+
+def make_text(chars: int, cjk: bool) -> str:
+    sample = "小和尚问师父，今天山下的河水为什么这么急？" if cjk else "The little monk asked why the river ran so fast today. "
+    return (sample * (chars // len(sample) + 1))[:chars]
+
+
+def measure(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--font", required=True, help="字幕字体文件")
+    parser.add_argument("--font-size", type=int, default=60)
+    parser.add_argument("--chars", default="50,200,1000")
+    parser.add_argument("--width", type=int, default=1024, help="画面宽度")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    max_width = args.width * 0.9
+    get_metrics(args.font, args.font_size)
+    for cjk in (False, True):
+        for chars in (int(value) for value in args.chars.split(",")):
+            text = make_text(chars, cjk)
+            legacy = measure(lambda: legacy_wrap_text(text, max_width, args.font, args.font_size), args.repeat)
+            layout = measure(lambda: layout_text(text, args.font, args.font_size, max_width), args.repeat)
+            lines = len(layout_text(text, args.font, args.font_size, max_width).lines)
+            print(f"{'cjk  ' if cjk else 'latin'} {chars:5d} chars {lines:3d} lines  legacy {legacy:8.2f} ms  layout {layout:6.3f} ms  {legacy / layout:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
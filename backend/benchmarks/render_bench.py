@@ -0,0 +1,75 @@
+"""比较 moviepy 和 ffmpeg 两种渲染引擎、完整质量和预览的耗时
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.render_bench --font /path/to/font.ttf --scenes 3 --seconds 6 --qualities full,preview
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from PIL import Image
+
+from app.config import settings
+from app.schemas.video import StoryScene
+from app.services.render import get_ffmpeg, get_profile
+from app.services.video import create_video_with_scenes
+from app.utils import utils
+
+
+def prepare_task(task_dir: str, scenes: int, seconds: float, size: int):
+    """生成测试用的图片、语音和字幕"""
+    for i in range(1, scenes + 1):
+        image = Image.new("RGB", (size, size))
+        pixels = image.load()
+        for x in range(size):
+            for y in range(0, size, 8):
+                pixels[x, y] = (x * 255 // size, y * 255 // size, (i * 60) % 255)
+        image.save(os.path.join(task_dir, f"{i}.png"))
+        subprocess.run(
+            [get_ffmpeg(), "-y", "-loglevel", "error", "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+             os.path.join(task_dir, f"{i}.mp3")],
+            check=True,
+        )
+        cue = seconds / 3
+        with open(os.path.join(task_dir, f"{i}.srt"), "w", encoding="utf-8") as f:
+            for n in range(3):
+                f.write(utils.text_to_srt(n + 1, f"Scene {i} subtitle line {n + 1}, long enough to wrap across the frame", n * cue, (n + 1) * cue))
+                f.write("\n")
+
+
+async def run(engine: str, quality: str, task_dir: str, scenes: int) -> float:
+    story_scenes = [StoryScene(text="", image_prompt="") for _ in range(scenes)]
+    start = time.perf_counter()
+    await create_video_with_scenes(task_dir, story_scenes, "", 0, test_mode=True, render_engine=engine, quality=quality)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--font", required=True, help="字幕字体文件")
+    parser.add_argument("--scenes", type=int, default=3)
+    parser.add_argument("--seconds", type=float, default=6)
+    parser.add_argument("--size", type=int, default=1024)
+    parser.add_argument("--engines", default="moviepy,ffmpeg")
+    parser.add_argument("--qualities", default="full,preview")
+    args = parser.parse_args()
+
+    settings.subtitle_font_path = args.font
+    task_dir = tempfile.mkdtemp(prefix="render_bench_")
+    try:
+        prepare_task(task_dir, args.scenes, args.seconds, args.size)
+        for engine in args.engines.split(","):
+            for quality in args.qualities.split(","):
+                elapsed = asyncio.run(run(engine, quality, task_dir, args.scenes))
+                size = os.path.getsize(os.path.join(task_dir, get_profile(quality).output))
+                print(f"{engine:8s} {quality:8s} {elapsed:8.2f}s  {size / 1024:8.0f} KiB  ({args.scenes} scenes x {args.seconds}s)")
+    finally:
+        shutil.rmtree(task_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
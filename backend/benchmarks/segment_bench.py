@@ -0,0 +1,169 @@
+"""比较原来三份逐字符断句和 segment 模块的耗时
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.segment_bench --chars 1000,10000,100000 --repeat 20
+"""
+import argparse
+import random
+import re
+import time
+
+from app.models import const
+from app.utils.segment import SegmentStream, split_clauses, split_sentences
+
+
+def legacy_utils_split(s):
+    """原 utils.split_string_by_punctuations"""
+    result = []
+    txt = ""
+    previous_char = ""
+    next_char = ""
+    for i in range(len(s)):
+        char = s[i]
+        if char == "\n":
+            result.append(txt.strip())
+            txt = ""
+            continue
+        if i > 0:
+            previous_char = s[i - 1]
+        if i < len(s) - 1:
+            next_char = s[i + 1]
+        if char == "." and previous_char.isdigit() and next_char.isdigit():
+            txt += char
+            continue
+        if char not in const.PUNCTUATIONS:
+            txt += char
+        else:
+            result.append(txt.strip())
+            txt = ""
+    result.append(txt.strip())
+    return list(filter(None, result))
+
+
+def legacy_voice_split(s):
+    """原 voice.split_string_by_punctuations，额外用正则过滤只有标点的片段"""
+    result = []
+    txt = ""
+    previous_char = ""
+    next_char = ""
+    for i in range(len(s)):
+        char = s[i]
+        if char == "\n":
+            if txt.strip():
+                result.append(txt.strip())
+            txt = ""
+            continue
+        if i > 0:
+            previous_char = s[i - 1]
+        if i < len(s) - 1:
+            next_char = s[i + 1]
+        if char == "." and previous_char.isdigit() and next_char.isdigit():
+            txt += char
+            continue
+        if char not in const.PUNCTUATIONS:
+            txt += char
+        else:
+            if txt.strip():
+                result.append(txt.strip())
+            txt = ""
+    if txt.strip():
+        result.append(txt.strip())
+    return [segment for segment in result if re.sub(r"[^\w\s]", "", segment).strip()]
+
+
+def legacy_utils_split_new(text):
+    """原 utils.split_string_by_punctuations_new"""
+    result = []
+    txt = ""
+    previous_char = ""
+    next_char = ""
+    for i in range(len(text)):
+        char = text[i]
+        if char == "\n":
+            if txt.strip():
+                result.append(txt.strip())
+            txt = ""
+            continue
+        if i > 0:
+            previous_char = text[i - 1]
+        if i < len(text) - 1:
+            next_char = text[i + 1]
+        if char == "." and previous_char.isdigit() and next_char.isdigit():
+            txt += char
+            continue
+        if char not in [".", "。", "！", "？", "...", "…"]:
+            txt += char
+        else:
+            txt += char
+            if txt.strip():
+                result.append(txt.strip())
+            txt = ""
+    if txt.strip():
+        result.append(txt.strip())
+    return result
+
+
+def stream_split(text, chunk_size=16):
+    """模拟流式输出，每次 chunk_size 个字符"""
+    stream = SegmentStream()
+    segments = []
+    for i in range(0, len(text), chunk_size):
+        segments += stream.feed(text[i:i + chunk_size])
+    return segments + stream.close()
+
+
+SAMPLES = [
+    "从前有一座山，山里有一座庙。",
+    "小和尚问：“师父，今天吃什么？”",
+    "价格涨了2.5%，一共10,000元！",
+    "He waited... and waited, until 10:30.",
+    "天黑了……\n",
+    "Why? Because the river was wide; the boat was small.",
+]
+
+
+def make_text(chars: int) -> str:
+    random.seed(chars)
+    parts = []
+    length = 0
+    while length < chars:
+        sample = random.choice(SAMPLES)
+        parts.append(sample)
+        length += len(sample)
+    return "".join(parts)
+
+
+def measure(func, text: str, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(text)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chars", default="1000,10000,100000")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    pairs = [
+        ("clauses (utils)", legacy_utils_split, split_clauses),
+        ("clauses (voice)", legacy_voice_split, split_clauses),
+        ("sentences", legacy_utils_split_new, split_sentences),
+        ("clauses stream", legacy_voice_split, stream_split),
+    ]
+    for chars in (int(value) for value in args.chars.split(",")):
+        text = make_text(chars)
+        for name, legacy, new in pairs:
+            before = measure(legacy, text, args.repeat)
+            after = measure(new, text, args.repeat)
+            print(f"{len(text):7d} chars  {name:16s} legacy {before:8.2f} ms  new {after:7.2f} ms  {before / after:5.1f}x")
+
+    # 旧实现逐字符判断，"..." 永远匹配不到，数字中的逗号和冒号也会被切开
+    sample = "He waited... and waited, until 10:30. 一共10,000元。"
+    print(f"legacy: {legacy_voice_split(sample)}")
+    print(f"new:    {split_clauses(sample)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""比较逐条创建 TextClip 和缓存字幕位图的单条字幕耗时
+
+用法（在 backend 目录下执行）:
+    python -m benchmarks.subtitle_bench --font /path/to/font.ttf --cues 200
+"""
+import argparse
+import time
+
+import numpy as np
+from moviepy import ImageClip, TextClip
+
+from app.services.subtitle import (
+    SUBTITLE_COLOR,
+    SUBTITLE_FONT_SIZE,
+    SUBTITLE_STROKE_COLOR,
+    SUBTITLE_STROKE_WIDTH,
+    render_subtitle_sprite,
+)
+from benchmarks.layout_bench import legacy_wrap_text
+
+
+def legacy_clip(text: str, font_path: str, max_width: float):
+    wrapped, _ = legacy_wrap_text(text, max_width, font_path, SUBTITLE_FONT_SIZE)
+    return TextClip(
+        text=wrapped,
+        font=font_path,
+        font_size=SUBTITLE_FONT_SIZE,
+        color=SUBTITLE_COLOR,
+        stroke_color=SUBTITLE_STROKE_COLOR,
+        stroke_width=SUBTITLE_STROKE_WIDTH,
+    )
+
+
+def sprite_clip(text: str, font_path: str, max_width: float):
+    return ImageClip(render_subtitle_sprite(text, font_path, max_width=max_width))
+
+
+def measure(make_clip, cues, font_path: str, max_width: float) -> float:
+    start = time.perf_counter()
+    for text in cues:
+        make_clip(text, font_path, max_width)
+    return (time.perf_counter() - start) / len(cues) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--font", required=True, help="字幕字体文件")
+    parser.add_argument("--cues", type=int, default=200)
+    parser.add_argument("--width", type=int, default=1024, help="画面宽度")
+    args = parser.parse_args()
+
+    max_width = args.width * 0.9
+    cues = [f"Subtitle cue number {n}, long enough to wrap across the frame" for n in range(args.cues)]
+
+    # 两种方式输出的像素应该一致
+    expected = legacy_clip(cues[0], args.font, max_width)
+    actual = sprite_clip(cues[0], args.font, max_width)
+    assert expected.size == actual.size, (expected.size, actual.size)
+    assert np.array_equal(expected.get_frame(0), actual.get_frame(0))
+    assert np.array_equal(expected.mask.get_frame(0), actual.mask.get_frame(0))
+    render_subtitle_sprite.cache_clear()
+
+    legacy = measure(legacy_clip, cues, args.font, max_width)
+    cold = measure(sprite_clip, cues, args.font, max_width)
+    warm = measure(sprite_clip, cues, args.font, max_width)
+    print(f"TextClip            {legacy:8.3f} ms/cue")
+    print(f"sprite (cache miss) {cold:8.3f} ms/cue  {legacy / cold:5.1f}x")
+    print(f"sprite (cache hit)  {warm:8.3f} ms/cue  {legacy / warm:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
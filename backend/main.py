@@ -3,12 +3,17 @@ from fastapi.staticfiles import StaticFiles
 
 from fastapi.middleware.cors import CORSMiddleware
 from app.api import api_router
-import os
 
 from app.database.session import with_session
 from app.database.base import engine
 from app.schemas.user import User
 from app.api.login import user_router
+from app.services.task import task_manager
+from app.services.clients import provider_clients
+from app.services.voice_catalog import voice_catalog
+from app.services.storage_gc import storage_gc
+from app.services import render
+from app.utils import utils
 
 from app.config import settings
 
@@ -29,13 +34,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-if not os.path.exists('tasks'):
-    os.makedirs('tasks')
-
-app.mount("/tasks", StaticFiles(directory=os.path.abspath("tasks")), name="tasks")
+# 与 utils.task_dir 使用同一个目录，任务文件的访问地址为 /tasks/<分片>/<任务ID>/<文件名>
+app.mount("/tasks", StaticFiles(directory=utils.task_dir()), name="tasks")
 # Include API router
 app.include_router(api_router)
 
+@app.on_event("startup")
+async def startup():
+    await task_manager.start()
+    voice_catalog.start()
+    storage_gc.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await task_manager.stop()
+    await voice_catalog.stop()
+    await storage_gc.stop()
+    await provider_clients.aclose()
+    render.shutdown_process_pool()
+
 @app.get("/")
 async def root():
     return {
@@ -32,4 +32,26 @@ interface VideoGenerateRes {
         video_url: string; // 视频 URL
     };
     message: string | null;
+}
+
+interface VideoTask {
+    task_id: string; // 任务ID
+    state: number; // -1 失败, 0 排队中, 1 完成, 4 处理中
+    progress: number; // 整体进度 0-100
+    stages: Record<string, number>; // 各阶段进度
+    timings: Record<string, number>; // 各阶段耗时（秒）
+    video_url: string | null; // 视频 URL，完成后才有
+    preview_url: string | null; // 预览视频 URL，quality 为 preview 时才有
+    message: string | null; // 失败原因
+}
+
+interface VideoTaskEvent {
+    type: string; // snapshot / state / story / images / voice / preview / render / complete / failed
+    data: Record<string, any>; // snapshot、state、complete、failed 为 VideoTask，其余为阶段进度和场景数据
+}
+
+interface VideoTaskRes {
+    success: boolean;
+    data?: VideoTask;
+    message: string | null;
 }
\ No newline at end of file
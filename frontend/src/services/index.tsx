@@ -1,10 +1,12 @@
-import { request } from "../utils/request";
+import { baseUrl, request } from "../utils/request";
 
+// 用 GET 请求语音列表，浏览器可以按 ETag 缓存
 export async function getVoiceList(data: {area: string[]}): Promise<VoiceListRes> {
+    const params = new URLSearchParams();
+    data.area.forEach(area => params.append("area", area));
     return request<VoiceListRes>({
-        url: "/api/voice/voices",
-        method: "post",
-        data,
+        url: `/api/voice/voices?${params.toString()}`,
+        method: "get",
     });
 }
 
@@ -15,10 +17,71 @@ export async function getLLMProviders(): Promise<LLMProvidersRes> {
     });
 }
 
-export async function generateVideo(data: VideoGenerateReq): Promise<VideoGenerateRes> {
-    return request<VideoGenerateRes>({
+export async function getVideoTask(taskId: string): Promise<VideoTaskRes> {
+    return request<VideoTaskRes>({
+        url: `/api/video/tasks/${taskId}`,
+        method: "get",
+    });
+}
+
+const TASK_STATE_FAILED = -1;
+const TASK_STATE_COMPLETE = 1;
+const TASK_POLL_INTERVAL = 3000;
+
+// 通过 SSE 订阅任务事件，返回取消订阅的函数
+export function subscribeVideoTask(taskId: string, onEvent: (event: VideoTaskEvent) => void, onError?: () => void): () => void {
+    const source = new EventSource(`${baseUrl}/api/video/tasks/${taskId}/events`);
+    const types = ["snapshot", "state", "story", "images", "voice", "preview", "render", "complete", "failed"];
+    types.forEach(type => {
+        source.addEventListener(type, e => {
+            const data = JSON.parse((e as MessageEvent).data);
+            // 任务结束后服务端会关闭连接，先关闭避免触发 onerror
+            if (type === "complete" || type === "failed" || data.state === TASK_STATE_COMPLETE || data.state === TASK_STATE_FAILED) {
+                source.close();
+            }
+            onEvent({ type, data });
+        });
+    });
+    source.onerror = () => {
+        source.close();
+        onError?.();
+    };
+    return () => source.close();
+}
+
+async function pollVideoTask(taskId: string): Promise<VideoGenerateRes> {
+    for (;;) {
+        await new Promise(resolve => setTimeout(resolve, TASK_POLL_INTERVAL));
+        const task = await getVideoTask(taskId);
+        if (task?.data?.state === TASK_STATE_COMPLETE) {
+            return { success: true, data: { video_url: task.data.video_url || "" }, message: null };
+        }
+        if (task?.data?.state === TASK_STATE_FAILED) {
+            return { success: false, message: task.data.message };
+        }
+    }
+}
+
+export async function generateVideo(data: VideoGenerateReq, onEvent?: (event: VideoTaskEvent) => void): Promise<VideoGenerateRes> {
+    const res = await request<VideoTaskRes>({
         url: "/api/video/generate",
         method: "post",
         data,
     });
-}
\ No newline at end of file
+    if (!res?.success || !res.data) {
+        return { success: false, message: res?.message || null };
+    }
+    const taskId = res.data.task_id;
+    // 任务在后台执行，通过 SSE 接收进度，连接失败时退回轮询
+    return new Promise(resolve => {
+        subscribeVideoTask(taskId, event => {
+            onEvent?.(event);
+            const task = event.data as VideoTask;
+            if (task.state === TASK_STATE_COMPLETE) {
+                resolve({ success: true, data: { video_url: task.video_url || "" }, message: null });
+            } else if (task.state === TASK_STATE_FAILED) {
+                resolve({ success: false, message: task.message });
+            }
+        }, () => pollVideoTask(taskId).then(resolve));
+    });
+}
@@ -8,7 +8,7 @@ interface RequestConfig {
     params?: object;
 }
 
-let baseUrl = 'http://127.0.0.1:8000';
+export let baseUrl = 'http://127.0.0.1:8000';
 
 export function request<T>(config: RequestConfig): Promise<T> {
     return new Promise((resolve, reject) => {